@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+'''
+Start up benchmark of the single cover letter path of cover-gen.py (e.g. "--company X --role Y --no_pdf"), as called from shell scripts many times a day
+    Runs the command line repeatedly in a temporary folder, reporting the min/median/max wall time, and fails (exit code 1) if
+        the median exceeds [--max_seconds], or
+        any module of forbidden_modules is imported, as they are only needed by [--app_list] or [--pdf] runs
+
+Usage: python benchmarks/startup.py [--runs RUNS] [--max_seconds MAX_SECONDS]
+'''
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## Modules that must not be imported when generating a single ".docx"
+forbidden_modules = ['pandas', 'numpy', 'openpyxl', 'pyarrow', 'docx2pdf', 'dateutil', 'multiprocessing']
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20, help='The number of timed runs (default 20)')
+    parser.add_argument('--max_seconds', '--max-seconds', type=float, default=0.6, help='The largest acceptable median wall time of a run in seconds (default 0.6)')
+    parser.add_argument('--template', type=str, default=os.path.join(root, 'cover-letter-template.docx'), help='The template to generate from (default the sample template)')
+    return parser.parse_args()
+
+def get_command():
+    '''
+    Obtains the command of a single cover letter run, with a date and address to exercise their normalisation
+        @return: List of the command line arguments
+    '''
+
+    return [
+        sys.executable, os.path.join(root, 'cover-gen.py'),
+        '-name', 'Bench Mark',
+        '--company', 'Company',
+        '--role', 'Role',
+        '--date', 'May 28, 2023',
+        '--address', '123 Candelfield Lane, New York, NY 10004',
+        '--no_pdf',
+    ]
+
+def get_imported_modules(cwd):
+    '''
+    Runs the command once with "-X importtime" to list every module it imports
+        @param cwd: The folder to run in
+        @return: Set of the top level names of the imported modules
+    '''
+
+    command = get_command()
+    command.insert(1, '-X')
+    command.insert(2, 'importtime')
+
+    result = subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and line.count('|') == 2:
+            modules.add(line.rsplit('|', 1)[1].strip().split('.')[0])
+    return modules
+
+if __name__ == '__main__':
+
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='cover-gen-startup-') as cwd:
+        shutil.copy(args.template, os.path.join(cwd, 'cover-letter-template.docx'))
+
+        imported = get_imported_modules(cwd)
+
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run(get_command(), cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+
+    median = statistics.median(times)
+    print(f'Single cover letter start up over {args.runs} runs: min {min(times):.3f}s, median {median:.3f}s, max {max(times):.3f}s')
+
+    failed = False
+
+    unexpected = sorted(module for module in forbidden_modules if module in imported)
+    if unexpected:
+        print(f'FAIL: the single cover letter path imported {", ".join(unexpected)}')
+        failed = True
+
+    if median > args.max_seconds:
+        print(f'FAIL: median start up of {median:.3f}s exceeds {args.max_seconds:.3f}s')
+        failed = True
+
+    sys.exit(1 if failed else 0)
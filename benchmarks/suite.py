@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark suite of cover-gen: generates synthetic trackers and templates (see synthetic.py) and runs the command line on every combination, offline with the fake PDF backend
+    Every run is a process of its own, so that no run measures the caches (e.g. of the normalised dates and addresses) warmed by an earlier one
+    The end to end time and the per stage timings of each run (from its [--report]) are written to benchmarks/results/<version>-<commit>-<time>.json,
+    and compared against the latest earlier results (or [--baseline]) so that regressions show up between versions, failing (exit code 1) if any run is slower by more than [--threshold]
+
+Usage: python benchmarks/suite.py [--sizes 100,10000,100000] [--templates plain,loops,tables,images] [--workers WORKERS] [--baseline BASELINE]
+'''
+
+import os
+import sys
+import json
+import glob
+import shutil
+import argparse
+import platform
+import tempfile
+import datetime
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from synthetic import template_names, write_tracker, write_template
+
+from cover_gen import __version__
+from cover_gen.report import print_summary
+
+results_dir = os.path.join(root, 'benchmarks', 'results')
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=str, default='100,10000,100000', help='Comma separated numbers of rows of the synthetic trackers (default 100,10000,100000)')
+    parser.add_argument('--templates', type=str, default=','.join(template_names), help=f'Comma separated templates to run, of {", ".join(template_names)} (default all)')
+    parser.add_argument('--workers', type=int, default=1, help='The [--workers] of every run (default 1)')
+    parser.add_argument('--output_format', '--output-format', type=str, default='folder', choices=['folder', 'zip'], help='Whether the runs write to a folder or a ".zip" archive (default folder)')
+    parser.add_argument('--fixtures', type=str, default=None, help='A folder to keep the synthetic trackers and templates in and re-use them from, instead of generating them in a temporary folder on every run')
+    parser.add_argument('--baseline', type=str, default=None, help='A results file to compare against (default the latest file in benchmarks/results)')
+    parser.add_argument('--threshold', type=float, default=0.1, help='The relative slow down of the end to end time counted as a regression (default 0.1)')
+    parser.add_argument('--no_save', '--no-save', dest='save', action='store_false', help='Do not write the results to benchmarks/results')
+    return parser.parse_args()
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+def get_fixture(fixtures, name, write, *write_args):
+    '''
+    Obtains the path of a fixture, writing it first if it does not exist yet
+        @param fixtures: The folder of the fixtures
+        @param name: The file name of the fixture
+        @param write: write_tracker or write_template
+        @return: The path of the fixture
+    '''
+
+    path = os.path.join(fixtures, name)
+    if not os.path.exists(path):
+        write(path, *write_args)
+    return path
+
+def run_benchmark(tracker, template, rows, workers, output_format, work_dir):
+    '''
+    Runs the command line on a tracker and template in a new process, discarding the generated files
+        @return: dictionary of the results of the run
+    '''
+
+    out_dir = os.path.join(work_dir, 'out')
+    output = out_dir + '.zip' if output_format == 'zip' else out_dir
+    report = os.path.join(work_dir, 'report.json')
+    journal = os.path.join(work_dir, 'journal.jsonl')
+
+    argv = ['-name', 'Bench Mark', '--app_list', tracker, '--template', template, '--pdf_backend', 'fake', '--workers', str(workers), '--output', output, '--report', report, '--journal', journal]
+    subprocess.run([sys.executable, os.path.join(root, 'cover-gen.py')] + argv, cwd=work_dir, stdout=subprocess.DEVNULL, check=True)
+
+    with open(report, 'r', encoding='utf-8') as f:
+        run = json.load(f)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    for path in (out_dir + '.zip', journal):
+        if os.path.exists(path):
+            os.remove(path)
+
+    return {
+        'rows': rows,
+        'template': os.path.basename(template),
+        'workers': workers,
+        'output_format': output_format,
+        'elapsed': run['elapsed'],
+        'count_gen': run['count_gen'],
+        'letters_per_second': run['count_gen'] / run['elapsed'] if run['elapsed'] else None,
+        'stages': run['stages'],
+    }
+
+def get_key(result):
+    return (result['rows'], result['template'], result['workers'], result.get('output_format', 'folder'))
+
+def compare(results, baseline, threshold):
+    '''
+    Prints the end to end time of each run next to that of the same run in the baseline
+        @return: List of the keys of the runs slower than the baseline by more than threshold
+    '''
+
+    previous = {get_key(result): result for result in baseline['results']}
+    regressions = []
+
+    print(f'Compared against {baseline["version"]} ({baseline["commit"]}, {baseline["started"]})')
+    print(f'{"Rows":>8}  {"Template":<22}{"Elapsed s":>11}{"Baseline s":>12}{"Change":>9}')
+    for result in results:
+        key = get_key(result)
+        if key not in previous:
+            continue
+
+        change = result['elapsed'] / previous[key]['elapsed'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f'{result["rows"]:>8}  {result["template"]:<22}{result["elapsed"]:>11.2f}{previous[key]["elapsed"]:>12.2f}{change:>+9.1%}{flag}')
+
+    return regressions
+
+if __name__ == '__main__':
+
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    templates = args.templates.split(',')
+
+    baseline_path = args.baseline
+    if baseline_path is None:
+        earlier = sorted(glob.glob(os.path.join(results_dir, '*.json')), key=os.path.getmtime)
+        baseline_path = earlier[-1] if earlier else None
+
+    started = datetime.datetime.now()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='cover-gen-bench-') as work_dir:
+        fixtures = args.fixtures or os.path.join(work_dir, 'fixtures')
+        os.makedirs(fixtures, exist_ok=True)
+
+        for rows in sizes:
+            tracker = get_fixture(fixtures, f'tracker-{rows}.csv', write_tracker, rows)
+            for name in templates:
+                template = get_fixture(fixtures, f'template-{name}.docx', write_template, name)
+
+                result = run_benchmark(tracker, template, rows, args.workers, args.output_format, work_dir)
+                results.append(result)
+
+                print('='*74)
+                print(f'{rows} rows, {name} template: {result["elapsed"]:.2f}s end to end, {result["letters_per_second"]:.1f} cover letters per second')
+                print_summary(result['stages'])
+
+    print('='*74)
+
+    regressions = []
+    if baseline_path is not None:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+    if args.save:
+        os.makedirs(results_dir, exist_ok=True)
+        path = os.path.join(results_dir, f'{__version__}-{get_commit()}-{started.strftime("%Y%m%d-%H%M%S")}.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': __version__,
+                'commit': get_commit(),
+                'started': started.isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=1)
+        print(f'Wrote the results to {path}')
+
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+'''
+Synthetic fixtures of the benchmark suite: application trackers of any size with long text columns and messy dates, and templates of increasing complexity
+    Everything is generated from a fixed seed, so the same arguments always give the same files
+
+Usage: python benchmarks/synthetic.py [--rows ROWS] [--out_dir OUT_DIR]
+'''
+
+import os
+import csv
+import zlib
+import random
+import struct
+import argparse
+import datetime
+
+## Templates in order of complexity, each adding to the one before it
+template_names = ['plain', 'loops', 'tables', 'images']
+
+words = ('analysis data product platform team customer growth design research strategy engineering quality delivery '
+         'experience community impact model pipeline insight scale launch mentor collaborate ownership curiosity').split()
+
+def get_sentence(rng, length):
+    return ' '.join(rng.choice(words) for _ in range(length)).capitalize() + '.'
+
+def get_text(rng, sentences):
+    return ' '.join(get_sentence(rng, rng.randint(8, 20)) for _ in range(sentences))
+
+def get_messy_date(rng):
+    '''
+    Obtains a date in one of the formats found in real trackers, including some without a 4 digit year, empty and illegible ones
+        @param rng: random.Random object
+        @return: The date string
+    '''
+
+    date = datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randint(0, 1500))
+    style = rng.random()
+    if style < 0.25:
+        return date.strftime('%B %d, %Y')
+    if style < 0.45:
+        return date.strftime('%m/%d/%Y')
+    if style < 0.60:
+        return date.isoformat()
+    if style < 0.70:
+        return date.strftime('%d %b %Y')
+    if style < 0.80:
+        return date.strftime('%m/%d/%y')
+    if style < 0.88:
+        return date.strftime('%b %d %Y') + ' '
+    if style < 0.94:
+        return ''
+    return rng.choice(['TBD', 'last week', 'May 33, 2023', '13/45/2022'])
+
+def get_address(rng):
+    if rng.random() < 0.05:
+        return rng.choice(['Remote', '55 North Ave, 11002, New, York', 'Somewhere, Else, '])
+    return f'{rng.randint(1, 9999)} {rng.choice(words).capitalize()} Street, {rng.choice(["New York", "Boston", "Austin", "Seattle"])}, {rng.choice(["NY", "MA", "TX", "WA"])} {rng.randint(10000, 99999)}'
+
+def write_tracker(path, rows, seed=0):
+    '''
+    Writes a synthetic ".csv" application tracker
+        Companies repeat (about 5 rows per company) while every row has its own role, so every row generates its own cover letter
+        @param path: The path of the ".csv" to write
+        @param rows: The number of applications
+        @param seed: The seed of the random generator
+        @return: path
+    '''
+
+    rng = random.Random(seed)
+    companies = [f'Company {idx}' for idx in range(max(1, rows // 5))]
+
+    header = ['Company', 'Role', 'Date Applied', 'Address', 'Event', 'Contact', 'Referral', 'Hiring Manager', 'Conversation 1', 'Conversation 2', 'Other1', 'Other2', 'Notes']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for idx in range(rows):
+            writer.writerow([
+                rng.choice(companies),
+                f'Role {idx}',
+                get_messy_date(rng),
+                get_address(rng),
+                rng.choice(['', 'Career Fair', 'Info Session', 'Hackathon']),
+                rng.choice(['', 'Jane Doe', 'John Roe']),
+                rng.choice(['', '', 'Alex Smith']),
+                rng.choice(['', ' Ms. Lee', ' Mr. Park']),
+                get_text(rng, rng.randint(5, 15)), ## Long text columns, of about 1 to 2 thousand characters
+                get_text(rng, rng.randint(5, 15)),
+                get_text(rng, 2),
+                get_text(rng, 1),
+                get_text(rng, 3), ## Not used by the script
+            ])
+
+    return path
+
+def get_png(width, height, seed=0):
+    '''
+    Obtains the bytes of an opaque RGB ".png" image of random noise, without any imaging library
+        @param width: The width in pixels
+        @param height: The height in pixels
+        @param seed: The seed of the random generator
+        @return: bytes of the image
+    '''
+
+    rng = random.Random(seed)
+    raw = b''.join(b'\x00' + bytes(rng.getrandbits(8) for _ in range(width * 3)) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+
+def write_template(path, name):
+    '''
+    Writes a ".docx" template of the given complexity
+        plain: paragraphs with every placeholder
+        loops: adds paragraphs repeated for every sentence of the conversations
+        tables: adds a table with a row per templated field and a table repeated for a range
+        images: adds pictures to the body and header
+        @param path: The path of the ".docx" to write
+        @param name: One of template_names
+        @return: path
+    '''
+
+    from docx import Document
+    from docx.shared import Inches
+
+    level = template_names.index(name)
+    document = Document()
+
+    document.add_paragraph('{{DATE}}')
+    document.add_paragraph('{{COMPANY}}')
+    document.add_paragraph('{{ADDRESS}}')
+    document.add_paragraph('{{HMANAGER}}')
+    document.add_paragraph('I am writing to apply for the {{ROLE}} position at {{COMPANY}}. I met {{CONTACT}} at {{EVENT}} and was referred by {{REFERRAL}}.')
+    document.add_paragraph('{{CONVO1}}')
+    document.add_paragraph('{{CONVO2}}')
+    document.add_paragraph('{{OTHER1}} {{OTHER2}}')
+
+    if level >= 1:
+        document.add_paragraph('{%p for sentence in (CONVO1 or "").split(". ") %}')
+        document.add_paragraph('- {{ sentence }}', style='List Bullet')
+        document.add_paragraph('{%p endfor %}')
+        document.add_paragraph('{%p for sentence in (CONVO2 or "").split(". ") %}')
+        document.add_paragraph('{% if loop.index is odd %}{{ sentence|upper }}{% else %}{{ sentence }}{% endif %}')
+        document.add_paragraph('{%p endfor %}')
+
+    if level >= 2:
+        table = document.add_table(rows=3, cols=2)
+        table.cell(0, 0).text = 'Field'
+        table.cell(0, 1).text = 'Value'
+        table.cell(1, 0).text = '{%tr for label, value in [("Company", COMPANY), ("Role", ROLE), ("Event", EVENT), ("Contact", CONTACT), ("Referral", REFERRAL)] %}'
+        table.cell(2, 0).text = '{{ label }}'
+        table.cell(2, 1).text = '{{ value }}'
+        row = table.add_row()
+        row.cells[0].text = '{%tr endfor %}'
+
+        table = document.add_table(rows=3, cols=3)
+        table.cell(0, 0).text = '{%tr for idx in range(10) %}'
+        table.cell(1, 0).text = '{{ idx }}'
+        table.cell(1, 1).text = '{{ ROLE }}'
+        table.cell(1, 2).text = '{{ OTHER1 }}'
+        table.cell(2, 0).text = '{%tr endfor %}'
+
+    if level >= 3:
+        import io
+        document.add_picture(io.BytesIO(get_png(200, 120, seed=1)), width=Inches(2))
+        document.add_picture(io.BytesIO(get_png(400, 300, seed=2)), width=Inches(4))
+        header = document.sections[0].header
+        header.paragraphs[0].add_run('{{COMPANY}} - {{ROLE}} ').add_picture(io.BytesIO(get_png(64, 64, seed=3)), width=Inches(0.5))
+
+    document.add_paragraph('Sincerely,')
+    document.add_paragraph('{{NAME}}')
+    document.save(path)
+
+    return path
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100, help='The number of rows of the tracker (default 100)')
+    parser.add_argument('--out_dir', '--out-dir', type=str, default='.', help='The folder to write the tracker and templates to (default the working directory)')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the random generator (default 0)')
+    return parser.parse_args()
+
+if __name__ == '__main__':
+
+    args = parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    print(write_tracker(os.path.join(args.out_dir, f'tracker-{args.rows}.csv'), args.rows, args.seed))
+    for name in template_names:
+        print(write_template(os.path.join(args.out_dir, f'template-{name}.docx'), name))
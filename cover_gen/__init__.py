@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+'''
+@version: 3.3.0
+@author: Sunny Son
+    @github: sunnydigital
+
+@about: Python package automating cover letters in job applications, used by the cover-gen.py command line script or directly through CoverLetterGenerator
+@license: MIT License
+'''
+
+import importlib
+
+__version__ = '3.3.0'
+
+## Public names and the submodule defining each, imported on first access so that importing the package (e.g. by the command line) stays cheap
+exports = {
+    'CoverLetterGenerator': 'generator',
+    'get_complete_path': 'generator',
+    'CompiledDocxTemplate': 'template',
+    'RowSchema': 'tracker',
+    'get_app_format': 'tracker',
+    'read_app_header': 'tracker',
+    'iter_app_chunks': 'tracker',
+    'RowFilter': 'tracker',
+    'WhereExpression': 'where',
+    'normalise_dates': 'normalise',
+    'normalise_addresses': 'normalise',
+    'normalise_chunks': 'normalise',
+    'PDFBackend': 'pdf',
+    'Docx2PDFBackend': 'pdf',
+    'LibreOfficeBackend': 'pdf',
+    'FakePDFBackend': 'pdf',
+    'PDFPipeline': 'pdf',
+    'pdf_backends': 'pdf',
+    'OutputSink': 'sinks',
+    'DirectorySink': 'sinks',
+    'ZipSink': 'sinks',
+    'StreamSink': 'sinks',
+    'BytesSink': 'sinks',
+    'ObjectStoreSink': 'sinks',
+    'LocalObjectStore': 'sinks',
+    'RenderCache': 'cache',
+    'RenderService': 'server',
+}
+
+__all__ = sorted(exports)
+
+def __getattr__(name):
+    if name in exports:
+        return getattr(importlib.import_module(f'.{exports[name]}', __name__), name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
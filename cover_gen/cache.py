@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+'''
+Persistent render cache shared across runs (and team members), selected with [--cache_dir]
+    Rendered ".docx" and converted ".pdf" files are stored by their render key (the hash of the template, its rendering engine and the context, see CoverLetterGenerator.get_render_key), so a repeat generation costs only a file copy
+'''
+
+import os
+import time
+import threading
+
+class RenderCache:
+    '''
+    Content addressed store of rendered files below a folder, bounded to max_bytes by evicting the least recently used files
+        Safe to share between concurrent runs without any locking:
+            files are written to a unique temporary file and renamed into place, so a reader never sees a partial file
+            every hit refreshes the modification time of the file, the "last used" time of the LRU eviction
+            a file evicted by another run while being read is a miss, and two runs evicting at once at most evict a little more than needed
+    '''
+
+    low_watermark = 0.9 ## Eviction frees space down to this fraction of max_bytes, so that not every later put evicts again
+    stale_tmp = 3600 ## Seconds after which a temporary file is left over from a crashed run
+
+    def __init__(self, root, max_bytes=1 << 30):
+        '''
+            @param root: The folder of the cache, created if it does not exist
+            @param max_bytes: The size the cache is kept below
+        '''
+
+        self.root = root
+        self.max_bytes = max_bytes
+        self.size = None ## Estimate of the size of the cache, measured on the first put
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+
+    def __getstate__(self):
+        ## Each worker process measures the size of the cache itself
+        state = self.__dict__.copy()
+        state['size'] = None
+        return state
+
+    def get_path(self, name):
+        '''
+            @param name: The name of the file, its render key and suffix (e.g. "<key>.docx")
+            @return: The path of the file in the cache
+        '''
+
+        return os.path.join(self.root, 'objects', name[:2], name)
+
+    def get(self, name):
+        '''
+        Reads a file from the cache, refreshing its last used time
+            @param name: The name of the file, its render key and suffix
+            @return: The bytes of the file, None if not cached
+        '''
+
+        path = self.get_path(name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except (FileNotFoundError, PermissionError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def put(self, name, data):
+        '''
+        Stores a file in the cache, evicting the least recently used files if it grows beyond max_bytes
+            @param name: The name of the file, its render key and suffix
+            @param data: The bytes of the file
+        '''
+
+        path = self.get_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp' ## Unique to the writing process and thread
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self.scan())
+        else:
+            self.size += len(data)
+
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def scan(self):
+        '''
+        Lists the files of the cache, removing temporary files left over by crashed runs
+            @return: List of tuples of the path, size and last used time of each file
+        '''
+
+        files = []
+        now = time.time()
+        for folder, _, names in os.walk(os.path.join(self.root, 'objects')):
+            for name in names:
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                    if name.endswith('.tmp'):
+                        if now - stat.st_mtime > self.stale_tmp:
+                            os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                files.append((path, stat.st_size, stat.st_mtime))
+        return files
+
+    def evict(self):
+        '''
+        Measures the cache and, if it is larger than max_bytes, removes the least recently used files until it is below low_watermark of max_bytes
+            Called by put once the estimated size exceeds max_bytes, and at the end of a run as the estimates of concurrent runs (or worker processes) each miss the files put by the others
+        '''
+
+        files = sorted(self.scan(), key=lambda item: item[2])
+        size = sum(size for _, size, _ in files)
+
+        if size <= self.max_bytes:
+            self.size = size
+            return
+
+        for path, file_size, _ in files:
+            if size <= self.max_bytes * self.low_watermark:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError: ## Evicted by a concurrent run
+                pass
+            size -= file_size
+
+        self.size = size
+
+def parse_size(value):
+    '''
+    Parses a size in bytes with an optional unit, for [--cache_max_bytes]
+        @param value: e.g. "1048576", "500M" or "2G"
+        @return: The number of bytes
+    '''
+
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
@@ -0,0 +1,568 @@
+# -*- coding: utf-8 -*-
+'''
+Command line interface of cover-gen, run through the cover-gen.py script or the "cover-gen" console script
+'''
+
+import os
+import sys
+import json
+import time
+import datetime
+import argparse
+import contextlib
+
+from .pdf import pdf_backends
+from .sinks import DirectorySink, ZipSink, StreamSink
+from .cache import parse_size
+from .tracker import RowSchema, RowFilter, allowed_cols, read_app_header, iter_app_chunks, filter_shard, parse_shard
+from .where import parse_where
+from .normalise import normalise_date, normalise_address, normalise_chunk
+from .journal import read_journal_run, get_run_identity
+from .generator import CoverLetterGenerator
+from .validate import TemplateError, get_ignored_columns, validate_template
+from .report import print_summary, write_report, merge_reports
+from . import __version__
+
+def get_parser():
+    '''
+    Builds the argument parser of the command line, whose arguments are documented in parse_args
+        @return: argparse.ArgumentParser() object
+    '''
+
+    parser = argparse.ArgumentParser()
+    
+    parser.add_argument('-name', type=str, default=None, help='The name of the applicant, can be applicable to either the inout template but mostly used for file naming purposes')
+
+    ## Arguments to be used to specify template to be generated from
+    parser.add_argument('--template', type=str, default='cover-letter-template.docx', help='The complete path (including file name) from the working directory (location of Python file) to the location of the template to be filled in')
+
+    ## Templates of rows routed by a "template" column of the tracker or by rules
+    parser.add_argument('--template_rules', '--template-rules', type=str, default=None, help='A JSON file of a list of rules routing rows of the [--app_list] to other templates, e.g. [{"when": {"ROLE": "(?i)engineer"}, "template": "engineering.docx"}]: the first rule whose regular expressions are all found in the context of a row wins, rows matching none use the [--template] and rows with a "template" column of their own use that template instead')
+    parser.add_argument('--template_pool', '--template-pool', type=int, default=8, help='The number of templates besides the [--template] kept compiled at once, each compiled on first use and the least recently used dropped once exceeded (default 8)')
+    parser.add_argument('--engine', type=str, default='auto', choices=['auto', 'docxtpl'], help='The rendering engine: "auto" (default) substitutes the placeholders straight into the XML of templates using nothing but plain placeholders (e.g. {{COMPANY}}) and falls back to docxtpl for templates with control flow ({%% if %%}, {%% for %%}), filters or expressions, "docxtpl" always renders with docxtpl')
+
+    ## Optional PATH to list of application
+    parser.add_argument('--app_list', type=str, default=None, help='A ".xlsx", ".xls", ".csv", ".tsv", ".parquet" or JSON Lines (".jsonl") file of job applications in format "company", "role", (and optional) "event", the format is detected from the file contents and extension')
+
+    ## Arguments to be used to fill in context for template and saving name
+    parser.add_argument('--date', type=str, default=None, help='A datetime readable string, if none exist defaults to today\'s date and outputs error message in console')
+    parser.add_argument('--company', type=str, default=None, help='The name of a company (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--address', type=str, default=None, help='The address of the company being applied to')
+    parser.add_argument('--role', type=str, default=None, help='The name of the desired role within the company (in the case of generating a single applications''s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--event', type=str, default=None, help='The name of any applicable events attended by the user within the target company/associated institutions (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--contact', type=str, default=None, help='The name of any applicable contacts to the company being applied to (networking, social events, etc.) (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--referral', type=str, default=None, help='The name of the person giving the applicant (current user) a referral to the company (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--hmanager', type=str, default=None, help='The name of the hiring manager cover letter is to be sent to (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--convo1', type=str, default=None, help='A first blurb of meaningful conversation to be included in the cover letter (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--convo2', type=str, default=None, help='A second blurb of meaningful conversation to be included in the cover letter (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--other1', type=str, default=None, help='A first "other" content related to the application (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+    parser.add_argument('--other2', type=str, default=None, help='A second "other" content related to the application (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used)')
+
+    ## Whether to have folders generated for output (if '--multiple' this defaults to true)
+    parser.add_argument('--folder', action='store_true', help='To determine whether or not to save generated cover letters in a subfolder saved as a boolean true in the case of [--folder] and false [--no_folder] (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used) (default True)') ## Defaults folder name to company name
+    parser.add_argument('--no_folder', dest='folder', action='store_false', help='To determine whether or not to save generated cover letters in a subfolder saved as a boolean true in the case of [--folder] and false [--no_folder] (in the case of generating a single applications\'s cover letter), and potentially overrided by the [--app_list] argument (if provided will not be used) (default True)')
+    
+    ## Check of the template against the tracker before rendering
+    parser.add_argument('--no_validate', '--no-validate', dest='validate', action='store_false', help='Skip the check of the variables of the template against the columns of the tracker (and the names cover-gen fills) before rendering, which fails the run on a typo in a placeholder or a missing column, and read every column whether the template uses it or not (default validate)')
+
+    # parser.set_defaults(pdf=False, folder=None) # Set default pdf action to return true for return type as pdf
+    parser.add_argument('--pdf', action='store_true', help='Whether to save generated ".docx" files as a ".pdf" file, toggles between boolean True for [--pdf] and False for [--no_pdf] (default True)')
+    parser.add_argument('--no_pdf', dest='pdf', action='store_false', help='Whether to save generated ".docx" files as a ".pdf" file, toggles between boolean True for [--pdf] and False for [--no_pdf] (default True)')
+
+    ## Converter to be used to create the ".pdf" files
+    parser.add_argument('--pdf_backend', '--pdf-backend', type=str, default='docx2pdf', choices=sorted(pdf_backends), help='The converter used to create ".pdf" files: "docx2pdf" converts each file through Microsoft Word, "libreoffice" converts all generated files of a folder in one call to a headless LibreOffice, and "fake" writes placeholder ".pdf" files for testing (default docx2pdf)')
+
+    parser.add_argument('--pdf_workers', '--pdf-workers', type=int, default=1, help='The number of threads converting generated ".docx" files to ".pdf" while rendering continues (default 1)')
+
+    ## Conversion of every cover letter in a single merged document
+    parser.add_argument('--merge', action='store_true', help='Whether to convert every generated ".docx" to ".pdf" in a single call to the [--pdf_backend]: the cover letters are appended as the sections of one merged document, converted once and split back into the ".pdf" of each cover letter (requires pypdf and a backend exporting bookmarks, i.e. not docx2pdf, with which the files are converted one by one, default False)')
+    parser.add_argument('--merge_output', '--merge-output', type=str, default=None, help='The path (within the [--output] folder) of a ".pdf" combining the ".pdf" of every cover letter of a [--merge] run in order of the [--app_list], e.g. "All-Cover-Letters.pdf" for printing (default none)')
+
+    ## Whether to only regenerate cover letters that changed since the last run
+    parser.add_argument('--incremental', action='store_true', help='Whether to skip cover letters whose context and template are unchanged since the last run and whose output files still exist, as recorded in the [--manifest] (default False)')
+    parser.add_argument('--manifest', type=str, default='.cover-gen-manifest.json', help='The path of the manifest file kept by [--incremental] runs (default .cover-gen-manifest.json)')
+
+    ## Journal of the completed rows, to continue an interrupted run from
+    parser.add_argument('--journal', type=str, default=None, help='The path of the progress journal of [--app_list] runs writing to a folder, to which each row is appended as soon as its ".docx" (and ".pdf") are written, started anew by every run unless resumed (default .cover-gen-journal.jsonl in the [--output] folder)')
+    parser.add_argument('--resume', action='store_true', help='Whether to continue the run of the [--journal] that was interrupted (killed, crashed or out of power), skipping the rows it completed (those at the same position of the [--app_list] with the same template and context) without reading their output files, which are always written to a temporary file and renamed into place so none is ever left partially written (default False)')
+
+    ## Number of processes to render rows of the [--app_list] with
+    parser.add_argument('--workers', type=int, default=1, help='The number of worker processes to spread the rows of [--app_list] across, each worker loads the template once (default 1)')
+
+    ## Selection of the rows to generate
+    parser.add_argument('--where', type=parse_where, default=None, help='An expression selecting the rows of [--app_list] to generate, e.g. \'company in ["Apple", "Google"] and date >= 2023-05-01\': columns of the tracker (spaces as underscores, or within backticks) compared with quoted strings, numbers or YYYY-MM-DD dates by ==, !=, <, <=, >, >=, "in [...]" and "not in [...]", combined with "and", "or", "not" and parentheses, evaluated over each chunk of rows as it is read so that only the rows selected are normalised and rendered (default every row)')
+
+    ## Partition of the rows across several machines
+    parser.add_argument('--shard', type=parse_shard, default=None, help='"K/N" to generate only the K-th of N shards of the rows of [--app_list], assigned by a stable hash of the company so that every company (and its folder) belongs to one shard: the [--report] (written to cover-gen-report.json by default), [--manifest], [--merge_output] and any ".zip" [--output] are named after the shard (e.g. report.shard-1-of-4.json), so that re-running a shard never touches the files of the others, and the reports of every shard are aggregated with "cover-gen merge-reports" (default no sharding)')
+
+    ## Destination of the generated files
+    parser.add_argument('--output', type=str, default=None, help='Where to write the generated files: a folder, a ".zip" archive streamed in one sequential write (any path ending in ".zip"), or "-" for stdout, which receives a ".zip" archive of an [--app_list] or the single ".docx" (".pdf" with [--pdf]) otherwise (default the working directory)')
+
+    ## Render cache shared across runs
+    parser.add_argument('--cache_dir', '--cache-dir', type=str, default=None, help='The folder of a render cache shared across runs (and safe for concurrent runs to share), from which cover letters rendered and converted before with the same template and context are copied instead of rendered or converted again (default no cache)')
+    parser.add_argument('--cache_max_bytes', '--cache-max-bytes', type=parse_size, default='1G', help='The size the [--cache_dir] is kept below by evicting the least recently used files, in bytes or with a K, M, G or T unit (default 1G)')
+
+    ## Re-rendering on every change of the tracker or template
+    parser.add_argument('--watch', action='store_true', help='Whether to keep running after generating the cover letters of the [--app_list], keeping the templates and tracker in memory and re-rendering only the rows added or changed whenever the tracker is saved, and every row whenever the template, the [--template_rules] or the template of a rule is saved (default False)')
+    parser.add_argument('--watch_interval', '--watch-interval', type=float, default=0.5, help='The number of seconds between checks of the tracker and templates for changes in [--watch] mode (default 0.5)')
+
+    ## Local HTTP rendering service
+    parser.add_argument('--serve', type=str, default=None, help='"PORT" or "HOST:PORT" (default host 127.0.0.1) to run a local HTTP rendering service on instead of generating files: POST a JSON object of the context to /render?template=NAME&format=docx|pdf for the bytes of the cover letter, GET /metrics for the request counts and timings')
+    parser.add_argument('--serve_template', '--serve-template', type=str, action='append', default=None, help='"NAME=PATH" of a further template kept compiled by the [--serve] service, requested with "template=NAME" (the [--template] is named "default"), can be repeated')
+    parser.add_argument('--batch_window', '--batch-window', type=float, default=0.02, help='The seconds the [--serve] service waits for further ".pdf" requests to convert in the same call to the PDF backend (default 0.02)')
+    parser.add_argument('--max_concurrency', '--max-concurrency', type=int, default=4, help='The number of requests the [--serve] service renders or converts at once, further requests wait (default 4)')
+
+    ## Instrumentation of the run
+    parser.add_argument('--report', type=str, default=None, help='The path of a JSON report of the run to write, with its counts, errors per type, the company and role of each error and the p50/p95/max time per row of every stage (load, normalise, context, render, save, pdf)')
+    parser.add_argument('--profile', type=str, default=None, help='The path to dump the cProfile statistics of the run to (readable with pstats), the top functions are also printed (worker processes of [--workers] are not profiled)')
+
+    parser.set_defaults(folder=True, pdf=True)
+
+    return parser
+
+def parse_args(argv=None):
+    '''
+    Argument parser function from CLI to obtain:
+        @arg [-name]: The name of the applicant, can be applicable to either the inout template but mostly used for file naming purposes
+        @opt arg [--template]: The complete path (including file name) from the working directory (location of Python file) to the location of the template to be filled in
+        @opt arg [--app_list]: A ".xlsx", ".xls", ".csv", ".tsv", ".parquet" or JSON Lines file of job applications in format "company", "role", (and optional) "event"
+        @opt arg [--template_rules]: A JSON file of rules routing rows of the [--app_list] to other templates, the first rule matching the context of a row wins, rows with a "template" column of their own use that template instead
+        @opt arg [--template_pool]: The number of templates of [--template_rules] and the "template" column kept compiled at once, defaults to 8
+        @opt arg [--engine]: The rendering engine, "auto" (default) for XML substitution on templates of nothing but plain placeholders and docxtpl otherwise, "docxtpl" for docxtpl always
+        
+        @opt arg [--date]: A datetime readable string, if none exist defaults to today's date and outputs error message in console
+        @opt arg [--company]: The name of the company being applied to
+        @opt arg [--address]: The address of the company being applied to
+        @opt arg [--role]: The name of the desired role within the company being applied to
+        @opt arg [--event]: The name of any applicable events attended by the user within the target company/associated institutions
+        @opt arg [--contact]: The name of any applicable contacts to the company being applied to (networking, social events, etc.)
+        @opt arg [--referral]: The name of the person giving the applicant (current user) a referral to the company
+        @opt arg [--hmanager]: The name of the hiring manager cover letter is to be sent to
+        @opt arg [--convo1]: A first blurb of meaningful conversation to be included in the cover letter
+        @opt arg [--convo2]: A second blurb of meaningful conversation to be included in the cover letter
+        @opt arg [--other1]: A first "other" content related to the application
+        @opt arg [--other2]: A second "other" content related to the application
+        
+        @opt arg [--folder][--no_folder]: To determine whether or not to save generated cover letters in a subfolder saved as a boolean true in the case of [--folder] and false [--no_folder]
+            All above two blocks to be used in generating the cover letter for a single application), and potentially overrided by the [--app_list] argument (and if still provided will not be used)
+        
+        @opt arg [--no_validate]: Whether to skip the check of the variables of the template against the columns of the tracker before rendering, and read every column whether the template uses it or not
+        
+        @opt arg [--pdf][--no_pdf]: Whether to save generated ".docx" files as a ".pdf" file, toggles between boolean true for [--pdf] and false for [--no_pdf]
+        @opt arg [--pdf_backend]: The converter used to create ".pdf" files, one of the keys of pdf_backends, defaults to "docx2pdf" (requires Microsoft Word)
+        @opt arg [--pdf_workers]: The number of threads converting generated ".docx" files to ".pdf" alongside rendering, defaults to 1
+        @opt arg [--merge]: Whether to convert every generated ".docx" to ".pdf" in one call to the [--pdf_backend], as the sections of a single merged document split back into the ".pdf" of each cover letter
+        @opt arg [--merge_output]: The path (within the [--output]) of a ".pdf" combining every cover letter of a [--merge] run in order, e.g. for printing
+        @opt arg [--incremental]: Whether to skip cover letters whose context and template are unchanged since the last run and whose output files still exist, as recorded in the [--manifest]
+        @opt arg [--manifest]: The path of the manifest file kept by [--incremental] runs, defaults to ".cover-gen-manifest.json"
+        @opt arg [--journal]: The path of the progress journal of [--app_list] runs to a folder, recording each row once its files are written, defaults to ".cover-gen-journal.jsonl" in the [--output] folder
+        @opt arg [--resume]: Whether to continue the interrupted run of the [--journal], skipping the rows it completed without reading their output files
+        @opt arg [--workers]: The number of worker processes to spread the rows of [--app_list] across, defaults to 1 (no process pool)
+        @opt arg [--where]: An expression selecting the rows of [--app_list] to generate, e.g. 'company in ["A", "B"] and date >= 2023-05-01', evaluated with the eligibility rules as one mask per chunk of rows
+        @opt arg [--shard]: "K/N" to generate only the K-th of N shards of the rows of [--app_list] (by a stable hash of the company), naming the report, manifest and combined outputs of the run after the shard
+        @opt arg [--output]: Where to write the generated files: a folder, a ".zip" archive or "-" for stdout, defaults to the working directory
+        @opt arg [--cache_dir]: The folder of a render cache shared across runs, from which cover letters rendered (and converted) before with the same template and context are copied instead of rendered again
+        @opt arg [--cache_max_bytes]: The size the [--cache_dir] is kept below by evicting the least recently used files, defaults to 1G
+        @opt arg [--watch]: Whether to keep running after generating the cover letters of the [--app_list], re-rendering only the rows added or changed whenever the tracker is saved, and every row whenever a template is saved
+        @opt arg [--watch_interval]: The number of seconds between checks of the tracker and templates for changes in [--watch] mode, defaults to 0.5
+        @opt arg [--serve]: "PORT" or "HOST:PORT" to run a local HTTP rendering service on instead of generating files, keeping the [--template] (and any [--serve_template]) compiled in memory
+        @opt arg [--serve_template]: "NAME=PATH" of a further template of the [--serve] service, requested with "template=NAME", can be repeated
+        @opt arg [--batch_window]: The seconds the [--serve] service waits for further ".pdf" requests to convert in the same call, defaults to 0.02
+        @opt arg [--max_concurrency]: The number of requests the [--serve] service renders or converts at once, defaults to 4
+        @opt arg [--report]: The path of a JSON report of the run to write, with its counts, errors per type, the company and role of each error and the timings of every stage
+        @opt arg [--profile]: The path to dump the cProfile statistics of the run to
+        @param argv: List of the command line arguments, defaults to sys.argv[1:]
+        @return: argparse.Namespace of the parsed arguments
+    '''
+    
+    parser = get_parser()
+
+    args = parser.parse_args(argv)
+
+    ## Reported as the other invalid arguments, before the run starts, if the [--where] expression compares a column the tracker does not have
+    if args.where is not None and args.app_list is not None and os.path.isfile(args.app_list):
+        header = read_app_header(args.app_list)
+        try:
+            RowFilter(RowSchema(header), args.where)
+        except ValueError as e:
+            parser.error(str(e))
+
+    ## Only shown for [--app_list] runs, a single cover letter is often generated from scripts where every millisecond of start up counts
+    if args.app_list is not None:
+        parser.print_usage(sys.stderr if args.output == '-' else sys.stdout)
+
+    return args
+
+def get_args_context(args, errors, failures):
+    '''
+    Obtains the context of the single cover letter entered through the command line arguments, normalising its date and address the same way as the rows of a tracker
+        @param args: The parsed arguments, from parse_args
+        @param errors: dictionary of the error counts of the run, incremented under the "date" and "address" keys
+        @param failures: List to append a dictionary of the error type, company, role and value of an illegible date or address to
+        @return: dictionary of the context passed to the template
+    '''
+
+    date = datetime.date.today().strftime('%B %d, %Y')
+    if args.date:
+        date, date_error = normalise_date(args.date)
+        errors['date'] += date_error
+        if date_error:
+            failures.append({'type': 'date', 'company': args.company, 'role': args.role, 'value': args.date})
+
+    address = ''
+    if args.address:
+        address, address_error = normalise_address(args.address)
+        errors['address'] += address_error
+        if address_error:
+            failures.append({'type': 'address', 'company': args.company, 'role': args.role, 'value': args.address})
+
+    context = { ## Defaults to None otherwise
+        'NAME': args.name,
+        'DATE': date,
+        'COMPANY': args.company,
+        'ADDRESS': address,
+        'ROLE': args.role,
+        'EVENT': args.event,
+        'CONTACT': args.contact,
+        'REFERRAL': args.referral,
+        'HMANAGER': 'Dear' + args.hmanager if args.hmanager else 'To Whom it May Concern',
+        'CONVO1': args.convo1,
+        'CONVO2': args.convo2,
+        'OTHER1': args.other1,
+        'OTHER2': args.other2,
+    }
+
+    return context
+
+def iter_contexts(path, schema, errors, failures, stats, shard=None, row_filter=None):
+    '''
+    Streams the contexts of the applications to generate from a tracker, timing the load (reading and filtering), normalise and context stages of each chunk
+        @param path: The path of the application tracker
+        @param schema: The RowSchema of the tracker
+        @param errors: dictionary of the error counts of the run
+        @param failures: List to append each illegible date or address to
+        @param stats: The RunStats of the run
+        @param shard: Tuple of the shard and the number of shards of [--shard] to generate the rows of, None for every row
+        @param row_filter: The RowFilter of the rows to generate (e.g. with the [--where] expression), defaults to the eligible rows
+        @return: Generator of the contexts of the cover letters
+    '''
+
+    row_filter = RowFilter(schema) if row_filter is None else row_filter
+    chunks = iter_app_chunks(path, schema.positions, row_filter=row_filter)
+    if shard is not None:
+        chunks = filter_shard(chunks, schema, shard)
+
+    for chunk in stats.timed('load', chunks):
+        start = time.perf_counter()
+        normalise_chunk(chunk, schema, errors, failures)
+        normalised = time.perf_counter()
+        contexts = schema.contexts(chunk)
+        stats.add('normalise', normalised - start, len(chunk))
+        stats.add('context', time.perf_counter() - normalised, len(chunk))
+        yield from contexts
+
+def print_logo():
+    print('='*74)
+    print(r'''
+ ██████  ██████  ██    ██ ███████ ██████         ██████  ███████ ███    ██ 
+██      ██    ██ ██    ██ ██      ██   ██       ██       ██      ████   ██ 
+██      ██    ██ ██    ██ █████   ██████  █████ ██   ███ █████   ██ ██  ██ 
+██      ██    ██  ██  ██  ██      ██   ██       ██    ██ ██      ██  ██ ██ 
+ ██████  ██████    ████   ███████ ██   ██        ██████  ███████ ██   ████ 
+                                                                           
+                                                                           
+██    ██ ██████     ██████      ██████                                     
+██    ██      ██         ██    ██  ████                                    
+██    ██  █████      █████     ██ ██ ██                                    
+ ██  ██       ██         ██    ████  ██                                    
+  ████   ██████  ██ ██████  ██  ██████                                     
+                                                                            ''')
+    print('='*74)
+
+def print_errors(errors):
+    '''
+    Prints the non-zero error counts of a run
+        @param errors: dictionary of the error counts of the run
+    '''
+
+    error_counts = {key: value for key, value in errors.items() if value}
+    if error_counts:
+        print('Errors: ' + ', '.join(f'{value} {key}' for key, value in sorted(error_counts.items())))
+
+def get_schema(args, generator, header):
+    '''
+    Compiles the RowSchema of the tracker of a run, failing before any row is read if a variable of a template cannot be filled from the tracker
+        @param args: The parsed arguments, from parse_args
+        @param generator: The CoverLetterGenerator of the run, holding the [--template] and the templates of the [--template_rules]
+        @param header: List of the column names of the tracker, from read_app_header
+        @return: RowSchema object, reading only the columns the templates use unless [--no_validate] or the rows name their own templates
+    '''
+
+    variables = None
+    if args.validate:
+        ignored = get_ignored_columns(header)
+        if ignored:
+            print(f'Ignoring columns not used by cover-gen: {", ".join(ignored)}')
+
+        variables = set(validate_template(generator.template, args.template, header, args.name))
+        for _, path in generator.rules:
+            variables |= validate_template(generator.templates.get(path), path, header, args.name)
+
+        if 'template' in [col.lower() for col in header]:
+            variables = None ## The templates of the "template" column are only known once every row is read
+
+    return RowSchema(header, variables, args.name) ## Normalises the header once
+
+def get_shard_path(path, shard):
+    '''
+    Names a file of the run after its shard of [--shard]
+        @param path: The path of the file, e.g. "report.json"
+        @param shard: Tuple of the shard and the number of shards
+        @return: The path with the shard before its suffix, e.g. "report.shard-1-of-4.json"
+    '''
+
+    root, suffix = os.path.splitext(path)
+    return f'{root}.shard-{shard[0]}-of-{shard[1]}{suffix}'
+
+def merge_reports_main(argv):
+    '''
+    Runs "cover-gen merge-reports", aggregating the run reports of the shards of a [--shard] run and printing their summary
+        @arg [reports]: The paths of the run reports of the shards
+        @opt arg [--report]: The path of the aggregated report to write
+        @param argv: List of the command line arguments after "merge-reports"
+    '''
+
+    parser = argparse.ArgumentParser(prog='cover-gen merge-reports', description='Aggregates the run reports written by the shards of a [--shard] run')
+    parser.add_argument('reports', nargs='+', help='The paths of the run reports of the shards, e.g. cover-gen-report.shard-*.json')
+    parser.add_argument('--report', type=str, default=None, help='The path of a JSON report of the aggregated counts, errors per type, failures and stage totals to write (default none)')
+    args = parser.parse_args(argv)
+
+    reports = []
+    for path in args.reports:
+        with open(path, 'r', encoding='utf-8') as f:
+            reports.append(json.load(f))
+
+    report = merge_reports(reports)
+
+    print('='*74)
+    if report['shards']:
+        print(f'Merged the reports of shards {", ".join(str(shard) for shard in report["shards"])} of {report["shard_count"]}')
+    if report['missing_shards']:
+        print(f'Missing the reports of shards {", ".join(str(shard) for shard in report["missing_shards"])}')
+    print(f'Generated {report["count_gen"]} cover letters and {report["count_pdf"]} PDFs')
+    if report['count_skip']:
+        print(f'Skipped {report["count_skip"]} up to date cover letters')
+    print_errors(report['errors'])
+    print('='*74)
+    print_summary(report['stages'])
+
+    if args.report is not None:
+        write_report(args.report, report)
+        print(f'Wrote the merged report to {args.report}')
+
+def get_sink(args):
+    '''
+    Creates the output sink selected with [--output]
+        @param args: The parsed arguments, from parse_args
+        @return: OutputSink object
+    '''
+
+    if args.output is None:
+        return DirectorySink()
+
+    if args.output == '-':
+        if args.app_list is not None:
+            return ZipSink(sys.stdout.buffer)
+        return StreamSink(sys.stdout.buffer, suffix='.pdf' if args.pdf else '.docx')
+
+    if args.output.lower().endswith('.zip'):
+        return ZipSink(args.output)
+
+    return DirectorySink(args.output)
+
+def main(argv=None):
+    '''
+    Runs cover-gen from the command line, generating the cover letters of an [--app_list] tracker or of the single application entered through the arguments
+        "cover-gen merge-reports REPORT [REPORT ...]" aggregates the reports of the shards of a [--shard] run instead, see merge_reports_main
+        @param argv: List of the command line arguments, defaults to sys.argv[1:]
+    '''
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'merge-reports':
+        merge_reports_main(argv[1:])
+        return
+
+    args = parse_args(argv)
+
+    if args.serve is not None:
+        from .server import serve
+
+        serve(args)
+        return
+ 
+    if (args.role == None or args.company == None) and args.app_list == None:
+        raise argparse.ArgumentTypeError('Must enter either both "company" and "role" or a ".csv"/".xlsx" file containing a list of "companies" and "roles" (row indexed)')
+
+    if args.workers < 1 or args.pdf_workers < 1:
+        raise argparse.ArgumentTypeError('The number of "workers" and "pdf_workers" must be at least 1')
+
+    if args.incremental and args.output is not None and (args.output == '-' or args.output.lower().endswith('.zip')):
+        raise argparse.ArgumentTypeError('An [--incremental] run must write to a folder, not a ".zip" archive or stdout')
+
+    ## Kept with the files it records, so that runs to different folders never share a journal
+    if args.journal is None:
+        args.journal = os.path.join(args.output if args.output is not None and args.output != '-' and not args.output.lower().endswith('.zip') else '', '.cover-gen-journal.jsonl')
+
+    if args.shard is not None:
+        if args.app_list is None:
+            raise argparse.ArgumentTypeError('A [--shard] run needs an [--app_list] to partition')
+
+        ## Files of the run that the shards would otherwise share are named after the shard, so that re-running one shard never touches those of the others
+        args.report = get_shard_path(args.report or 'cover-gen-report.json', args.shard)
+        args.manifest = get_shard_path(args.manifest, args.shard)
+        args.journal = get_shard_path(args.journal, args.shard)
+        if args.merge_output is not None:
+            args.merge_output = get_shard_path(args.merge_output, args.shard)
+        if args.output is not None and args.output.lower().endswith('.zip'):
+            args.output = get_shard_path(args.output, args.shard)
+
+    if args.resume and (args.app_list is None or args.watch or (args.output is not None and (args.output == '-' or args.output.lower().endswith('.zip')))):
+        raise argparse.ArgumentTypeError('A [--resume] run needs an [--app_list] and must write to a folder, not a ".zip" archive or stdout, and cannot be combined with [--watch]')
+
+    if args.resume:
+        started = read_journal_run(args.journal)
+        if started is not None and started != get_run_identity(args):
+            raise argparse.ArgumentTypeError(f'The [--journal] {args.journal} was started by a run of another tracker, template, output, [--shard] or [--where], start a new run rather than resuming it')
+
+    if args.merge and not args.pdf:
+        raise argparse.ArgumentTypeError('A [--merge] run converts the cover letters to ".pdf", which cannot be combined with [--no_pdf]')
+
+    if args.merge_output is not None and (not args.merge or (args.output is not None and (args.output == '-' or args.output.lower().endswith('.zip')))):
+        raise argparse.ArgumentTypeError('A [--merge_output] needs [--merge] and must be written to a folder, not a ".zip" archive or stdout')
+
+    if args.watch and (args.app_list is None or (args.output is not None and (args.output == '-' or args.output.lower().endswith('.zip')))):
+        raise argparse.ArgumentTypeError('A [--watch] run needs an [--app_list] and must write to a folder, not a ".zip" archive or stdout')
+
+    sink = get_sink(args)
+
+    ## A template that cannot be rendered from the tracker is reported as the other invalid arguments, once compiled and checked before any row is read
+    try:
+        if args.watch:
+            from .watch import watch
+
+            print_logo()
+            watch(args, sink)
+            return
+
+        ## When stdout carries the generated files, every message goes to stderr instead
+        with contextlib.redirect_stdout(sys.stderr if args.output == '-' else sys.stdout):
+            if args.profile is None:
+                run(args, sink)
+            else:
+                import pstats
+                import cProfile
+
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    run(args, sink)
+                finally:
+                    profiler.disable()
+                    profiler.dump_stats(args.profile)
+                    pstats.Stats(profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(20)
+    except TemplateError as e:
+        get_parser().error(str(e))
+
+def run(args, sink):
+    '''
+    Generates the cover letters of a command line run and prints its summary
+        @param args: The parsed arguments, from parse_args
+        @param sink: The OutputSink selected with [--output]
+    '''
+
+    if args.app_list is not None:
+        print_logo()
+
+    started = datetime.datetime.now()
+    start = time.perf_counter()
+
+    generator = CoverLetterGenerator.from_args(args, sink)
+    errors = generator.errors
+
+    count_gen = 0
+    count_skip = 0
+    if args.app_list is not None:
+        header = read_app_header(args.app_list) ## Only the header is read up front, the rows are streamed in chunks
+        schema = get_schema(args, generator, header)
+        row_filter = RowFilter(schema, args.where) ## Fails before any row is read if the [--where] expression compares a column the tracker does not have
+        
+        for item in schema.intersection_list:
+            errors[item] = 0
+        errors['pdf'] = 0
+
+        ## Replaces all instances of potential words indicating the user to have applied with "yes" and the user 
+        ## not having applied with the blank entry ""
+        '''if 'applied' in schema.intersection_list:
+            app_df['applied'].replace({r'([Aa]pplied)|([Ss]ent)|(Yes)|[Xx]': 'yes',
+                                          r'([Nn]ot [Aa]pplied)|([Nn]ot [Ss]ent)|([Nn]o)': ''}, 
+                                          regex=True,
+                                          inplace=True
+            )'''
+
+        contexts = iter_contexts(args.app_list, schema, errors, generator.failures, generator.stats, args.shard, row_filter)
+
+        count_gen, count_skip = generator.generate_many(contexts, args.workers)
+    
+    else:
+        arg_names = {k: v for k, v in vars(args).items() if v is not None and k in allowed_cols}
+
+        for key, _ in arg_names.items():
+            errors[key] = 0
+        errors['pdf'] = 0
+
+        if args.validate:
+            validate_template(generator.template, args.template, None, args.name)
+        
+        if generator.generate(get_args_context(args, errors, generator.failures)):
+            count_gen += 1
+        else:
+            count_skip += 1
+
+    ## Waits for the PDF pipeline to convert everything still queued, and saves the manifest
+    generator.close()
+        
+    PDF_num = count_gen - errors['pdf'] if args.pdf else 0
+    print('='*74)
+    if args.shard is not None:
+        print(f'Shard {args.shard[0]} of {args.shard[1]}')
+    print(f'Generated {count_gen} cover letters and {PDF_num} PDFs')
+    if generator.stats.counts['resumed']:
+        print(f'Resumed the interrupted run, skipping {generator.stats.counts["resumed"]} cover letters it completed')
+    if args.incremental:
+        print(f'Skipped {count_skip - generator.stats.counts["resumed"]} up to date cover letters')
+    if generator.stats.counts['deduplicated']:
+        print(f'Reused {generator.stats.counts["deduplicated"]} cover letters with a context identical to an earlier row, without rendering or converting them again')
+    if generator.stats.counts['cached'] or generator.stats.counts['cached_pdf']:
+        print(f'Copied {generator.stats.counts["cached"]} cover letters and {generator.stats.counts["cached_pdf"]} PDFs from the render cache')
+    print_errors(errors)
+    print('='*74)
+
+    if args.report is not None:
+        summary = generator.stats.summary()
+        print_summary(summary)
+        write_report(args.report, {
+            'version': __version__,
+            'started': started.isoformat(timespec='seconds'),
+            'elapsed': time.perf_counter() - start,
+            'template': args.template,
+            'app_list': args.app_list,
+            'shard': list(args.shard) if args.shard is not None else None,
+            'count_gen': count_gen,
+            'count_skip': count_skip,
+            'count_pdf': PDF_num,
+            'counts': dict(generator.stats.counts),
+            'errors': dict(errors),
+            'failures': generator.failures,
+            'stages': summary,
+        })
+        print(f'Wrote the run report to {args.report}')
@@ -0,0 +1,752 @@
+# -*- coding: utf-8 -*-
+'''
+The CoverLetterGenerator, holding the compiled template and the options of a run for the command line, services and other library callers
+'''
+
+import os
+import re
+import time
+import json
+import errno
+import hashlib
+import importlib.util
+import tempfile
+import itertools
+import threading
+from pathlib import Path
+from collections import defaultdict
+
+from .pdf import PDFPipeline, pdf_backends
+from .merge import MailMerge, concat_pdfs
+from .sinks import DirectorySink, get_run_id
+from .cache import RenderCache
+from .journal import RunJournal, get_run_identity
+from .report import RunStats
+from .template import CompiledDocxTemplate, TemplatePool
+from .manifest import get_context_hash, load_manifest, save_manifest
+
+def get_complete_path(out_dir, file_name, file_type='docx'):
+    '''
+    Appends the file_name to out_dir, as well as the suffix file type depending on entered string
+        @param out_dir: The directory of the FOLDER (company name) to output the generated cover letter
+        @param file_name: The name ONLY (no file type suffix) for the cover letter to be generated
+        @param file_type: The type of file to output, accepting only "docx" and "pdf" types
+        @return: The fully appended path of "out_dir/file_name.[file_type]"
+    '''
+
+    file_name_type = f'{file_name}.{file_type}'
+
+    if out_dir is None:
+        return file_name_type
+
+    out_path = os.path.join(out_dir, file_name_type)
+
+    return out_path
+
+class CoverLetterGenerator:
+    '''
+    Long-lived generator of cover letters, loading and compiling the template once and holding the options of the run, the PDF pipeline, the [--incremental] manifest and the progress journal
+        render() returns a cover letter as ".docx" bytes without touching the disk, while generate() hands it (and its ".pdf") to the output sink under the naming of the command line
+        The compiled template is re-used for every cover letter, so rendering is serialised by a lock and one generator may be shared between threads
+    '''
+
+    def __init__(self, template='cover-letter-template.docx', name=None, folder=True, pdf=False, pdf_backend='docx2pdf', pdf_workers=1, incremental=False, manifest='.cover-gen-manifest.json', sink=None, cache_dir=None, cache_max_bytes=1 << 30, template_rules=None, template_pool=8, engine='auto', merge=False, merge_output=None, journal=None, resume=False, journal_run=None, row_templates=False):
+        '''
+        Loads and compiles the template
+            @param template: The path (or file-like object) of the ".docx" template
+            @param name: The name of the applicant, used for file naming
+            @param folder: Whether to save generated cover letters in a subfolder named after the company
+            @param pdf: Whether generate() also converts each saved ".docx" to ".pdf"
+            @param pdf_backend: The converter used to create ".pdf" files, one of the keys of pdf_backends
+            @param pdf_workers: The number of threads converting ".docx" files to ".pdf" alongside rendering
+            @param incremental: Whether generate() skips cover letters that are up to date in the manifest
+            @param manifest: The path of the manifest file kept when incremental
+            @param sink: The OutputSink receiving the generated files, defaults to a DirectorySink of the working directory
+            @param cache_dir: The folder of a RenderCache shared across runs to take rendered and converted files from before rendering or converting them, None for no cache
+            @param cache_max_bytes: The size the RenderCache is kept below by evicting the least recently used files
+            @param template_rules: List of rules routing rows without a TEMPLATE of their own to other templates, each a dictionary of "when" (dictionary of context keys to regular expressions searched in their values) and "template" (the path of the template), the first matching rule wins and rows matching none use template
+            @param template_pool: The number of templates (besides template) kept compiled, each compiled on first use
+            @param engine: The rendering engine, "auto" for the XML substitution of XMLTemplate on templates of nothing but plain placeholders (docxtpl otherwise), "docxtpl" for docxtpl always
+            @param merge: Whether to convert every ".docx" of the run to ".pdf" in a single merged document (see MailMerge) rather than one by one, ignored with a warning if the PDF backend cannot split it back
+            @param merge_output: The path in the sink of a ".pdf" combining the ".pdf" of every cover letter of the run in order, None for no combined ".pdf"
+            @param journal: The path of the RunJournal recording each row of generate_many once its files are written, None for no journal
+            @param resume: Whether to skip the rows of generate_many recorded in the journal by an interrupted run, appending to its journal rather than starting a new one
+            @param journal_run: dictionary identifying the run at the head of the journal (see get_run_identity), which a resumed journal must have been started by, None to resume any journal
+            @param row_templates: Whether the TEMPLATE of a context (from a "template" column of the tracker) selects its template, contexts of any other source (e.g. the requests of [--serve]) never choose the file they are rendered with
+        '''
+
+        if pdf_backend not in pdf_backends:
+            raise ValueError(f'Unknown PDF backend "{pdf_backend}", must be one of {", ".join(sorted(pdf_backends))}')
+
+        sink = DirectorySink() if sink is None else sink
+        if incremental and not sink.local:
+            raise ValueError('Incremental runs need an output sink writing to local files, e.g. a DirectorySink')
+        if resume and not (journal is not None and sink.local):
+            raise ValueError('Resumed runs need a journal and an output sink writing to local files, e.g. a DirectorySink')
+        if merge_output is not None and not (pdf and sink.local):
+            raise ValueError('A combined merge output needs ".pdf" files written to local files, e.g. by a DirectorySink')
+        ## A merged document is only split back when the converter exports its bookmarks, otherwise it would be converted a second time one file at a time
+        if merge and not pdf_backends[pdf_backend].splits_merged:
+            print(f'The {pdf_backend} PDF backend does not export the bookmarks needed to split a merged document, converting the files one by one instead of merging them')
+            merge = False
+        ## Fails the run up front rather than once every cover letter is rendered, without importing pypdf before it is needed
+        if (merge or merge_output is not None) and importlib.util.find_spec('pypdf') is None:
+            raise ImportError('Merged runs split and combine ".pdf" files with pypdf, install it with "pip install pypdf"')
+
+        ## Kept to create the same generator in each worker process of generate_many
+        self.options = {
+            'template': template,
+            'name': name,
+            'folder': folder,
+            'pdf': pdf,
+            'pdf_backend': pdf_backend,
+            'pdf_workers': pdf_workers,
+            'incremental': incremental,
+            'manifest': manifest,
+            'sink': sink,
+            'cache_dir': cache_dir,
+            'cache_max_bytes': cache_max_bytes,
+            'template_rules': template_rules,
+            'template_pool': template_pool,
+            'engine': engine,
+            'merge': merge,
+            'merge_output': merge_output,
+            'journal': journal,
+            'resume': resume,
+            'journal_run': journal_run,
+            'row_templates': row_templates,
+        }
+
+        self.name = name
+        self.folder = folder
+        self.pdf = pdf
+        self.pdf_workers = pdf_workers
+        self.incremental = incremental
+        self.manifest_path = manifest
+        self.sink = sink
+        self.merge = merge
+        self.merge_output = merge_output
+
+        self.lock = threading.Lock()
+        self.errors = defaultdict(int)
+        self.failures = [] ## dictionaries of the type, company and role of every error, for the run report
+        self.stats = RunStats()
+
+        start = time.perf_counter()
+        try:
+            self.template = CompiledDocxTemplate(template, engine)
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT), template
+            )
+        self.stats.add('template', time.perf_counter() - start, 0)
+
+        ## Templates of rows routed by their TEMPLATE column or template_rules, by their absolute path resolved once per distinct path
+        self.template_path = os.path.abspath(template) if isinstance(template, (str, os.PathLike)) else None
+        self.templates = TemplatePool(template_pool, engine)
+        self.row_templates = row_templates
+        self.resolved = {}
+        self.rules = [({key: re.compile(pattern) for key, pattern in rule['when'].items()}, self.resolve_template(rule['template'])) for rule in template_rules or []] ## Fails before any row is rendered if a template of a rule does not exist
+
+        self.manifest = load_manifest(manifest) if incremental else {}
+        self.manifest_updates = {}
+
+        self.pdf_backend = None
+        self.pdf_pipeline = None
+        self.pdf_queue = None ## A list in pool workers, collecting the conversions to hand back to the main process
+        self.collected = None ## A list in pool workers of a non-local sink, collecting the rendered files to hand back to the main process
+
+        ## Files of non-local sinks are converted to ".pdf" in a staging folder, mapping each staged ".pdf" to its path in the sink
+        self.staging = None
+        self.staged = {}
+        self.staged_ids = itertools.count()
+
+        ## Render key (see get_render_key) of the content last written to each path of the sink in this run, so that rows with an identical context are rendered and converted once
+        self.written = {}
+
+        ## ".pdf" path of every cover letter of the run in order, combined into the merge_output once converted
+        self.merged = {}
+
+        self.cache = RenderCache(cache_dir, cache_max_bytes) if cache_dir is not None else None
+        self.cache_names = {} ## Maps each ".pdf" path queued for conversion to its name in the cache, to store it once converted
+
+        self.journal = RunJournal(journal, resume, journal_run) if journal is not None else None
+        if self.journal is not None and sink.local:
+            ## Temporary files are tagged with the journal, so the sink removes those an interrupted start of the run left in each folder it writes to
+            sink.run_id = get_run_id(os.path.abspath(journal))
+        self.resumed = self.journal.completed if self.journal is not None else set() ## (position, render key) of the rows completed by the interrupted run
+        self.journaled = None ## A list in pool workers of a journaled run, collecting the completed rows to hand back to the main process
+
+        ## Maps each ".pdf" path queued for conversion to the journal entries of its rows and the number of conversions still outstanding, the rows being complete once the last is converted
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+
+    @classmethod
+    def from_args(cls, args, sink=None):
+        '''
+        Creates the generator of a command line run
+            @param args: The parsed arguments, from parse_args
+            @param sink: The OutputSink selected with [--output]
+            @return: CoverLetterGenerator object
+        '''
+
+        return cls(
+            template=args.template,
+            name=args.name,
+            folder=args.folder or args.app_list is not None, ## Cover letters of a tracker are always saved by company
+            pdf=args.pdf,
+            pdf_backend=args.pdf_backend,
+            pdf_workers=args.pdf_workers,
+            incremental=args.incremental,
+            manifest=args.manifest,
+            sink=sink,
+            cache_dir=args.cache_dir,
+            cache_max_bytes=args.cache_max_bytes,
+            template_rules=load_template_rules(args.template_rules) if args.template_rules else None,
+            template_pool=args.template_pool,
+            engine=args.engine,
+            merge=args.merge,
+            merge_output=args.merge_output,
+            ## Runs of an [--app_list] to a folder keep a journal, [--watch] runs regenerate changed rows instead
+            journal=args.journal if args.app_list is not None and not args.watch and (sink is None or sink.local) else None,
+            resume=args.resume,
+            journal_run=get_run_identity(args),
+            row_templates=args.app_list is not None, ## Only a "template" column of the tracker names the templates of rows
+        )
+
+    def resolve_template(self, path, context=None):
+        '''
+        Resolves the path of a template of a rule or of the "template" column of the tracker, checking it once per distinct path rather than on every row
+            @param path: The path of the ".docx" template, relative to the working directory
+            @param context: The context of the row naming the template, None for a rule
+            @return: The absolute path of the template
+        '''
+
+        resolved = self.resolved.get(path)
+        if resolved is not None:
+            return resolved
+
+        source = f' (template of company {context.get("COMPANY")} and role {context.get("ROLE")})' if context is not None else ''
+        resolved = os.path.abspath(path)
+        if os.path.splitext(resolved)[1].lower() != '.docx':
+            raise ValueError(f'The template {path} is not a ".docx" file{source}')
+        if not os.path.isfile(resolved):
+            raise FileNotFoundError(errno.ENOENT, f'{os.strerror(errno.ENOENT)}{source}', path)
+
+        self.resolved[path] = resolved
+        return resolved
+
+    def get_template(self, context):
+        '''
+        Obtains the compiled template of a cover letter: that of its TEMPLATE (from a "template" column of the tracker, if row_templates) if set, else that of the first of the rules it matches, else template
+            @param context: The context of the cover letter
+            @return: CompiledDocxTemplate object
+        '''
+
+        path = self.resolve_template(context['TEMPLATE'], context) if self.row_templates and context.get('TEMPLATE') else None
+        if path is None:
+            for when, rule_path in self.rules:
+                if all(pattern.search(str(context.get(key) or '')) for key, pattern in when.items()):
+                    path = rule_path
+                    break
+
+        if path is None or path == self.template_path:
+            return self.template
+
+        count = self.templates.compiled
+        start = time.perf_counter()
+        template = self.templates.get(path)
+        if self.templates.compiled > count:
+            self.stats.add('template', time.perf_counter() - start, 0)
+
+        return template
+
+    def get_out_dir(self, context):
+        '''
+        Gets the folder associated with the company the cover letter is for, created by the sink (if need be) when the first file is written to it
+            @param context: The context of the cover letter, from RowSchema.context or get_args_context
+            @return: String version of the relative path of the folder assocaited to the comapny
+        '''
+
+        ## Defaults the out path to the name of the entered company as a subfolder
+        out_path = Path(f'./{context["COMPANY"]}/')
+
+        return str(out_path.as_posix())
+
+    def get_file_name(self, context):
+        '''
+        Obtains the raw file name of the saved cover letter in the format of "First Last-Company-Role"-Cover-Letter
+            @param context: The context of the cover letter, from RowSchema.context or get_args_context
+            @return: Name of the file without suffix for file type (e.g. ".pdf" or ".docx")
+        '''
+
+        file_name = f'{self.name}-{context["COMPANY"]}-{context["ROLE"]}-Cover-Letter'
+        return file_name
+
+    def get_out_paths(self, context):
+        '''
+        Obtains the paths of the ".docx" and ".pdf" files of a cover letter, relative to the sink
+            @param context: The context of the cover letter, from RowSchema.context or get_args_context
+            @return: Tuple of the ".docx" path and the ".pdf" path (None if not generating pdfs)
+        '''
+
+        out_dir = self.get_out_dir(context) if self.folder else None ## Gets the FOLDER of the output as needed
+        file_name = self.get_file_name(context) ## Gets the NAME of the file
+
+        out_docx = get_complete_path(out_dir, file_name, file_type='docx')
+        out_pdf = get_complete_path(out_dir, file_name, file_type='pdf') if self.pdf else None
+
+        return out_docx, out_pdf
+
+    def get_pdf_backend(self):
+        '''
+        Creates the converter selected with pdf_backend on first use, returning the same backend on every later call
+            @return: PDFBackend object
+        '''
+
+        if self.pdf_backend is None:
+            self.pdf_backend = pdf_backends[self.options['pdf_backend']]()
+
+        return self.pdf_backend
+
+    def get_pdf_pipeline(self):
+        '''
+        Starts the PDFPipeline with pdf_workers converter threads on first use, returning the same pipeline on every later call
+            Started lazily so that the threads only exist in the main process, after any pool of worker processes has been forked
+            @return: PDFPipeline object
+        '''
+
+        if self.pdf_pipeline is None:
+            pipeline = MailMerge if self.merge else PDFPipeline
+            self.pdf_pipeline = pipeline(self.get_pdf_backend(), self.pdf_workers, on_converted=self.store_converted_pdf, stats=self.stats, run_id=self.sink.run_id)
+
+        return self.pdf_pipeline
+
+    def get_pdf_cache_name(self, key):
+        '''
+        Obtains the name of a converted ".pdf" in the cache, which depends on the converter as well as the render key
+            @param key: The render key of the cover letter, from get_render_key
+            @return: The name of the file in the cache
+        '''
+
+        return f'{key}.{self.options["pdf_backend"]}.pdf'
+
+    def complete(self, journal_entry):
+        '''
+        Records a row whose files are all written in the journal, or in a pool worker (where journaled is a list) collects it to be handed back to the main process
+            @param journal_entry: Tuple of the position and render key of the row, None for a row that is not journaled
+        '''
+
+        if journal_entry is None:
+            return
+
+        if self.journaled is not None:
+            self.journaled.append(journal_entry)
+        elif self.journal is not None:
+            self.journal.record(*journal_entry)
+
+    def convert_pdf(self, out_docx, out_pdf, company, role, key=None, journal_entry=None, template_hash=None):
+        '''
+        Hands a generated ".docx" to the PDF pipeline, or in a pool worker (where pdf_queue is a list) collects it to be handed back to the main process
+            @param out_docx: The path of the ".docx" file to convert
+            @param out_pdf: The path of the ".pdf" file to create
+            @param company: The company of the cover letter
+            @param role: The role of the cover letter
+            @param key: The render key of the cover letter, to store the converted ".pdf" in the cache under, None to not cache it
+            @param journal_entry: Tuple of the position and render key of the row, recorded in the journal once converted, None for a row that is not journaled
+            @param template_hash: The hash of the template the cover letter was rendered from, grouping the files merged together in [--merge] mode
+        '''
+
+        if self.pdf_queue is not None:
+            self.pdf_queue.append((out_docx, out_pdf, company, role, key, journal_entry, template_hash))
+            return
+
+        if key is not None and self.cache is not None:
+            self.cache_names[out_pdf] = self.get_pdf_cache_name(key)
+        if journal_entry is not None:
+            with self.pending_lock:
+                entries, outstanding = self.pending.get(out_pdf, ((), 0))
+                ## The MailMerge converts only the last file queued for a path
+                self.pending[out_pdf] = (entries + (journal_entry,), 1 if self.merge else outstanding + 1)
+        self.get_pdf_pipeline().put(out_docx, out_pdf, company, role, template_hash)
+
+    def stage(self, out_docx, out_pdf, data):
+        '''
+        Writes the ".docx" of a non-local sink to the staging folder, for the PDF converters to read
+            @param out_docx: The path of the ".docx" file in the sink
+            @param out_pdf: The path of the ".pdf" file in the sink
+            @param data: The bytes of the ".docx"
+            @return: Tuple of the staged ".docx" path and the ".pdf" path to convert it to
+        '''
+
+        if self.staging is None:
+            self.staging = tempfile.TemporaryDirectory(prefix='cover-gen-staging-')
+
+        ## A folder per file, as the same path may be written again while its previous version still waits for conversion
+        folder = os.path.join(self.staging.name, str(next(self.staged_ids)))
+        os.mkdir(folder)
+
+        staged_docx = os.path.join(folder, os.path.basename(out_docx))
+        staged_pdf = os.path.join(folder, os.path.basename(out_pdf))
+        with open(staged_docx, 'wb') as f:
+            f.write(data)
+
+        self.staged[staged_pdf] = out_pdf
+        return staged_docx, staged_pdf
+
+    def store_converted_pdf(self, out_docx, out_pdf):
+        '''
+        Called by the PDFPipeline for each converted file, storing the ".pdf" in the cache and writing the ".pdf" of a staged ".docx" to the sink, removing both from the staging folder, then recording its rows in the journal
+            @param out_docx: The path of the converted ".docx" file
+            @param out_pdf: The path of the created ".pdf" file
+        '''
+
+        cache_name = self.cache_names.pop(out_pdf, None)
+        if cache_name is not None or out_pdf in self.staged:
+            with open(out_pdf, 'rb') as f:
+                data = f.read()
+
+            if cache_name is not None:
+                self.cache.put(cache_name, data)
+
+            if out_pdf in self.staged:
+                self.sink.write(self.staged.pop(out_pdf), data)
+                os.remove(out_docx)
+                os.remove(out_pdf)
+
+        ## Rows of a path queued again are only complete once its last conversion is done
+        with self.pending_lock:
+            entries, outstanding = self.pending.pop(out_pdf, ((), 0))
+            if outstanding > 1:
+                self.pending[out_pdf] = (entries, outstanding - 1)
+                entries = ()
+        for journal_entry in entries:
+            self.complete(journal_entry)
+
+    def save(self, out_docx, out_pdf, data, company, role, key=None, journal_entry=None, template_hash=None):
+        '''
+        Writes the rendered ".docx" to the sink and queues its conversion to ".pdf" as need be, copying the ".pdf" from the cache instead if it was converted before
+            @param out_docx: The path of the ".docx" file in the sink
+            @param out_pdf: The path of the ".pdf" file in the sink, None if not generating pdfs
+            @param data: The bytes of the ".docx"
+            @param company: The company of the cover letter
+            @param role: The role of the cover letter
+            @param key: The render key of the cover letter, None if not cached
+            @param journal_entry: Tuple of the position and render key of the row, recorded in the journal once its files are written, None for a row that is not journaled
+            @param template_hash: The hash of the template the cover letter was rendered from, grouping the files merged together in [--merge] mode
+        '''
+
+        self.sink.write(out_docx, data)
+
+        if out_pdf is None:
+            self.complete(journal_entry)
+            return
+
+        if key is not None and self.cache is not None:
+            cached = self.cache.get(self.get_pdf_cache_name(key))
+            if cached is not None:
+                self.stats.count('cached_pdf')
+                self.sink.write(out_pdf, cached)
+                self.complete(journal_entry)
+                return
+
+        if self.sink.local:
+            self.convert_pdf(self.sink.get_local_path(out_docx), self.sink.get_local_path(out_pdf), company, role, key, journal_entry, template_hash)
+        else:
+            self.convert_pdf(*self.stage(out_docx, out_pdf, data), company, role, key, journal_entry, template_hash)
+
+    def add_merged(self, out_pdf):
+        '''
+        Records the ".pdf" of a cover letter for the merge_output, moving it to the end if already recorded as only the last row written to a file is kept
+            @param out_pdf: The path of the ".pdf" file in the sink
+        '''
+
+        self.merged.pop(out_pdf, None)
+        self.merged[out_pdf] = None
+
+    def is_up_to_date(self, out_docx, entry):
+        '''
+        Determines whether a cover letter can be skipped in an incremental run
+            @param out_docx: The path of the ".docx" file of the cover letter
+            @param entry: The manifest entry the cover letter would be generated with
+            @return: True if the manifest has the same entry and all its output files exist
+        '''
+
+        return self.manifest.get(out_docx) == entry and os.path.exists(out_docx) and (entry['pdf'] is None or os.path.exists(entry['pdf']))
+
+    def render(self, context):
+        '''
+        Renders a single cover letter in memory
+            @param context: dictionary of the context passed to the template
+            @return: The bytes of the rendered ".docx"
+        '''
+
+        with self.lock:
+            template = self.get_template(context)
+            if template.xml_template is None:
+                return template.render_bytes(context)
+
+        ## The XMLTemplate keeps no state, so cover letters are rendered outside of the lock
+        return template.render_bytes(context)
+
+    def render_many(self, contexts):
+        '''
+        Renders cover letters in memory one after another
+            @param contexts: Iterable of contexts, e.g. from RowSchema.contexts
+            @return: Generator of the bytes of each rendered ".docx", in the order of contexts
+        '''
+
+        for context in contexts:
+            yield self.render(context)
+
+    def get_render_key(self, context_hash, template=None):
+        '''
+        Obtains the content address of a rendered cover letter, the same for every context rendering to the same bytes
+            The engine is part of the key as the XML substitution and docxtpl may render the same template and context to different bytes
+            @param context_hash: The hash of the context, from get_context_hash
+            @param template: The CompiledDocxTemplate the context is rendered with, defaults to template
+            @return: Hex string of the sha256 of the template hash, rendering engine and context hash
+        '''
+
+        template = self.template if template is None else template
+        return hashlib.sha256(f'{template.template_hash}:{template.engine}:{context_hash}'.encode('ascii')).hexdigest()
+
+    def generate(self, context, row=None):
+        '''
+        Renders and saves a single cover letter (from the command line arguments or a row of the tracker), and queues its conversion to ".pdf" as need be
+            A row whose output files were already written in this run with an identical context (e.g. the same company and role listed under several recruiters) is neither rendered, written nor converted again
+            A cover letter found in the cache (rendered by an earlier run with the same template and context) is copied from it rather than rendered or converted
+            A row recorded in the journal of an interrupted run being resumed is skipped without looking at its output files
+            @param context: The context of the cover letter, from RowSchema.context or get_args_context
+            @param row: The position of the row in the run, recorded in the journal once its files are written, None for a row that is not journaled
+            @return: True if the cover letter was generated, False if skipped as up to date by incremental or as completed by the resumed run
+        '''
+
+        out_docx, out_pdf = self.get_out_paths(context)
+        context_hash = get_context_hash(context)
+        with self.lock:
+            template = self.get_template(context)
+
+        if self.merge_output is not None:
+            self.add_merged(out_pdf)
+
+        key = self.get_render_key(context_hash, template)
+        journal_entry = (row, key) if row is not None and (self.journal is not None or self.journaled is not None) else None
+
+        if self.incremental:
+            local_docx = self.sink.get_local_path(out_docx)
+            entry = {'context': context_hash, 'template': template.template_hash, 'pdf': self.sink.get_local_path(out_pdf) if out_pdf else None}
+
+        if journal_entry in self.resumed:
+            self.stats.count('resumed')
+            self.written[out_docx] = key
+            if out_pdf is not None:
+                self.written[out_pdf] = key
+            if self.incremental:
+                self.manifest_updates[local_docx] = entry
+            return False
+
+        if self.incremental and self.is_up_to_date(local_docx, entry):
+            self.complete(journal_entry)
+            return False
+
+        if self.written.get(out_docx) == key and (out_pdf is None or self.written.get(out_pdf) == key):
+            self.stats.count('deduplicated')
+            self.complete(journal_entry) ## Written (or queued for conversion) by the earlier row, which a resumed run regenerates if it was not completed
+            if self.incremental:
+                self.manifest_updates[local_docx] = entry
+            return True
+
+        data = self.cache.get(f'{key}.docx') if self.cache is not None else None
+        if data is not None:
+            self.stats.count('cached')
+            rendered = time.perf_counter()
+        else:
+            start = time.perf_counter()
+            data = self.render(context)
+            rendered = time.perf_counter()
+            self.stats.add('render', rendered - start)
+            if self.cache is not None:
+                self.cache.put(f'{key}.docx', data)
+                rendered = time.perf_counter()
+
+        cache_key = key if self.cache is not None else None
+        if self.collected is not None:
+            self.collected.append((out_docx, out_pdf, data, context['COMPANY'], context['ROLE'], cache_key, journal_entry, template.template_hash))
+        else:
+            self.save(out_docx, out_pdf, data, context['COMPANY'], context['ROLE'], cache_key, journal_entry, template.template_hash)
+            self.stats.add('save', time.perf_counter() - rendered)
+
+        self.written[out_docx] = key
+        if out_pdf is not None:
+            self.written[out_pdf] = key ## Its conversion is queued, or already done
+
+        if self.incremental:
+            self.manifest_updates[local_docx] = entry
+
+        return True
+
+    def generate_many(self, contexts, workers=1):
+        '''
+        Generates cover letters one after another, or spread across a pool of worker processes grouped by output file name so that output files and their contents are deterministic regardless of scheduling
+            Each row is journaled under its position in contexts, so a resumed run must be given the same rows in the same order
+            @param contexts: Iterable of contexts of the cover letters, all held in memory while grouped if workers > 1
+            @param workers: The number of worker processes, 1 to generate in this process
+            @return: Tuple of the number of cover letters generated and the number skipped as up to date or completed by the resumed run
+        '''
+
+        count = 0
+        skipped = 0
+
+        if workers <= 1:
+            for row, context in enumerate(contexts):
+                if self.generate(context, row):
+                    count += 1
+                else:
+                    skipped += 1
+            return count, skipped
+
+        import multiprocessing
+
+        groups = defaultdict(list)
+        for row, context in enumerate(contexts):
+            groups[self.get_file_name(context)].append((row, context))
+            if self.merge_output is not None:
+                self.add_merged(self.get_out_paths(context)[1])
+
+        chunksize = max(1, len(groups) // (workers * 4))
+
+        ## Workers write to local sinks themselves, and otherwise hand the rendered files back to be written to the sink of this process
+        collect = not self.sink.local
+        ## The journal is only written by this process, the workers hand back the rows they completed
+        worker_options = dict(self.options, sink=None if collect else self.sink, journal=None, resume=False)
+        journaled = self.journal is not None
+
+        with multiprocessing.Pool(workers, initializer=init_worker, initargs=(worker_options, collect, journaled, self.resumed)) as pool:
+            for count_batch, skipped_batch, errors_batch, pairs, updates, collected, completed, stats in pool.imap(render_batch, groups.values(), chunksize=chunksize):
+                count += count_batch
+                skipped += skipped_batch
+                self.manifest_updates.update(updates)
+                self.stats.merge(stats)
+                for key, value in errors_batch.items():
+                    self.errors[key] += value
+                for journal_entry in completed:
+                    self.complete(journal_entry)
+                for pair in pairs:
+                    self.convert_pdf(*pair)
+                for out_docx, out_pdf, data, company, role, key, journal_entry, template_hash in collected:
+                    start = time.perf_counter()
+                    self.save(out_docx, out_pdf, data, company, role, key, journal_entry, template_hash)
+                    self.stats.add('save', time.perf_counter() - start)
+
+        return count, skipped
+
+    def close(self):
+        '''
+        Waits for the PDF pipeline to convert everything still queued, closes the sink, keeps the cache below its size, saves the manifest of an incremental run and closes the journal
+            @return: List of tuples of (company, role, ".docx" path) that could not be converted, also counted in errors['pdf'] and added to failures
+        '''
+
+        failed = []
+        if self.pdf_pipeline is not None:
+            failed = self.pdf_pipeline.close()
+            self.pdf_pipeline = None
+            for company, role, out_docx in failed:
+                self.errors['pdf'] += 1
+                self.failures.append({'type': 'pdf', 'company': company, 'role': role, 'value': out_docx})
+                self.manifest_updates.pop(out_docx, None) ## Regenerated next run, as its ".pdf" is missing or stale
+                self.manifest.pop(out_docx, None)
+
+        if self.merge_output is not None and self.merged:
+            start = time.perf_counter()
+            paths = [path for path in map(self.sink.get_local_path, self.merged) if os.path.exists(path)]
+            if paths:
+                self.sink.write(self.merge_output, concat_pdfs(paths))
+            self.stats.add('merge', time.perf_counter() - start, 0)
+
+        self.sink.close()
+
+        if self.cache is not None:
+            self.cache.evict()
+
+        if self.staging is not None:
+            self.staging.cleanup()
+            self.staging = None
+            self.staged.clear()
+
+        if self.incremental:
+            self.manifest.update(self.manifest_updates)
+            self.manifest_updates = {}
+            save_manifest(self.manifest_path, self.manifest)
+
+        if self.journal is not None:
+            self.journal.close()
+
+        return failed
+
+def load_template_rules(path):
+    '''
+    Loads the rules of [--template_rules]
+        @param path: The path of a JSON file of a list of rules, e.g. [{"when": {"ROLE": "(?i)engineer"}, "template": "engineering.docx"}]
+        @return: List of the rules
+    '''
+
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+
+    if not isinstance(rules, list) or not all(isinstance(rule, dict) and isinstance(rule.get('when'), dict) and rule.get('template') for rule in rules):
+        raise ValueError(f'{path} must be a JSON list of rules of "when" (an object of context keys to regular expressions) and "template"')
+
+    return rules
+
+## The generator of each pool worker process, created once by init_worker
+worker_generator = None
+
+def init_worker(options, collect=False, journaled=False, resumed=frozenset()):
+    '''
+    Initializer of each process in the pool, loading the template once for the lifetime of the worker
+        @param options: The options of the CoverLetterGenerator of the main process
+        @param collect: Whether to hand the rendered files back to the main process rather than writing them to the sink
+        @param journaled: Whether to hand the completed rows back to the main process to record in its journal
+        @param resumed: The (position, render key) of the rows completed by the interrupted run being resumed, skipped
+    '''
+
+    global worker_generator
+    worker_generator = CoverLetterGenerator(**options)
+    worker_generator.pdf_queue = []
+    if collect:
+        worker_generator.collected = []
+    if journaled:
+        worker_generator.journaled = []
+        worker_generator.resumed = resumed
+
+def render_batch(rows):
+    '''
+    Renders (and saves) a group of cover letters sharing the same output file in order within a worker process, so that the last row written wins as it would in a sequential run
+        @param rows: List of tuples of the position and context of the cover letters
+        @return: Tuple of the number of cover letters generated, the number skipped as up to date, the error counts incurred while generating them, the conversions to hand to the PDF pipeline of the main process, the manifest entries of the generated cover letters, the rendered files to hand to the sink of the main process (if collected), the rows completed (if journaled) and the recorded stage timings
+    '''
+
+    generator = worker_generator
+    generator.errors.clear()
+    generator.manifest_updates.clear()
+
+    count = 0
+    for row, context in rows:
+        if generator.generate(context, row):
+            count += 1
+
+    pairs = generator.pdf_queue[:]
+    generator.pdf_queue.clear()
+
+    collected = []
+    if generator.collected is not None:
+        collected = generator.collected[:]
+        generator.collected.clear()
+
+    completed = []
+    if generator.journaled is not None:
+        completed = generator.journaled[:]
+        generator.journaled.clear()
+
+    return count, len(rows) - count, dict(generator.errors), pairs, dict(generator.manifest_updates), collected, completed, generator.stats.pop_state()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+'''
+The progress journal of [--app_list] runs, recording each row as soon as its files are written so that [--resume] continues an interrupted run where it stopped
+'''
+
+import os
+import json
+import time
+import threading
+
+def get_run_identity(args):
+    '''
+    Identifies the run of a command line, written at the head of its journal so that [--resume] never continues the journal of a run of another tracker, template or output
+        @param args: The parsed arguments, from parse_args
+        @return: dictionary of the absolute paths of the [--app_list], [--template] and [--output] folder, and the [--shard] and [--where] expression of the run
+    '''
+
+    return {
+        'app_list': os.path.abspath(args.app_list) if args.app_list is not None else None,
+        'template': os.path.abspath(args.template),
+        'output': os.path.abspath(args.output or '.'),
+        'shard': f'{args.shard[0]}/{args.shard[1]}' if args.shard is not None else None,
+        'where': args.where.text if args.where is not None else None,
+    }
+
+def read_journal_run(path):
+    '''
+    Reads the run a journal was started by, from its first line
+        @param path: The path of the journal file
+        @return: dictionary identifying the run (see get_run_identity), None if no (readable) journal exists or it was started without one
+    '''
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.loads(f.readline()).get('run')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def load_journal(path):
+    '''
+    Loads the rows completed by the run that wrote a journal
+        @param path: The path of the journal file
+        @return: Tuple of the set of the (position, render key) of every completed row and whether the last line was torn by the run being killed mid-write, empty if no (readable) journal exists
+    '''
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+    except FileNotFoundError:
+        return set(), False
+    except (OSError, ValueError) as e:
+        print(f'Could not read journal {path}, regenerating all cover letters. Error: {e}')
+        return set(), False
+
+    completed = set()
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            completed.add((entry['row'], entry['key']))
+        except (ValueError, TypeError, KeyError):
+            continue ## The run at the head of the journal, the empty string after the last newline, or a torn last line
+
+    return completed, lines[-1] != ''
+
+class RunJournal:
+    '''
+    Append-only journal of the rows of a run whose files are all written, one JSON line of the position of the row in the run and its render key (see CoverLetterGenerator.get_render_key) each, after a first line identifying the run
+        A row is only skipped on [--resume] if it is at the same position with the same template and context, so a tracker or template edited in between is regenerated where it changed
+        Lines are flushed as written and synced to disk at most every sync_interval seconds, so a crash of the machine loses at most the rows of the last interval (generated again on resume)
+    '''
+
+    sync_interval = 1.0
+
+    def __init__(self, path, resume=False, run=None):
+        '''
+        Opens the journal, starting a new one unless resuming
+            @param path: The path of the journal file, its folder created if need be
+            @param resume: Whether to load the rows completed by the interrupted run and append to its journal
+            @param run: dictionary identifying the run (see get_run_identity), which the journal resumed must have been started by, None to resume any journal
+        '''
+
+        if resume and run is not None:
+            started = read_journal_run(path)
+            if started is not None and started != run:
+                changed = ', '.join(key for key in run if run[key] != started.get(key))
+                raise ValueError(f'The journal {path} was started by another run (a different {changed}), start a new run rather than resuming it')
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        self.path = path
+        self.completed, torn = load_journal(path) if resume else (set(), False)
+        new = not (resume and os.path.exists(path) and os.path.getsize(path))
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if torn:
+            self.file.write('\n') ## Ends the torn line, so the next row is not appended to it
+        if new:
+            self.file.write(json.dumps({'run': run}) + '\n')
+            self.file.flush()
+        self.lock = threading.Lock()
+        self.synced = time.monotonic()
+
+    def record(self, row, key):
+        '''
+        Appends a completed row, called from the rendering thread and the converter threads of the PDFPipeline alike
+            @param row: The position of the row in the run
+            @param key: The render key of the row
+        '''
+
+        line = json.dumps({'row': row, 'key': key}) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            if time.monotonic() - self.synced >= self.sync_interval:
+                os.fsync(self.file.fileno())
+                self.synced = time.monotonic()
+
+    def close(self):
+        '''
+        Syncs and closes the journal
+        '''
+
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
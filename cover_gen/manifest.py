@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+'''
+The manifest of [--incremental] runs, recording the context and template each cover letter was generated with
+'''
+
+import os
+import json
+import hashlib
+
+def get_context_hash(context):
+    '''
+    Obtains a stable hash of the context of a cover letter
+        @param context: The context dictionary passed to the template
+        @return: Hex string of the sha256 of the context serialized with sorted keys
+    '''
+
+    return hashlib.sha256(json.dumps(context, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def load_manifest(path):
+    '''
+    Loads the manifest of a previous [--incremental] run, mapping the ".docx" path of each cover letter to the context hash, template hash and ".pdf" path it was generated with
+        @param path: The path of the manifest file
+        @return: dictionary of the manifest, empty if no (readable) manifest exists
+    '''
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f'Could not read manifest {path}, regenerating all cover letters. Error: {e}')
+        return {}
+
+    return manifest if isinstance(manifest, dict) else {}
+
+def save_manifest(path, manifest):
+    '''
+    Writes the manifest to a temporary file first and then replaces the old one, so an interrupted run never leaves a partially written manifest
+        @param path: The path of the manifest file
+        @param manifest: dictionary of the manifest
+    '''
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+'''
+Mail merge mode of the command line [--merge]: every generated ".docx" is appended as a section of a single document, converted to ".pdf" in one call to the PDF backend and split back into the ".pdf" of each cover letter
+    The first page of each cover letter is found from a bookmark placed at its start, which the converter exports as a named destination of the ".pdf"
+    pypdf (pip install pypdf) is needed to read and split the converted ".pdf"
+'''
+
+import os
+import re
+import time
+import zipfile
+import tempfile
+import posixpath
+from copy import deepcopy
+
+from .sinks import get_tmp_path
+
+## Name of the bookmark placed at the start of the cover letter at each index of the merged document
+bookmark_prefix = 'cover_gen_'
+
+## Content types of the headers and footers copied into a merged document, by relationship type
+content_types = {
+    'http://schemas.openxmlformats.org/officeDocument/2006/relationships/header': 'application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml',
+    'http://schemas.openxmlformats.org/officeDocument/2006/relationships/footer': 'application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml',
+}
+
+## Children of a w:sectPr that follow w:pgNumType, in the order of the schema
+after_pgnumtype = ('cols', 'formProt', 'vAlign', 'noEndnote', 'titlePg', 'textDirection', 'bidi', 'rtlGutter', 'docGrid', 'printerSettings', 'sectPrChange')
+
+def read_rels(archive, partname):
+    '''
+    Reads the relationships of a part of a ".docx"
+        @param archive: The ZipFile of the ".docx"
+        @param partname: The name of the part, e.g. "word/document.xml"
+        @return: dictionary of the id of every relationship to the tuple of its type, target (the name of the part, or the URL of an external target) and whether it is external
+    '''
+
+    from docx.oxml import parse_xml
+
+    folder, name = posixpath.split(partname)
+    try:
+        root = parse_xml(archive.read(posixpath.join(folder, '_rels', f'{name}.rels')))
+    except KeyError:
+        return {}
+
+    rels = {}
+    for rel in root:
+        external = rel.get('TargetMode') == 'External'
+        target = rel.get('Target') if external else posixpath.normpath(posixpath.join(folder, rel.get('Target'))).lstrip('/')
+        rels[rel.get('Id')] = (rel.get('Type'), target, external)
+    return rels
+
+def copy_part(merged, archive, partname, reltype, parts, copies):
+    '''
+    Adds a header or footer of a cover letter to the merged document, unless the merged document already has one with the same content
+        @param merged: The merged python-docx Document
+        @param archive: The ZipFile of the ".docx" of the cover letter
+        @param partname: The name of the header or footer part in the cover letter, e.g. "word/header1.xml"
+        @param reltype: The relationship type of the part
+        @param parts: dictionary of the name of every part of the merged document (as loaded) to the part
+        @param copies: dictionary of the content of every header and footer added so far to its relationship id in the merged document
+        @return: The relationship id of the part in the merged document
+    '''
+
+    from docx.opc.part import Part
+
+    blob = archive.read(partname)
+    if blob in copies:
+        return copies[blob]
+
+    package = merged.part.package
+    copy = Part(package.next_partname(re.sub(r'\d*\.xml$', '%d.xml', f'/{partname}')), content_types[reltype], blob, package)
+    for rid, (rel_type, target, external) in read_rels(archive, partname).items():
+        if external:
+            copy.rels.add_relationship(rel_type, target, rid, is_external=True)
+        elif f'/{target}' in parts:
+            ## Images of the header are the same parts as those of the merged document, as every cover letter of a merged document shares its template
+            copy.rels.add_relationship(rel_type, parts[f'/{target}'], rid)
+
+    rid = merged.part.relate_to(copy, reltype)
+    copies[blob] = rid
+    return rid
+
+def set_section(sectpr):
+    '''
+    Makes a section of the merged document start on a new page numbered from 1, as each cover letter did on its own
+        @param sectpr: The w:sectPr element of the section
+    '''
+
+    from docx.oxml.ns import qn
+    from docx.oxml import OxmlElement
+
+    section_type = sectpr.find(qn('w:type'))
+    if section_type is not None:
+        section_type.set(qn('w:val'), 'nextPage')
+
+    numbering = sectpr.find(qn('w:pgNumType'))
+    if numbering is None:
+        numbering = OxmlElement('w:pgNumType')
+        following = [child for child in sectpr if child.tag in [qn(f'w:{tag}') for tag in after_pgnumtype]]
+        if following:
+            following[0].addprevious(numbering)
+        else:
+            sectpr.append(numbering)
+    numbering.set(qn('w:start'), '1')
+
+def add_bookmark(element, idx):
+    '''
+    Places the bookmark of a cover letter at the start of its first element
+        @param element: The first element of the body of the cover letter
+        @param idx: The index of the cover letter in the merged document
+    '''
+
+    from docx.oxml.ns import qn
+    from docx.oxml import OxmlElement
+
+    start = OxmlElement('w:bookmarkStart', {qn('w:id'): str(idx), qn('w:name'): f'{bookmark_prefix}{idx}'})
+    end = OxmlElement('w:bookmarkEnd', {qn('w:id'): str(idx)})
+
+    if element.tag == qn('w:p'):
+        properties = element.find(qn('w:pPr'))
+        position = 1 if properties is not None else 0
+        element.insert(position, start)
+        element.insert(position + 1, end)
+    else:
+        element.addprevious(start)
+        element.addprevious(end)
+
+def get_parts_key(path):
+    '''
+    Keys a ".docx" by the bytes of every part that merge_documents takes from the first file of a merged document
+        @param path: The path of the ".docx" file
+        @return: Tuple of the names and bytes of the parts, None if the file cannot be read
+    '''
+
+    try:
+        with zipfile.ZipFile(path) as archive:
+            ## The body, headers and footers of every file are copied into the merged document, and so not compared
+            own = {'word/document.xml', 'word/_rels/document.xml.rels'}
+            for reltype, partname, external in read_rels(archive, 'word/document.xml').values():
+                if not external and reltype in content_types:
+                    folder, name = posixpath.split(partname)
+                    own.update((partname, posixpath.join(folder, '_rels', f'{name}.rels')))
+            return tuple((name, archive.read(name)) for name in sorted(archive.namelist()) if name not in own)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+def merge_documents(paths, out_docx):
+    '''
+    Appends the body of every cover letter as a section of a single document, each with its own headers and footers and starting on a new page
+        Every cover letter must be rendered from the same template, whose other parts (styles, numbering, footnotes, images) are taken from the first cover letter
+        @param paths: List of the paths of the ".docx" files of the cover letters
+        @param out_docx: The path of the merged ".docx" to create
+    '''
+
+    from docx import Document
+    from docx.oxml.ns import qn
+    from docx.oxml import OxmlElement, parse_xml
+    from docx.opc.constants import RELATIONSHIP_TYPE as RT
+
+    merged = Document(paths[0])
+    final = merged.element.body.find(qn('w:sectPr'))
+    parts = {str(part.partname): part for part in merged.part.package.iter_parts()}
+
+    ## Cover letters whose headers and footers are the same as those of the first share its parts
+    copies = {}
+    with zipfile.ZipFile(paths[0]) as archive:
+        rels = read_rels(archive, 'word/document.xml')
+        for tag in ('w:headerReference', 'w:footerReference'):
+            for reference in final.findall(qn(tag)):
+                _, partname, _ = rels[reference.get(qn('r:id'))]
+                copies[archive.read(partname)] = reference.get(qn('r:id'))
+
+    for idx, path in enumerate(paths):
+        if idx == 0:
+            body = merged.element.body
+            sectpr = deepcopy(final)
+        else:
+            ## Only the body, headers and footers of every later cover letter are read, rather than all its parts loaded with python-docx
+            with zipfile.ZipFile(path) as archive:
+                body = parse_xml(archive.read('word/document.xml')).find(qn('w:body'))
+                sectpr = body.find(qn('w:sectPr'))
+                rels = read_rels(archive, 'word/document.xml')
+                for tag, reltype in (('w:headerReference', RT.HEADER), ('w:footerReference', RT.FOOTER)):
+                    for reference in sectpr.findall(qn(tag)):
+                        _, partname, _ = rels[reference.get(qn('r:id'))]
+                        reference.set(qn('r:id'), copy_part(merged, archive, partname, reltype, parts, copies))
+
+        elements = [element for element in body if element.tag != qn('w:sectPr')]
+        if idx > 0:
+            for element in elements:
+                final.addprevious(element)
+
+        if not elements:
+            elements = [OxmlElement('w:p')]
+            final.addprevious(elements[0])
+        add_bookmark(elements[0], idx)
+        set_section(sectpr)
+
+        if idx == len(paths) - 1:
+            final.getparent().replace(final, sectpr)
+            break
+
+        ## The properties of every section but the last are held by its last paragraph
+        last = elements[-1]
+        if last.tag != qn('w:p'):
+            last = OxmlElement('w:p')
+            final.addprevious(last)
+        last.get_or_add_pPr().append(sectpr)
+
+    merged.save(out_docx)
+
+def get_page_ranges(reader, count):
+    '''
+    Finds the pages of every cover letter of a merged ".pdf" from the named destinations of their bookmarks
+        @param reader: The pypdf PdfReader of the merged ".pdf"
+        @param count: The number of cover letters merged
+        @return: List of tuples of the first and last (exclusive) page of each cover letter, None if the converter did not export every bookmark
+    '''
+
+    starts = {}
+    for name, destination in reader.named_destinations.items():
+        if name.startswith(bookmark_prefix) and name[len(bookmark_prefix):].isdigit():
+            starts[int(name[len(bookmark_prefix):])] = reader.get_destination_page_number(destination)
+
+    starts = [starts.get(idx) for idx in range(count)]
+    if None in starts or starts[0] != 0 or any(start >= end for start, end in zip(starts, starts[1:] + [len(reader.pages)])):
+        return None
+
+    return list(zip(starts, starts[1:] + [len(reader.pages)]))
+
+def split_pdf(reader, page_range, out_pdf, run_id=None):
+    '''
+    Writes the pages of a cover letter of a merged ".pdf" to a file of its own
+        @param reader: The pypdf PdfReader of the merged ".pdf"
+        @param page_range: Tuple of the first and last (exclusive) page of the cover letter
+        @param out_pdf: The path of the ".pdf" to create
+        @param run_id: Optional id of the run tagging the temporary ".pdf" (see get_tmp_path)
+    '''
+
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for page in range(*page_range):
+        writer.add_page(reader.pages[page])
+
+    ## Written to a temporary file and renamed into place, so a run killed mid-write never leaves a partial ".pdf"
+    tmp_pdf = get_tmp_path(out_pdf, run_id)
+    try:
+        with open(tmp_pdf, 'wb') as f:
+            writer.write(f)
+        os.replace(tmp_pdf, out_pdf)
+    except BaseException:
+        if os.path.exists(tmp_pdf):
+            os.remove(tmp_pdf)
+        raise
+
+def concat_pdfs(paths):
+    '''
+    Concatenates ".pdf" files into one, e.g. the combined output of [--merge_output]
+        @param paths: List of the paths of the ".pdf" files, in order
+        @return: The bytes of the combined ".pdf"
+    '''
+
+    import io
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(path)
+
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+class MailMerge:
+    '''
+    Drop-in replacement of the PDFPipeline in [--merge] mode: the queued files are merged and converted in a single call to the PDF backend once close() is called
+        Cover letters of different templates are merged into a document per template, and if the converter does not export the bookmarks as named destinations the files are converted one by one instead
+    '''
+
+    def __init__(self, backend, workers=1, on_converted=None, stats=None, run_id=None):
+        '''
+            @param backend: The PDFBackend to convert with
+            @param workers: The number of converter threads converting the files one by one if the merged ".pdf" cannot be split
+            @param on_converted: Optional function called with the ".docx" and ".pdf" paths of each converted file, a file counts as failed if it raises
+            @param stats: Optional RunStats to record the time of merging and converting under the "merge" and "pdf" stages
+            @param run_id: Optional id of the run tagging the temporary ".pdf" files (see get_tmp_path)
+        '''
+
+        self.backend = backend
+        self.run_id = run_id
+        self.workers = workers
+        self.on_converted = on_converted
+        self.stats = stats
+        self.items = {} ## Maps the ".pdf" path of each queued file to its tuple of (".docx" path, ".pdf" path, company, role), the last queued for a path wins
+        self.groups = {} ## Maps the ".pdf" path of each queued file to the hash of its template
+        self.failed = []
+        self.converted = 0
+
+    def put(self, out_docx, out_pdf, company, role, template_hash=None):
+        '''
+        Queues a generated ".docx" to be merged
+            @param out_docx: The path of the ".docx" file to convert
+            @param out_pdf: The path of the ".pdf" file to create
+            @param company: The company of the cover letter, used to report a failed conversion
+            @param role: The role of the cover letter, used to report a failed conversion
+            @param template_hash: The hash of the template the cover letter was rendered from (see CompiledDocxTemplate), None to tell it apart by the parts of the file instead
+        '''
+
+        self.items.pop(out_pdf, None)
+        self.items[out_pdf] = (out_docx, out_pdf, company, role)
+        self.groups[out_pdf] = template_hash
+
+    def get_groups(self):
+        '''
+        Groups the queued files by their template, as merge_documents takes every part but the body, headers and footers from the first file of a group
+            Files queued without the hash of their template are told apart by the bytes of all those other parts
+            @return: List of lists of the queued items, in order of the first file of each template
+        '''
+
+        groups = {}
+        for out_pdf, item in self.items.items():
+            group = self.groups.get(out_pdf)
+            if group is None:
+                group = get_parts_key(item[0])
+            groups.setdefault(group, []).append(item)
+        return list(groups.values())
+
+    def convert(self, items):
+        '''
+        Merges, converts and splits the files of a template
+            @param items: List of tuples of (".docx" path, ".pdf" path, company, role)
+            @return: List of the items whose merged ".pdf" could not be split, to be converted one by one
+        '''
+
+        from pypdf import PdfReader
+
+        with tempfile.TemporaryDirectory(prefix='cover-gen-merge-') as folder:
+            merged_docx = os.path.join(folder, 'merged.docx')
+            merged_pdf = os.path.join(folder, 'merged.pdf')
+
+            start = time.perf_counter()
+            try:
+                merge_documents([out_docx for out_docx, _, _, _ in items], merged_docx)
+            except Exception as e:
+                print(f'Could not merge {len(items)} files, converting them one by one. Error: {e}')
+                return items
+            merged = time.perf_counter()
+
+            try:
+                self.backend.convert_merged(merged_docx, merged_pdf)
+                reader = PdfReader(merged_pdf)
+                page_ranges = get_page_ranges(reader, len(items))
+            except Exception as e:
+                print(f'Could not convert the merged document of {len(items)} files, converting them one by one. Error: {e}')
+                return items
+            converted = time.perf_counter()
+
+            if page_ranges is None:
+                print(f'The {self.backend.__class__.__name__} did not keep the bookmarks of the merged document, converting its {len(items)} files one by one')
+                return items
+
+            for (out_docx, out_pdf, company, role), page_range in zip(items, page_ranges):
+                try:
+                    split_pdf(reader, page_range, out_pdf, self.run_id)
+                    if self.on_converted is not None:
+                        self.on_converted(out_docx, out_pdf)
+                except Exception as e:
+                    print(f'Could not store {out_pdf}. Error: {e}')
+                    self.failed.append((company, role, out_docx))
+                else:
+                    self.converted += 1
+
+            if self.stats is not None:
+                self.stats.add('merge', merged - start + time.perf_counter() - converted, len(items))
+                self.stats.add('pdf', converted - merged, len(items))
+                self.stats.count('pdf_batches')
+
+        return []
+
+    def close(self):
+        '''
+        Merges and converts every queued file
+            @return: List of tuples of (company, role, ".docx" path) that could not be converted
+        '''
+
+        from .pdf import PDFPipeline
+
+        remaining = []
+        for items in self.get_groups():
+            remaining.extend(self.convert(items))
+
+        if remaining:
+            pipeline = PDFPipeline(self.backend, self.workers, on_converted=self.on_converted, stats=self.stats, run_id=self.run_id)
+            for item in remaining:
+                pipeline.put(*item)
+            self.failed.extend(pipeline.close())
+            self.converted += pipeline.converted
+
+        self.items = {}
+        return self.failed
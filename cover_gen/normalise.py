@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+'''
+Normalisation of the dates and addresses of cover letters, shared by the rows of a tracker and the command line arguments
+    pandas and dateutil are imported on first use, and the single values of the command line arguments are normalised without pandas at all
+'''
+
+import datetime
+
+## Formats tried (in order) by normalise_dates before falling back to dateutil, all with 4 digit years as dateutil resolves 2 digit years differently than strptime
+date_formats = ['%B %d, %Y', '%b %d, %Y', '%Y-%m-%d', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S', '%d %B %Y', '%d %b %Y', '%d-%b-%Y']
+
+## Normalised value of every distinct date and address string seen in the run, None if it could not be parsed
+date_cache = {}
+address_cache = {}
+
+## Date of every distinct value of a date column seen in the run as a pandas Timestamp, NaT if empty or illegible
+timestamp_cache = {}
+
+def parse_date_string(date_str):
+    '''
+    Parses a date string matching none of date_formats with dateutil, the last resort of normalise_date
+        @param date_str: The stripped date string
+        @return: The date in the format Month dd, YYYY, or None if illegible
+    '''
+
+    from dateutil import parser
+
+    try:
+        return parser.parse(date_str).strftime('%B %d, %Y')
+    except Exception as e:
+        print('='*74)
+        print(f'Could not parse date string: {date_str}, defaulting to today\'s date. Error: {e}')
+        print('='*74)
+        return None
+
+def get_timestamp(value):
+    '''
+    Converts a typed date or a parsed datetime to a pandas Timestamp, dropping its time zone but keeping its local date and time
+        @param value: The datetime.date, datetime.datetime or pandas Timestamp
+        @return: The Timestamp, NaT if out of the range of pandas
+    '''
+
+    import pandas as pd
+
+    try:
+        timestamp = pd.Timestamp(value)
+    except (ValueError, OverflowError):
+        return pd.NaT
+    timestamp = timestamp.tz_localize(None) if timestamp.tzinfo is not None else timestamp
+    return timestamp if pd.Timestamp.min <= timestamp <= pd.Timestamp.max else pd.NaT
+
+def parse_dates(values):
+    '''
+    Parses a whole date column into pandas Timestamps, the step shared by normalise_dates and the date comparisons of [--where]
+    Distinct values are parsed once (and cached for the rest of the run): typed dates as they are, strings first against date_formats in one vectorized step per format and only the leftovers with dateutil
+        @param values: List (or pandas Series) of the values of the date column
+        @return: pandas Series of the Timestamp of each value (with the index of values if a Series), NaT for empty and illegible values
+    '''
+
+    import pandas as pd
+
+    series = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+
+    strings = []
+    for value in pd.unique(series):
+        if value in timestamp_cache:
+            continue
+        if isinstance(value, datetime.date): ## Already typed, as read from ".xlsx" or ".parquet" (including pandas.Timestamp)
+            timestamp_cache[value] = get_timestamp(value)
+        elif str(value).strip() == '':
+            timestamp_cache[value] = pd.NaT
+        else:
+            strings.append(value)
+
+    remaining = pd.Series([str(value).strip() for value in strings], index=strings, dtype=object)
+    for date_format in date_formats:
+        if remaining.empty:
+            break
+        parsed = pd.to_datetime(remaining, format=date_format, errors='coerce')
+        timestamp_cache.update(parsed.dropna().items())
+        remaining = remaining[parsed.isna()]
+
+    if not remaining.empty:
+        from dateutil import parser
+
+        for value, date_str in remaining.items():
+            try:
+                timestamp_cache[value] = get_timestamp(parser.parse(date_str))
+            except Exception:
+                timestamp_cache[value] = pd.NaT ## Reported by normalise_dates, once the row is normalised
+
+    return pd.Series(pd.to_datetime([timestamp_cache[value] for value in series]), index=series.index)
+
+def normalise_dates(values):
+    '''
+    Normalises a whole date column at once in the format
+        Month dd, YYYY:
+        e.g. May 28, 2023
+    Distinct values are parsed once with parse_dates, and formatted once (and cached for the rest of the run)
+        @param values: List of the values of the date column
+        @return: Tuple of the list of normalised dates (today's date for empty and illegible values) and the list of booleans marking the illegible ones
+    '''
+
+    import pandas as pd
+
+    today = datetime.date.today().strftime('%B %d, %Y')
+
+    uncached = [value for value in pd.unique(pd.Series(values, dtype=object)) if value not in date_cache]
+    for value, date in zip(uncached, parse_dates(uncached)):
+        if not pd.isna(date):
+            date_cache[value] = date.strftime('%B %d, %Y')
+        elif str(value).strip() == '':
+            date_cache[value] = today
+        else:
+            date_cache[value] = None
+            print('='*74)
+            print(f'Could not parse date string: {str(value).strip()}, defaulting to today\'s date')
+            print('='*74)
+
+    dates = [date_cache[value] for value in values]
+    return [today if date is None else date for date in dates], [date is None for date in dates]
+
+def normalise_addresses(values):
+    '''
+    Normalises a whole address column at once in the format
+        e.g.:
+            1234 Sciendenfield Lane
+            Los Angeles, CA 90001
+    Distinct strings are split once (and cached for the rest of the run) with vectorized string operations
+        @param values: List of the values of the address column
+        @return: Tuple of the list of normalised addresses ("" for addresses without enough elements or illegible ones) and the list of booleans marking the illegible ones
+    '''
+
+    import pandas as pd
+
+    uncached = [value for value in pd.unique(pd.Series(values, dtype=object)) if value not in address_cache]
+
+    if uncached:
+        elements = pd.Series([str(value) for value in uncached], index=uncached, dtype=object).str.split(',')
+        count = elements.str.len()
+        region = elements.str[2].str.split()
+        street = elements.str[0].str.strip()
+        city = elements.str[1].str.strip()
+        state = region.str[0]
+        postal_code = region.str[1]
+
+        parsed = street + '\n' + city + ', ' + state + ' ' + postal_code
+        illegible = (count >= 3) & parsed.isna()
+
+        for value in uncached:
+            if count[value] < 3:
+                address_cache[value] = ''
+            elif illegible[value]:
+                address_cache[value] = None
+                print('='*74)
+                print(f'Could not parse address string: {value}, defaulting to no address')
+                print('='*74)
+            else:
+                address_cache[value] = parsed[value]
+
+    addresses = [address_cache[value] for value in values]
+    return ['' if address is None else address for address in addresses], [address is None for address in addresses]
+
+def normalise_date(value):
+    '''
+    Normalises a single date (e.g. of the command line arguments) the same way as normalise_dates, trying date_formats with datetime.strptime instead of pandas
+        @param value: The date value
+        @return: Tuple of the normalised date (today's date for an empty or illegible value) and whether it was illegible
+    '''
+
+    today = datetime.date.today().strftime('%B %d, %Y')
+
+    if value not in date_cache:
+        if isinstance(value, datetime.date):
+            date_cache[value] = value.strftime('%B %d, %Y')
+        elif str(value).strip() == '':
+            date_cache[value] = today
+        else:
+            date_str = str(value).strip()
+            for date_format in date_formats:
+                try:
+                    date_cache[value] = datetime.datetime.strptime(date_str, date_format).strftime('%B %d, %Y')
+                    break
+                except ValueError:
+                    continue
+            else:
+                date_cache[value] = parse_date_string(date_str)
+
+    date = date_cache[value]
+    return today if date is None else date, date is None
+
+def normalise_address(value):
+    '''
+    Normalises a single address (e.g. of the command line arguments) the same way as normalise_addresses, with plain string operations instead of pandas
+        @param value: The address value
+        @return: Tuple of the normalised address ("" for an address without enough elements or an illegible one) and whether it was illegible
+    '''
+
+    if value not in address_cache:
+        elements = str(value).split(',')
+        region = elements[2].split() if len(elements) >= 3 else []
+
+        if len(elements) < 3:
+            address_cache[value] = ''
+        elif len(region) < 2:
+            address_cache[value] = None
+            print('='*74)
+            print(f'Could not parse address string: {value}, defaulting to no address')
+            print('='*74)
+        else:
+            address_cache[value] = elements[0].strip() + '\n' + elements[1].strip() + ', ' + region[0] + ' ' + region[1]
+
+    address = address_cache[value]
+    return '' if address is None else address, address is None
+
+def normalise_chunk(chunk, schema, errors, failures=None):
+    '''
+    Appends the normalised "DATE" and "ADDRESS" columns (at schema.index['DATE'] and schema.index['ADDRESS']) to the rows of a chunk of applications, counting the illegible values in errors
+        @param chunk: List of rows from iter_app_chunks
+        @param schema: The RowSchema of the tracker
+        @param errors: dictionary of the error counts of the run, incremented under the "date" and "address" keys
+        @param failures: Optional list to append a dictionary of the error type, company, role and value of each illegible value to
+        @return: The same list of rows, each extended with its "DATE" and "ADDRESS"
+    '''
+
+    rm = schema.index
+
+    if 'date' in schema:
+        dates, date_errors = normalise_dates([app[rm['date']] for app in chunk])
+        errors['date'] += sum(date_errors)
+        if failures is not None:
+            failures.extend({'type': 'date', 'company': app[rm['company']], 'role': app[rm['role']], 'value': str(app[rm['date']])} for app, error in zip(chunk, date_errors) if error)
+    else:
+        dates = [datetime.date.today().strftime('%B %d, %Y')] * len(chunk)
+
+    if 'address' in schema:
+        addresses, address_errors = normalise_addresses([app[rm['address']] for app in chunk])
+        errors['address'] += sum(address_errors)
+        if failures is not None:
+            failures.extend({'type': 'address', 'company': app[rm['company']], 'role': app[rm['role']], 'value': str(app[rm['address']])} for app, error in zip(chunk, address_errors) if error)
+    else:
+        addresses = [None] * len(chunk)
+
+    for app, date, address in zip(chunk, dates, addresses):
+        app.append(date)
+        app.append(address)
+
+    return chunk
+
+def normalise_chunks(chunks, schema, errors, failures=None):
+    '''
+    Pre-pass over each chunk of applications with normalise_chunk
+        @param chunks: Generator of lists of rows from iter_app_chunks
+        @param schema: The RowSchema of the tracker
+        @param errors: dictionary of the error counts of the run, incremented under the "date" and "address" keys
+        @param failures: Optional list to append each illegible value to, as by normalise_chunk
+        @return: Generator of the same lists of rows, each extended with its "DATE" and "ADDRESS"
+    '''
+
+    for chunk in chunks:
+        yield normalise_chunk(chunk, schema, errors, failures)
@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+'''
+Converters from ".docx" to ".pdf" and the pipeline running them alongside rendering
+'''
+
+import os
+import re
+import time
+import queue
+import errno
+import shutil
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+
+from .sinks import get_tmp_path
+
+class PDFBackend:
+    '''
+    Interface of a converter from ".docx" to ".pdf", selected with [--pdf_backend]
+        The PDFPipeline hands each backend up to batch_size queued files per call to convert_many
+        A backend sets splits_merged if convert_merged exports the bookmarks of the merged document as named destinations, which the MailMerge of [--merge] needs to split the ".pdf"
+    '''
+
+    batch_size = 1
+    splits_merged = False
+
+    def init_thread(self):
+        '''
+        Called once by each converter thread of the PDFPipeline before its first conversion
+        '''
+
+        pass
+
+    def convert(self, out_docx, out_pdf):
+        '''
+        Converts a single file, raising an exception if the conversion fails
+            @param out_docx: The path of the ".docx" file to convert
+            @param out_pdf: The path of the ".pdf" file to create
+        '''
+
+        raise NotImplementedError
+
+    def convert_merged(self, out_docx, out_pdf):
+        '''
+        Converts the merged document of [--merge], whose bookmarks must be kept as named destinations of the ".pdf" for it to be split, by default as a single file
+            @param out_docx: The path of the merged ".docx" file to convert
+            @param out_pdf: The path of the ".pdf" file to create
+        '''
+
+        self.convert(out_docx, out_pdf)
+
+    def convert_many(self, pairs):
+        '''
+        Converts a list of files, by default one at a time
+            @param pairs: List of tuples of (".docx" path, ".pdf" path)
+            @return: List of the tuples in pairs that could not be converted
+        '''
+
+        failed = []
+        for out_docx, out_pdf in pairs:
+            try:
+                self.convert(out_docx, out_pdf)
+            except Exception as e:
+                print(f'Could not convert {out_docx} to PDF. Error: {e}')
+                failed.append((out_docx, out_pdf))
+        return failed
+
+class Docx2PDFBackend(PDFBackend):
+    '''
+    Converts each file with docx2pdf, which launches Microsoft Word (only available on Windows and macOS)
+        Word is not asked to export bookmarks, so [--merge] runs convert the files one by one
+    '''
+
+    def init_thread(self):
+        ## Word is driven through COM on Windows, which must be initialised in every thread using it
+        try:
+            import pythoncom
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass
+
+    def convert(self, out_docx, out_pdf):
+        from docx2pdf import convert ## Imported on first conversion, as runs with [--no_pdf] never need it
+        convert(out_docx, out_pdf)
+
+class LibreOfficeBackend(PDFBackend):
+    '''
+    Converts all queued files of a run in a single call to a headless LibreOffice ("soffice") process (split in chunks of max_files)
+        Each backend uses its own LibreOffice profile directory so that concurrent runs (or workers) do not block on one another
+    '''
+
+    batch_size = 500
+    splits_merged = True
+    max_files = 500 ## Files per call, keeping the command line below the limits of the OS
+    timeout = 3600
+
+    def __init__(self):
+        self.binary = shutil.which('soffice') or shutil.which('libreoffice')
+        if self.binary is None:
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT), 'soffice'
+            )
+        self.profile = tempfile.TemporaryDirectory(prefix='cover-gen-soffice-')
+
+    def convert(self, out_docx, out_pdf):
+        if self.convert_many([(out_docx, out_pdf)]):
+            raise RuntimeError(f'LibreOffice did not create {out_pdf}')
+
+    def convert_merged(self, out_docx, out_pdf):
+        ## Bookmarks are only exported as named destinations when asked to (LibreOffice 7.4 or later)
+        if self.convert_many([(out_docx, out_pdf)], 'pdf:writer_pdf_Export:{"ExportBookmarksToPDFDestination":{"type":"boolean","value":"true"}}'):
+            raise RuntimeError(f'LibreOffice did not create {out_pdf}')
+
+    def convert_many(self, pairs, convert_to='pdf'):
+        ## Every chunk is converted into one staging folder, so file names (which LibreOffice takes from the ".docx") must be unique within a chunk
+        chunks = [[]]
+        stems = set()
+        for out_docx, out_pdf in pairs:
+            stem = Path(out_docx).stem
+            if len(chunks[-1]) >= self.max_files or stem in stems:
+                chunks.append([])
+                stems = set()
+            chunks[-1].append((out_docx, out_pdf))
+            stems.add(stem)
+
+        failed = []
+        for chunk in chunks:
+            if not chunk:
+                continue
+
+            with tempfile.TemporaryDirectory(prefix='cover-gen-pdf-') as staging:
+                command = [
+                    self.binary,
+                    f'-env:UserInstallation={Path(self.profile.name).as_uri()}',
+                    '--headless',
+                    '--convert-to', convert_to,
+                    '--outdir', staging,
+                ] + [out_docx for out_docx, _ in chunk]
+
+                try:
+                    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=self.timeout, check=False)
+                except (OSError, subprocess.SubprocessError) as e:
+                    print(f'Could not run LibreOffice on {len(chunk)} files. Error: {e}')
+
+                for out_docx, out_pdf in chunk:
+                    converted = os.path.join(staging, Path(out_docx).stem + '.pdf')
+                    if os.path.exists(converted):
+                        shutil.move(converted, out_pdf)
+                    else:
+                        failed.append((out_docx, out_pdf))
+
+        return failed
+
+class FakePDFBackend(PDFBackend):
+    '''
+    Writes a minimal placeholder ".pdf" for every file without any converter installed, used for testing and benchmarking offline
+    '''
+
+    batch_size = 500
+    splits_merged = True
+
+    pdf_bytes = (
+        b'%PDF-1.4\n'
+        b'1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n'
+        b'2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n'
+        b'3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >> endobj\n'
+        b'trailer << /Root 1 0 R >>\n'
+        b'%%EOF\n'
+    )
+
+    def __init__(self):
+        self.converted = []
+
+    def convert(self, out_docx, out_pdf):
+        if not os.path.exists(out_docx):
+            raise FileNotFoundError(
+                errno.ENOENT, os.strerror(errno.ENOENT), out_docx
+            )
+        with open(out_pdf, 'wb') as f:
+            f.write(self.pdf_bytes)
+        self.converted.append((out_docx, out_pdf))
+
+    def convert_merged(self, out_docx, out_pdf):
+        ## A page per cover letter, with the bookmark of each as a named destination as LibreOffice exports them
+        import zipfile
+        from pypdf import PdfWriter
+
+        with zipfile.ZipFile(out_docx) as archive:
+            names = re.findall(r'w:name="(cover_gen_\d+)"', archive.read('word/document.xml').decode('utf-8'))
+
+        writer = PdfWriter()
+        for name in names:
+            writer.add_blank_page(612, 792)
+            writer.add_named_destination(name, len(writer.pages) - 1)
+        writer.write(out_pdf)
+        self.converted.append((out_docx, out_pdf))
+
+pdf_backends = {
+    'docx2pdf': Docx2PDFBackend,
+    'libreoffice': LibreOfficeBackend,
+    'fake': FakePDFBackend,
+}
+
+class PDFPipeline:
+    '''
+    Producer/consumer stage decoupling PDF conversion from rendering: CoverLetterGenerator.generate puts each generated ".docx" on a bounded queue and keeps rendering, while a pool of converter threads drains the queue
+        Each converter thread waits up to linger seconds to gather up to the backend's batch_size files before calling convert_many, and the queue blocks the producer once maxsize files are waiting
+    '''
+
+    maxsize = 100
+    linger = 0.5
+
+    def __init__(self, backend, workers=1, on_converted=None, stats=None, on_failed=None, run_id=None):
+        '''
+        Starts the converter threads
+            @param backend: The PDFBackend to convert with
+            @param workers: The number of converter threads
+            @param on_converted: Optional function called by the converter threads with the ".docx" and ".pdf" paths of each converted file, a file counts as failed if it raises
+            @param stats: Optional RunStats to record the time of each batch against its files under the "pdf" stage, and the number of batches under the "pdf_batches" counter
+            @param on_failed: Optional function called by the converter threads with the ".docx" and ".pdf" paths of each file that could not be converted, which is then reported to it rather than kept in failed
+            @param run_id: Optional id of the run tagging the temporary ".pdf" files (see get_tmp_path)
+        '''
+
+        self.backend = backend
+        self.run_id = run_id
+        self.on_converted = on_converted
+        self.on_failed = on_failed
+        self.stats = stats
+        self.queue = queue.Queue(maxsize=self.maxsize)
+        self.failed = []
+        self.converted = 0
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.work, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, out_docx, out_pdf, company, role, template_hash=None):
+        '''
+        Queues a generated ".docx" for conversion, blocking while the queue is full
+            @param out_docx: The path of the ".docx" file to convert
+            @param out_pdf: The path of the ".pdf" file to create
+            @param company: The company of the cover letter, used to report a failed conversion
+            @param role: The role of the cover letter, used to report a failed conversion
+            @param template_hash: Unused, the hash of the template grouping the files merged by the MailMerge
+        '''
+
+        self.queue.put((out_docx, out_pdf, company, role))
+
+    def work(self):
+        '''
+        Loop of each converter thread, running until it takes the None sentinel put by close()
+        '''
+
+        self.backend.init_thread()
+
+        done = False
+        while not done:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            items = [item]
+            while len(items) < self.backend.batch_size:
+                try:
+                    item = self.queue.get(timeout=self.linger)
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                items.append(item)
+
+            self.convert(items)
+
+    def convert(self, items):
+        '''
+        Converts a batch of queued files and records those that could not be converted against their company and role
+            @param items: List of tuples of (".docx" path, ".pdf" path, company, role)
+        '''
+
+        start = time.perf_counter()
+
+        ## Converted to temporary files renamed into place once converted, so a run killed mid-conversion never leaves a partial ".pdf"
+        pairs = {(out_docx, out_pdf): (out_docx, get_tmp_path(out_pdf, self.run_id)) for out_docx, out_pdf, _, _ in items}
+        try:
+            failed_tmp = set(self.backend.convert_many(list(pairs.values())))
+        except Exception as e:
+            print(f'Could not convert {len(items)} files to PDF. Error: {e}')
+            failed_tmp = set(pairs.values())
+
+        failed = set()
+        for pair, (_, tmp_pdf) in pairs.items():
+            if (pair[0], tmp_pdf) not in failed_tmp:
+                try:
+                    os.replace(tmp_pdf, pair[1])
+                    continue
+                except OSError as e:
+                    print(f'Could not store {pair[1]}. Error: {e}')
+            failed.add(pair)
+            if os.path.exists(tmp_pdf):
+                os.remove(tmp_pdf)
+
+        if self.on_converted is not None:
+            for out_docx, out_pdf, _, _ in items:
+                if (out_docx, out_pdf) in failed:
+                    continue
+                try:
+                    self.on_converted(out_docx, out_pdf)
+                except Exception as e:
+                    print(f'Could not store {out_pdf}. Error: {e}')
+                    failed.add((out_docx, out_pdf))
+
+        if self.stats is not None:
+            self.stats.add('pdf', time.perf_counter() - start, len(items))
+            self.stats.count('pdf_batches')
+
+        if self.on_failed is not None:
+            for out_docx, out_pdf, _, _ in items:
+                if (out_docx, out_pdf) in failed:
+                    self.on_failed(out_docx, out_pdf)
+
+        with self.lock:
+            for out_docx, out_pdf, company, role in items:
+                if (out_docx, out_pdf) in failed:
+                    if self.on_failed is None:
+                        self.failed.append((company, role, out_docx))
+                    print('='*74)
+                    print(f'Could not convert the cover letter for company {company} and role {role} ({out_docx}) to PDF')
+                    print('='*74)
+                else:
+                    self.converted += 1
+
+    def close(self):
+        '''
+        Flushes the queue, waiting for every converter thread to finish
+            @return: List of tuples of (company, role, ".docx" path) that could not be converted, empty if reported to on_failed
+        '''
+
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+        return self.failed
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+'''
+Run level instrumentation: timings of every stage of a run and the machine readable run report written with [--report]
+'''
+
+import os
+import json
+import math
+import time
+import threading
+from collections import defaultdict, deque
+
+## Stages timed in a run, in the order a cover letter passes through them
+stages = ['load', 'normalise', 'context', 'render', 'save', 'pdf']
+
+def percentile(values, q):
+    '''
+    Nearest-rank percentile of a list of values
+        @param values: List of numbers, sorted in ascending order
+        @param q: The percentile, between 0 and 100
+        @return: The value at the percentile, None for an empty list
+    '''
+
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+class RunStats:
+    '''
+    Collects the time spent per row in each stage of a run, and counters of the run
+        Stages working on whole chunks (load, normalise, context) and batches of conversions (pdf) spread their time evenly over the rows of the chunk or batch
+        Safe to add to from the converter threads of the PDFPipeline
+    '''
+
+    def __init__(self, max_samples=None):
+        '''
+            @param max_samples: The number of most recent samples per stage the percentiles are taken over, None to keep every sample of the run (a long running service keeps a bounded window)
+        '''
+
+        self.max_samples = max_samples
+        self.samples = self.new_samples()
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.rows = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def new_samples(self):
+        if self.max_samples is None:
+            return defaultdict(list)
+        return defaultdict(lambda: deque(maxlen=self.max_samples))
+
+    def add(self, stage, seconds, count=1):
+        '''
+        Records the time spent on count rows in a stage
+            @param stage: The name of the stage, one of stages
+            @param seconds: The time spent
+            @param count: The number of rows the time was spent on
+        '''
+
+        with self.lock:
+            self.totals[stage] += seconds
+            self.rows[stage] += count
+            if count > 0:
+                self.samples[stage].extend([seconds / count] * min(count, self.max_samples or count))
+
+    def count(self, name, count=1):
+        '''
+        Increments a counter of the run, e.g. of the rows whose rendering was deduplicated
+            @param name: The name of the counter
+            @param count: The increment
+        '''
+
+        with self.lock:
+            self.counts[name] += count
+
+    def timed(self, stage, chunks):
+        '''
+        Wraps a generator of chunks, recording the time spent producing each chunk against its rows
+            @param stage: The name of the stage
+            @param chunks: Generator of lists of rows
+            @return: Generator of the same chunks
+        '''
+
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start, 0)
+                return
+            self.add(stage, time.perf_counter() - start, len(chunk))
+            yield chunk
+
+    def pop_state(self):
+        '''
+        Takes the recorded times out of the stats, as a pool worker hands them back to the main process
+            @return: Tuple of dictionaries of the samples and totals per stage and of the counters
+        '''
+
+        with self.lock:
+            state = {stage: list(values) for stage, values in self.samples.items()}, dict(self.totals), dict(self.counts)
+            self.samples = self.new_samples()
+            self.totals = defaultdict(float)
+            self.counts = defaultdict(int)
+            self.rows = defaultdict(int)
+        return state
+
+    def merge(self, state):
+        '''
+        Adds the times taken out of another RunStats with pop_state
+            @param state: Tuple of dictionaries of the samples and totals per stage and of the counters
+        '''
+
+        samples, totals, counts = state
+        with self.lock:
+            for stage, values in samples.items():
+                self.samples[stage].extend(values)
+                self.rows[stage] += len(values)
+            for stage, total in totals.items():
+                self.totals[stage] += total
+            for name, count in counts.items():
+                self.counts[name] += count
+
+    def summary(self):
+        '''
+        Summarises every stage that was timed
+            @return: dictionary of each stage to its number of rows, total seconds and the p50/p95/max seconds per row (of the last max_samples rows if bounded)
+        '''
+
+        summary = {}
+        with self.lock:
+            for stage in stages + sorted(set(self.totals) - set(stages)):
+                if stage not in self.totals:
+                    continue
+                values = sorted(self.samples[stage])
+                summary[stage] = {
+                    'rows': self.rows[stage],
+                    'total': self.totals[stage],
+                    'p50': percentile(values, 50),
+                    'p95': percentile(values, 95),
+                    'max': values[-1] if values else None,
+                }
+        return summary
+
+def print_summary(summary):
+    '''
+    Prints the stage timings of a run as a table
+        @param summary: dictionary from RunStats.summary
+    '''
+
+    print(f'{"Stage":<10}{"Rows":>9}{"Total s":>11}{"p50 ms":>11}{"p95 ms":>11}{"max ms":>11}')
+    for stage, stats in summary.items():
+        row = [f'{stats[key] * 1000:.3f}' if stats[key] is not None else '-' for key in ('p50', 'p95', 'max')]
+        print(f'{stage:<10}{stats["rows"]:>9}{stats["total"]:>11.3f}{row[0]:>11}{row[1]:>11}{row[2]:>11}')
+
+def write_report(path, report):
+    '''
+    Writes the run report as JSON to a temporary file first and then replaces any old one, so a reader never sees a partial report
+        @param path: The path of the report file
+        @param report: dictionary of the report
+    '''
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1, default=str)
+    os.replace(tmp_path, path)
+
+def merge_reports(reports):
+    '''
+    Aggregates the run reports of the shards of a [--shard] run into the report of the whole run
+        Counts, errors and stage totals are summed and failures concatenated, while the p50/p95 of the stages cannot be recovered from those of the shards and are left out
+        A shard reported more than once (e.g. re-run under another report path) counts once, with its latest report
+        @param reports: List of dictionaries of the run reports, from write_report
+        @return: dictionary of the aggregated report, with the shards merged, the number of shards and the shards missing
+    '''
+
+    latest = {}
+    unsharded = []
+    for report in reports:
+        if report.get('shard') is None:
+            unsharded.append(report)
+            continue
+        shard = tuple(report['shard'])
+        if shard not in latest or report['started'] > latest[shard]['started']:
+            latest[shard] = report
+
+    counts = set(count for _, count in latest)
+    if len(counts) > 1:
+        raise ValueError(f'The reports are of runs split into different numbers of shards: {", ".join(str(count) for count in sorted(counts))}')
+    shard_count = counts.pop() if counts else None
+
+    reports = [latest[shard] for shard in sorted(latest)] + unsharded
+
+    merged = {
+        'version': reports[0].get('version'),
+        'started': min(report['started'] for report in reports),
+        'elapsed': max(report['elapsed'] for report in reports), ## The shards run side by side
+        'template': reports[0].get('template'),
+        'app_list': reports[0].get('app_list'),
+        'shards': [shard for shard, _ in sorted(latest)],
+        'shard_count': shard_count,
+        'missing_shards': [shard for shard in range(1, shard_count + 1) if (shard, shard_count) not in latest] if shard_count else [],
+        'count_gen': 0,
+        'count_skip': 0,
+        'count_pdf': 0,
+        'counts': defaultdict(int),
+        'errors': defaultdict(int),
+        'failures': [],
+        'stages': {},
+    }
+
+    for report in reports:
+        for key in ('count_gen', 'count_skip', 'count_pdf'):
+            merged[key] += report.get(key) or 0
+        for key in ('counts', 'errors'):
+            for name, count in (report.get(key) or {}).items():
+                merged[key][name] += count
+        merged['failures'].extend(report.get('failures') or [])
+
+        for stage, stats in (report.get('stages') or {}).items():
+            total = merged['stages'].setdefault(stage, {'rows': 0, 'total': 0.0, 'p50': None, 'p95': None, 'max': None})
+            total['rows'] += stats['rows']
+            total['total'] += stats['total']
+            if stats['max'] is not None:
+                total['max'] = stats['max'] if total['max'] is None else max(total['max'], stats['max'])
+
+    merged['counts'] = dict(merged['counts'])
+    merged['errors'] = dict(merged['errors'])
+    return merged
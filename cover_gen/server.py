@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+'''
+Local HTTP rendering service of the command line [--serve], keeping the compiled templates warm in memory for internal tools generating cover letters without a process per letter
+
+    POST /render?template=NAME&format=docx|pdf with a JSON object of the context (DATE, COMPANY, ROLE, HMANAGER, ...) returns the ".docx" or ".pdf" bytes
+    GET /metrics returns JSON of the request counts and the p50/p95/max time per request of each stage over the most recent requests
+    GET /health returns "ok"
+
+    ".pdf" requests arriving close together are converted in a single call to the PDF backend, gathered by the linger of the PDFPipeline
+'''
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qs, quote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from .pdf import PDFPipeline
+from .report import RunStats
+from .manifest import get_context_hash
+from .generator import CoverLetterGenerator
+
+content_types = {
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'pdf': 'application/pdf',
+}
+
+class RenderService:
+    '''
+    Renders cover letters from any of a set of templates compiled once at start up, and converts them to ".pdf" through one shared PDFPipeline
+        Requests only choose among these templates by name, the TEMPLATE of a context is never used to load a template
+        At most max_concurrency requests are rendered or converted at once, others wait up to queue_timeout seconds before being turned away
+    '''
+
+    queue_timeout = 30
+    max_samples = 10000 ## Requests per stage the percentiles of /metrics are taken over, so the memory of the service stays bounded
+
+    def __init__(self, templates, name=None, pdf_backend='docx2pdf', pdf_workers=1, batch_window=0.02, max_concurrency=4, cache_dir=None, cache_max_bytes=1 << 30, engine='auto'):
+        '''
+        Loads and compiles every template
+            @param templates: dictionary of the name of each template (as requested with "template=NAME") to its path, the one named "default" is used when none is requested
+            @param name: The name of the applicant, used for file naming
+            @param pdf_backend: The converter used to create ".pdf" files, one of the keys of pdf_backends
+            @param pdf_workers: The number of threads converting ".docx" files to ".pdf"
+            @param batch_window: The seconds a converter thread waits for further ".pdf" requests to convert in the same call
+            @param max_concurrency: The number of requests rendered or converted at once
+            @param cache_dir: The folder of a RenderCache to take rendered and converted files from, None for no cache
+            @param cache_max_bytes: The size the RenderCache is kept below
+            @param engine: The rendering engine of the templates, see CoverLetterGenerator
+        '''
+
+        self.generators = {
+            template_name: CoverLetterGenerator(path, name=name, folder=False, pdf_backend=pdf_backend, cache_dir=cache_dir, cache_max_bytes=cache_max_bytes, engine=engine)
+            for template_name, path in templates.items()
+        }
+
+        self.pdf_backend = pdf_backend
+        self.pdf_workers = pdf_workers
+        self.batch_window = batch_window
+        self.max_concurrency = max_concurrency
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.stats = RunStats(self.max_samples)
+        self.started = time.time()
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+        ## Requests waiting for their ".pdf", mapping the path of each ".pdf" to convert to the event set once it is converted (or failed)
+        self.pending = {}
+        self.pipeline = None
+
+    def get_pipeline(self):
+        '''
+        Starts the PDFPipeline on the first ".pdf" request, with a linger of batch_window so that requests arriving close together are batched
+            @return: PDFPipeline object
+        '''
+
+        with self.lock:
+            if self.pipeline is None:
+                backend = next(iter(self.generators.values())).get_pdf_backend()
+                self.pipeline = PDFPipeline(backend, self.pdf_workers, on_converted=self.set_converted, stats=self.stats, on_failed=self.set_converted)
+                self.pipeline.linger = self.batch_window
+        return self.pipeline
+
+    def set_converted(self, out_docx, out_pdf):
+        '''
+        Called by the PDFPipeline for each converted (or failed) file, waking the request waiting for it
+        '''
+
+        converted = self.pending.pop(out_pdf, None)
+        if converted is not None:
+            converted.set()
+
+    def render(self, context, template='default', file_format='docx'):
+        '''
+        Renders a cover letter, taking at most one of the max_concurrency slots
+            @param context: dictionary of the context passed to the template
+            @param template: The name of the template
+            @param file_format: "docx" or "pdf"
+            @return: The bytes of the rendered file
+        '''
+
+        if template not in self.generators:
+            raise KeyError(template)
+        generator = self.generators[template]
+
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            raise TimeoutError(f'Busy rendering {self.max_concurrency} requests')
+
+        with self.lock:
+            self.in_flight += 1
+        try:
+            key = generator.get_render_key(get_context_hash(context)) if generator.cache is not None else None
+
+            start = time.perf_counter()
+            data = generator.cache.get(f'{key}.docx') if key is not None else None
+            if data is None:
+                data = generator.render(context)
+                if key is not None:
+                    generator.cache.put(f'{key}.docx', data)
+            self.stats.add('render', time.perf_counter() - start)
+
+            if file_format == 'docx':
+                return data
+
+            cached = generator.cache.get(generator.get_pdf_cache_name(key)) if key is not None else None
+            if cached is not None:
+                return cached
+
+            pdf = self.convert_pdf(data, context)
+            if key is not None:
+                generator.cache.put(generator.get_pdf_cache_name(key), pdf)
+            return pdf
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+    def convert_pdf(self, data, context):
+        '''
+        Converts a rendered ".docx" in a temporary folder of its own, waiting for the PDFPipeline to convert it along with any other requests of its batch
+            @param data: The bytes of the ".docx"
+            @param context: The context of the cover letter, naming the company and role of a failed conversion
+            @return: The bytes of the ".pdf"
+        '''
+
+        folder = tempfile.mkdtemp(prefix='cover-gen-serve-')
+        try:
+            ## Named after the folder, as LibreOffice converts a batch into one folder and so needs a unique file name per request
+            out_docx = os.path.join(folder, os.path.basename(folder) + '.docx')
+            out_pdf = os.path.join(folder, os.path.basename(folder) + '.pdf')
+            with open(out_docx, 'wb') as f:
+                f.write(data)
+
+            converted = threading.Event()
+            self.pending[out_pdf] = converted
+            self.get_pipeline().put(out_docx, out_pdf, context.get('COMPANY'), context.get('ROLE'))
+            converted.wait()
+
+            if not os.path.exists(out_pdf):
+                raise RuntimeError('The cover letter could not be converted to PDF')
+            with open(out_pdf, 'rb') as f:
+                return f.read()
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def metrics(self):
+        '''
+        Obtains the metrics of the service
+            @return: dictionary of the uptime, the requests in flight, the counters and the p50/p95/max seconds per request of the render and pdf stages, over the last max_samples requests
+        '''
+
+        with self.lock:
+            in_flight = self.in_flight
+
+        return {
+            'uptime': time.time() - self.started,
+            'templates': sorted(self.generators),
+            'pdf_backend': self.pdf_backend,
+            'in_flight': in_flight,
+            'max_concurrency': self.max_concurrency,
+            'counts': dict(self.stats.counts),
+            'stages': self.stats.summary(),
+        }
+
+    def close(self):
+        if self.pipeline is not None:
+            self.pipeline.close()
+
+class RenderHandler(BaseHTTPRequestHandler):
+    '''
+    Handler of the requests of the RenderService of its server
+    '''
+
+    max_body = 1 << 20
+
+    def send_bytes(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, status, obj):
+        self.server.service.stats.count(f'responses_{status}')
+        self.send_bytes(status, json.dumps(obj, default=str).encode('utf-8'), 'application/json')
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/metrics':
+            self.send_json(200, self.server.service.metrics())
+        elif path == '/health':
+            self.send_bytes(200, b'ok', 'text/plain')
+        else:
+            self.send_json(404, {'error': f'Unknown path "{path}"'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/render':
+            self.send_json(404, {'error': f'Unknown path "{url.path}"'})
+            return
+
+        query = parse_qs(url.query)
+        template = query.get('template', ['default'])[0]
+        file_format = query.get('format', ['docx'])[0]
+        if file_format not in content_types:
+            self.send_json(400, {'error': f'Unknown format "{file_format}", must be one of {", ".join(content_types)}'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > self.max_body:
+            self.send_json(413, {'error': f'The context must be at most {self.max_body} bytes'})
+            return
+
+        try:
+            context = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError as e:
+            self.send_json(400, {'error': f'The body must be a JSON object of the context. Error: {e}'})
+            return
+        if not isinstance(context, dict):
+            self.send_json(400, {'error': 'The body must be a JSON object of the context'})
+            return
+
+        ## The templates are those named at start up, a context never chooses the file it is rendered with
+        if 'TEMPLATE' in context:
+            self.send_json(400, {'error': f'The context cannot name its TEMPLATE, choose one with "template=NAME" of {", ".join(sorted(self.server.service.generators))}'})
+            return
+
+        ## Named in the file name of the response
+        missing = [key for key in ('COMPANY', 'ROLE') if key not in context]
+        if missing:
+            self.send_json(400, {'error': f'The context is missing {", ".join(missing)}, needed to name the file'})
+            return
+
+        service = self.server.service
+        try:
+            data = service.render(context, template, file_format)
+        except KeyError:
+            self.send_json(404, {'error': f'Unknown template "{template}", must be one of {", ".join(sorted(service.generators))}'})
+            return
+        except TimeoutError as e:
+            self.send_json(503, {'error': str(e)})
+            return
+        except Exception as e:
+            self.send_json(500, {'error': repr(e)})
+            return
+
+        file_name = service.generators[template].get_file_name(context)
+        service.stats.count('responses_200')
+        service.stats.count(f'rendered_{file_format}')
+        self.send_bytes(200, data, content_types[file_format], {'Content-Disposition': get_content_disposition(f'{file_name}.{file_format}')})
+
+    def log_message(self, format, *args):
+        pass ## Requests are counted in /metrics rather than printed one by one
+
+def get_content_disposition(file_name):
+    '''
+    Obtains the Content-Disposition header of a rendered file, whose name may hold any character of a company or role while http.server sends headers as latin-1
+        @param file_name: The name of the file
+        @return: The header value, of an ASCII name for old clients (non-ASCII characters as "_", quotes and backslashes escaped) and the UTF-8 name of RFC 5987
+    '''
+
+    ascii_name = file_name.encode('ascii', 'replace').decode('ascii').replace('?', '_')
+    ascii_name = ascii_name.replace('\\', '\\\\').replace('"', '\\"')
+    return f'attachment; filename="{ascii_name}"; filename*=UTF-8\'\'{quote(file_name, safe="")}'
+
+def parse_address(address):
+    '''
+    Parses the address of [--serve]
+        @param address: "PORT" or "HOST:PORT"
+        @return: Tuple of the host (localhost if not given) and port
+    '''
+
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+def serve(args):
+    '''
+    Runs the rendering service of the command line until interrupted
+        @param args: The parsed arguments, from parse_args
+    '''
+
+    templates = {'default': args.template}
+    for item in args.serve_template or []:
+        template_name, _, path = item.partition('=')
+        templates[template_name] = path
+
+    service = RenderService(
+        templates,
+        name=args.name,
+        pdf_backend=args.pdf_backend,
+        pdf_workers=args.pdf_workers,
+        batch_window=args.batch_window,
+        max_concurrency=args.max_concurrency,
+        cache_dir=args.cache_dir,
+        cache_max_bytes=args.cache_max_bytes,
+        engine=args.engine,
+    )
+
+    server = ThreadingHTTPServer(parse_address(args.serve), RenderHandler)
+    server.daemon_threads = True
+    server.service = service
+
+    host, port = server.server_address[:2]
+    print(f'Serving {", ".join(sorted(templates))} on http://{host}:{port}/render, press Ctrl+C to stop')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopped serving')
+    finally:
+        server.server_close()
+        service.close()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+'''
+Output sinks receiving the generated ".docx" and ".pdf" files, selected with [--output] or passed to CoverLetterGenerator
+    Every file is handed over as bytes under its relative path (e.g. "Company/First Last-Company-Role-Cover-Letter.docx"), so cover letters can be written to a folder, a single ".zip", stdout or an object store alike
+'''
+
+import os
+import re
+import sys
+import secrets
+import hashlib
+import zipfile
+import warnings
+import threading
+
+def get_run_id(key):
+    '''
+    Creates the id of a run tagging the names of its temporary files, so that a restarted run can tell those left behind by its interrupted predecessor from those of its own and of any other run (e.g. another [--shard]) writing to the same folders
+        @param key: String identifying the run across restarts, e.g. the path of its journal
+        @return: The hash of the key and a random token of this start of the run, e.g. "3fa9c2d1-8b1e07aa"
+    '''
+
+    return f'{hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]}-{secrets.token_hex(4)}'
+
+def get_tmp_path(path, run_id=None):
+    '''
+    Obtains the temporary path a file is written to before being renamed into place, so that a run killed mid-write never leaves a partial file under the real path
+        The suffix is kept for the converters naming their output by it, and the process and thread ids keep writers of the same path apart
+        @param path: The path of the file
+        @param run_id: The id of the run writing the file, from get_run_id, None for an untagged file
+        @return: The temporary path next to the file, e.g. "Company/Letter.3fa9c2d1-8b1e07aa.1234-5678.tmp.docx"
+    '''
+
+    root, suffix = os.path.splitext(path)
+    tag = f'{run_id}.' if run_id else ''
+    return f'{root}.{tag}{os.getpid()}-{threading.get_ident()}.tmp{suffix}'
+
+class OutputSink:
+    '''
+    Interface of a destination of generated files
+        local sinks write real files that the PDF converters can read in place, for all others the CoverLetterGenerator converts in a staging folder and writes the ".pdf" bytes back
+    '''
+
+    local = False
+    run_id = None ## The id of the run tagging the temporary files written to the sink, set by a journaled CoverLetterGenerator
+
+    def write(self, path, data):
+        '''
+        Stores a generated file, called from the rendering thread and the converter threads of the PDFPipeline alike
+            @param path: The relative path of the file
+            @param data: The bytes of the file
+        '''
+
+        raise NotImplementedError
+
+    def get_local_path(self, path):
+        '''
+        Obtains the path a local sink writes a file to
+            @param path: The relative path of the file
+            @return: The path of the file on disk
+        '''
+
+        return path
+
+    def close(self):
+        '''
+        Called once after the last file was written
+        '''
+
+        pass
+
+class DirectorySink(OutputSink):
+    '''
+    Writes every file below a folder (the working directory by default), creating each company folder once and remembering those already created rather than calling mkdir for every cover letter
+    '''
+
+    local = True
+
+    def __init__(self, root=None):
+        '''
+            @param root: The folder to write below, None for the working directory
+        '''
+
+        self.root = root
+        self.created = set()
+
+    def get_local_path(self, path):
+        return path if self.root is None else os.path.join(self.root, path)
+
+    def write(self, path, data):
+        local_path = self.get_local_path(path)
+
+        folder = os.path.dirname(local_path)
+        if folder not in self.created:
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            if self.run_id is not None:
+                self.remove_tmp_files(folder or '.')
+            self.created.add(folder)
+
+        ## Written to a temporary file and renamed into place, so a file of the folder is never partially written
+        tmp_path = get_tmp_path(local_path, self.run_id)
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def remove_tmp_files(self, folder):
+        '''
+        Removes the temporary files left in a folder by an earlier start of this run killed mid-write, called once per folder as the run first writes to it
+            Only files tagged with the same run (the hash of run_id) but another start of it are removed, never those of other runs or the in-flight files of this one
+            @param folder: The folder to clean
+            @return: The number of files removed
+        '''
+
+        key, start = self.run_id.split('-')
+        pattern = re.compile(rf'\.{key}-(?!{start}\.)[0-9a-f]+\.\d+-\d+\.tmp(\.\w+)?$')
+
+        removed = 0
+        for entry in os.scandir(folder):
+            if entry.is_file() and pattern.search(entry.name):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+class ZipSink(OutputSink):
+    '''
+    Streams every file into a single ".zip" archive, one sequential write instead of a file and folder creation per cover letter
+        Members are stored without compression as ".docx" files are zip archives themselves, and the archive may be written to an unseekable stream such as stdout
+        A path written twice is stored twice, and readers (like Python's zipfile) take the last one as a folder would keep the last file written
+    '''
+
+    def __init__(self, file):
+        '''
+            @param file: The path (or binary file-like object) of the archive, an archive path is written to a temporary file renamed into place once closed
+        '''
+
+        self.path = None
+        if isinstance(file, (str, os.PathLike)):
+            self.path = file
+            file = get_tmp_path(file)
+        self.archive = zipfile.ZipFile(file, mode='w', compression=zipfile.ZIP_STORED)
+        self.lock = threading.Lock()
+
+    def write(self, path, data):
+        with self.lock, warnings.catch_warnings():
+            warnings.simplefilter('ignore', UserWarning) ## "Duplicate name" warning of a path written twice
+            self.archive.writestr(path.replace(os.sep, '/'), data)
+
+    def close(self):
+        with self.lock:
+            self.archive.close()
+            if self.path is not None:
+                os.replace(self.archive.filename, self.path)
+                self.path = None
+
+class StreamSink(OutputSink):
+    '''
+    Writes the raw bytes of each file to a binary stream, stdout by default, to pipe a single cover letter to another program
+        @param suffix: Only files with this suffix (e.g. ".pdf") are written, None for all
+    '''
+
+    def __init__(self, stream=None, suffix=None):
+        self.stream = sys.stdout.buffer if stream is None else stream
+        self.suffix = suffix
+        self.lock = threading.Lock()
+
+    def write(self, path, data):
+        if self.suffix is None or path.endswith(self.suffix):
+            with self.lock:
+                self.stream.write(data)
+                self.stream.flush()
+
+class BytesSink(OutputSink):
+    '''
+    Keeps every file in memory, for library callers wanting the bytes of the generated files
+        files maps the relative path of each file to its bytes
+    '''
+
+    def __init__(self):
+        self.files = {}
+
+    def write(self, path, data):
+        self.files[path] = data
+
+class ObjectStoreSink(OutputSink):
+    '''
+    Uploads every file to an object store through a client with a "put_object(Bucket=..., Key=..., Body=...)" method, as that of boto3's S3 client
+        LocalObjectStore is a stand-in client keeping objects in a local folder, for testing and offline runs
+    '''
+
+    def __init__(self, client, bucket, prefix=''):
+        '''
+            @param client: The object store client
+            @param bucket: The name of the bucket
+            @param prefix: Prefix of the key of every object, e.g. "cover-letters/"
+        '''
+
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def write(self, path, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + path.replace(os.sep, '/'), Body=data)
+
+class LocalObjectStore:
+    '''
+    Stand-in for an object store client, keeping each object of a bucket as a file below root/bucket/
+    '''
+
+    def __init__(self, root):
+        self.root = root
+
+    def get_local_path(self, bucket, key):
+        path = os.path.normpath(os.path.join(self.root, bucket, *key.split('/')))
+        if not path.startswith(os.path.normpath(os.path.join(self.root, bucket)) + os.sep):
+            raise ValueError(f'Invalid object key "{key}"')
+        return path
+
+    def put_object(self, Bucket, Key, Body):
+        path = self.get_local_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        ## Written to a temporary file first, so a reader never sees a partial object
+        tmp_path = f'{path}.tmp{threading.get_ident()}'
+        with open(tmp_path, 'wb') as f:
+            f.write(Body)
+        os.replace(tmp_path, path)
+
+    def get_object(self, Bucket, Key):
+        with open(self.get_local_path(Bucket, Key), 'rb') as f:
+            return {'Body': f.read()}
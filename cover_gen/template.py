@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+'''
+The compiled ".docx" template, loaded and compiled once and re-rendered for every cover letter, and the pool of templates of runs routing rows to several templates
+'''
+
+import io
+import re
+import hashlib
+from collections import OrderedDict
+
+from docx import Document
+from docx.oxml import parse_xml
+from docxtpl import DocxTemplate
+from jinja2 import Environment, Template, nodes
+
+from .xmltemplate import XMLTemplate
+
+class CompiledDocxTemplate(DocxTemplate):
+    '''
+    A DocxTemplate that unzips, parses and preprocesses the ".docx" template exactly once, and compiles the Jinja template of every templated part (body, headers, footers) up front
+        Each call to render() re-uses the already loaded document as a cheap copy, overwriting every templated part from the compiled sources, so the saved output is the same as that of a fresh DocxTemplate
+        Not safe to share between threads, each process (or thread) should hold its own instance
+    '''
+
+    def __init__(self, template_file, engine='auto'):
+        '''
+        Reads the template into memory and compiles it
+            @param template_file: The path (or file-like object) of the ".docx" template
+            @param engine: The engine of render_bytes, "auto" for the XMLTemplate if the template uses nothing but plain placeholders (else docxtpl), "docxtpl" for docxtpl always
+        '''
+
+        if hasattr(template_file, 'read'):
+            template_bytes = template_file.read()
+        else:
+            with open(template_file, 'rb') as f:
+                template_bytes = f.read()
+
+        super().__init__(io.BytesIO(template_bytes))
+        self.template_bytes = template_bytes
+        self.template_hash = hashlib.sha256(template_bytes).hexdigest()
+        self.variables = None
+        self.guarded = None
+        self.compile()
+
+        self.xml_template = XMLTemplate.compile(self) if engine == 'auto' else None
+        self.engine = 'xml' if self.xml_template is not None else 'docxtpl'
+
+    def render_bytes(self, context):
+        '''
+        Renders a cover letter with the engine of the template
+            @param context: dictionary of the context passed to the template
+            @return: The bytes of the rendered ".docx"
+        '''
+
+        if self.xml_template is not None:
+            return self.xml_template.render(context)
+
+        out = io.BytesIO()
+        self.render(context)
+        self.save(out)
+        return out.getvalue()
+
+    def get_variables(self):
+        '''
+        Obtains the variables the template uses (e.g. COMPANY, ROLE), analysed from a fresh copy of the document on first call
+            @return: Set of the names of the undeclared variables of the body, headers and footers
+        '''
+
+        if self.variables is None:
+            self.variables = self.get_undeclared_template_variables()
+        return self.variables
+
+    def get_guarded_variables(self):
+        '''
+        Obtains the variables the template only uses guarded by an {% if %} testing them, e.g. {% if REFERRAL %}Referred by {{REFERRAL}}{% endif %}, whose text is left out when they are missing
+            @return: Set of the names of the guarded variables of the body, headers and footers
+        '''
+
+        if self.guarded is None:
+            ## The same parts, preprocessed the same way, as get_undeclared_template_variables analyses
+            document = Document(io.BytesIO(self.template_bytes))
+            xml = self.patch_xml(self.xml_to_string(document._element.body))
+            for rel in document._part.rels.values():
+                if rel.reltype in (self.HEADER_URI, self.FOOTER_URI) and rel.target_part.blob:
+                    xml += self.patch_xml(self.xml_to_string(parse_xml(rel.target_part.blob)))
+
+            tree = Environment().parse(xml)
+            unguarded = set()
+            find_unguarded(tree, frozenset(), unguarded)
+            self.guarded = set(node.name for node in tree.find_all(nodes.Name)) - unguarded
+        return self.guarded
+
+    def init_docx(self, reload=True):
+        '''
+        Loads the document only once, since every templated part is re-rendered from its compiled source there is no need to reload after a render
+        '''
+
+        if not self.docx:
+            self.docx = Document(self.template_file)
+            self.is_rendered = False
+
+    def compile_xml(self, src_xml):
+        '''
+        Runs the docxtpl preprocessing on a part's XML and compiles the result as a Jinja template
+            @param src_xml: The raw XML string of the part
+            @return: jinja2.Template of the preprocessed XML
+        '''
+
+        src_xml = self.patch_xml(src_xml)
+        src_xml = re.sub(r'<w:p([ >])', r'\n<w:p\1', src_xml)
+        return Template(src_xml)
+
+    def compile(self):
+        '''
+        Loads the document and compiles the body, headers and footers, and keeps the pristine core properties and footnotes to restore before each render
+        '''
+
+        self.init_docx()
+
+        self.compiled_body = self.compile_xml(self.get_xml())
+
+        self.compiled_headers_footers = {}
+        for uri in (self.HEADER_URI, self.FOOTER_URI):
+            self.compiled_headers_footers[uri] = []
+            for relKey, part in self.get_headers_footers(uri):
+                xml = self.get_part_xml(part)
+                encoding = self.get_headers_footers_encoding(xml)
+                self.compiled_headers_footers[uri].append((relKey, part, encoding, self.compile_xml(xml)))
+
+        self.core_properties_src = {prop: getattr(self.docx.core_properties, prop) for prop in ('author', 'comments', 'identifier', 'language', 'subject', 'title')}
+        self.footnotes_src = [(part, part.blob) for part in self.docx.part.package.parts if part.content_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml']
+
+    def render_compiled(self, compiled, part, context):
+        '''
+        Renders a compiled part with the same post processing as DocxTemplate.render_xml_part
+            @param compiled: The jinja2.Template of the part
+            @param part: The docx part being rendered
+            @param context: The context of the cover letter
+            @return: The rendered XML string
+        '''
+
+        self.current_rendering_part = part
+        dst_xml = compiled.render(context)
+        dst_xml = re.sub(r'\n<w:p([ >])', r'<w:p\1', dst_xml)
+        dst_xml = dst_xml.replace('{_{', '{{').replace('}_}', '}}').replace('{_%', '{%').replace('%_}', '%}')
+        return self.resolve_listing(dst_xml)
+
+    def build_xml(self, context, jinja_env=None):
+        return self.render_compiled(self.compiled_body, self.docx._part, context)
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        for relKey, part, encoding, compiled in self.compiled_headers_footers[uri]:
+            yield relKey, self.render_compiled(compiled, part, context).encode(encoding)
+
+    def render_properties(self, context, jinja_env=None):
+        for prop, value in self.core_properties_src.items():
+            setattr(self.docx.core_properties, prop, value)
+        super().render_properties(context, jinja_env)
+
+    def render_footnotes(self, context, jinja_env=None):
+        for part, blob in self.footnotes_src:
+            part._blob = blob
+        super().render_footnotes(context, jinja_env)
+
+def find_unguarded(node, guards, unguarded):
+    '''
+    Finds the names of a Jinja syntax tree used outside of the test of an {% if %} and of the blocks of an {% if %} (or {% elif %}) testing them
+        @param node: The jinja2 node to search
+        @param guards: Set of the names tested by the {% if %} blocks enclosing the node
+        @param unguarded: Set the unguarded names are added to
+    '''
+
+    if isinstance(node, nodes.If):
+        tested = guards | set(name.name for name in [node.test, *node.test.find_all(nodes.Name)] if isinstance(name, nodes.Name)) ## find_all only yields the descendants of the test
+        for child in node.body + node.elif_:
+            find_unguarded(child, tested, unguarded)
+        for child in node.else_:
+            find_unguarded(child, guards, unguarded)
+        return
+
+    if isinstance(node, nodes.Name) and node.name not in guards:
+        unguarded.add(node.name)
+    for child in node.iter_child_nodes():
+        find_unguarded(child, guards, unguarded)
+
+class TemplatePool:
+    '''
+    Bounded pool of compiled templates for runs rendering rows against several templates, compiling each template on first use and dropping the least recently used one once more than max_size are compiled
+    '''
+
+    def __init__(self, max_size=8, engine='auto'):
+        '''
+            @param max_size: The number of compiled templates kept in memory
+            @param engine: The engine of each template, see CompiledDocxTemplate
+        '''
+
+        self.max_size = max_size
+        self.engine = engine
+        self.templates = OrderedDict()
+        self.compiled = 0 ## Number of templates compiled, more than the number of distinct templates if any were dropped and compiled again
+
+    def get(self, path):
+        '''
+        Obtains the compiled template of a path, compiling it if not in the pool
+            @param path: The path of the ".docx" template
+            @return: CompiledDocxTemplate object
+        '''
+
+        template = self.templates.get(path)
+        if template is not None:
+            self.templates.move_to_end(path)
+            return template
+
+        template = CompiledDocxTemplate(path, self.engine)
+        self.compiled += 1
+
+        self.templates[path] = template
+        if len(self.templates) > self.max_size:
+            self.templates.popitem(last=False)
+
+        return template
@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+'''
+Reading of application trackers: format detection, streaming of rows in chunks and the RowSchema turning rows into contexts
+    pandas, openpyxl and pyarrow are imported by the readers of the formats needing them, so that runs without an [--app_list] never pay for them
+'''
+
+import re
+import os
+import json
+import errno
+import hashlib
+import argparse
+import operator
+from pathlib import Path
+
+def get_df_hash(columns, ret_idx=True):
+    '''
+    Function to obtain a hashing between the index of the rows read in our case and their columns
+        @param columns: The list of columns of the rows in question (e.g. intersection_list)
+        @param ret_idx: A boolean value to determine whether to return a hashing with index as the key or value of column as the key
+            ret_idx=True: [col value] -> [list idx]
+            ret_idx=False: [list idx] -> [col value]
+        @return: dictionary with return values
+    '''
+    df_hash = {idx: value for idx, value in enumerate(columns)} if not ret_idx else \
+        {value: idx for idx, value in enumerate(columns)}
+    return df_hash
+
+## Columns acceptable by this script, after normalisation by get_intersection_list
+allowed_cols = set(['name', 'recruitment company', 'date', 'company', 'address', 'role', 'applied', 'event', 'contact', 'referral', 'hmanager', 'convo1', 'convo2', 'other1', 'other2', 'template'])
+
+def get_intersection_list(columns):
+    '''
+    Function to return all available columns to be used in processing, and throws error if "company" or "role" doesn't exist in the columns
+        Does so by first converting all the column names to lowercase and then for each potentially different spelling of:
+            "Hiring Manager", 
+            "Conversation 1"/"Conversation 2"
+            "Other 1"/"Other 2"
+        @param columns: The header (list of column names) of the ".xlsx" or ".csv" for a given applicaiton tracker, as returned by read_app_header
+        @return: a list of unions between columns acceptable by this script and columns entered by the user
+    '''
+    
+    ## Changes all columns to lower case
+    df_cols = [str(col).lower() for col in columns]
+    
+    ## Changes phonetically correct spelling of "Hiring Manager" to "hmanager":
+    df_cols = [re.sub('hiring manager', 'hmanager', col) for col in df_cols]
+    
+    ## Changes implementation of "Conversation 1" to "convo1" and the like
+    df_cols = [re.sub('conversation (\d+)', r'convo\1', col) for col in df_cols]
+    
+    ## Changes Implementation of "Other 1" to "other1" and the like
+    df_cols = [re.sub('other (\d+)', r'convo\1', col) for col in df_cols]    
+
+    ## Changes Implementation of "Data Applied" to "date"
+    df_cols = [re.sub(r'(date applied|application date|applied date|date of application)', 'date', col) for col in df_cols]
+
+    ## Changes Implementation of a generalization of "Recruitment Company" to "recruitment company"
+    df_cols = [re.sub(r'(recruiting|recruitment|headhunter) company', 'recruitment company', col) for col in df_cols]
+
+    df_set = set(df_cols)
+    
+    intersection_list = list(allowed_cols.intersection(df_set))
+
+    if 'company' not in intersection_list or 'role' not in intersection_list:
+        raise ValueError('In input ".xlsx" or ".csv" file a company and role column must exist')
+    
+    return intersection_list, df_cols
+
+class RowSchema:
+    '''
+    Compiled once from the header of an application tracker, mapping the normalised columns to their positions in the rows read and turning rows into template contexts with precomputed getters and defaults
+        Passed explicitly rather than kept in module level globals, so that it can be shared by threads, processes or library callers
+    '''
+
+    ## Context keys filled from the column of the same (lowercase) name, in the order of the context
+    ## TEMPLATE (the path of the template of the row) has no default, so that contexts of trackers without a "template" column are unchanged
+    context_cols = ['COMPANY', 'ROLE', 'EVENT', 'CONTACT', 'REFERRAL', 'CONVO1', 'CONVO2', 'OTHER1', 'OTHER2', 'TEMPLATE']
+
+    ## Columns read whether the template references them or not, to filter the rows, name the files and route rows to templates
+    required_cols = ['company', 'role', 'applied', 'recruitment company', 'template']
+
+    def __init__(self, header, variables=None, name=None):
+        '''
+        Normalises the header once and precomputes the getters of the context
+            @param header: List of the column names of the tracker, from read_app_header
+            @param variables: Set of the variables the template uses (see CompiledDocxTemplate.get_variables), the columns of all others are neither read, normalised nor put in the context, None to read every column
+            @param name: The name of the applicant, filled in as NAME
+        '''
+
+        self.intersection_list, self.df_cols = get_intersection_list(header)
+        if variables is not None:
+            self.intersection_list = [col for col in self.intersection_list if col in self.required_cols or col.upper() in variables]
+        self.positions = [self.df_cols.index(col) for col in self.intersection_list]
+
+        self.index = get_df_hash(self.intersection_list)
+        self.index['DATE'] = len(self.intersection_list) ## Columns appended by normalise_chunks
+        self.index['ADDRESS'] = len(self.intersection_list) + 1
+
+        self.defaults = {
+            'DATE': None,
+            'COMPANY': None,
+            'ADDRESS': None,
+            'ROLE': None,
+            'EVENT': None,
+            'CONTACT': None,
+            'REFERRAL': None,
+            'HMANAGER': 'To Whom it May Concern,',
+            'CONVO1': None,
+            'CONVO2': None,
+            'OTHER1': None,
+            'OTHER2': None,
+        }
+        if name is not None:
+            self.defaults['NAME'] = name
+        if variables is not None:
+            self.defaults = {key: value for key, value in self.defaults.items() if key in variables or key in ('COMPANY', 'ROLE')}
+
+        self.keys = [key for key in ('DATE', 'ADDRESS') if variables is None or key in variables] + [key for key in self.context_cols if key.lower() in self.index]
+        self.getter = operator.itemgetter(*[self.index[key] if key in ('DATE', 'ADDRESS') else self.index[key.lower()] for key in self.keys])
+        self.hmanager = self.index.get('hmanager')
+
+    def __contains__(self, col):
+        return col in self.index
+
+    def context(self, app):
+        '''
+        Turns a row into the context of its cover letter
+            @param app: Row of an application from normalise_chunks
+            @return: dictionary of the context passed to the template
+        '''
+
+        context = self.defaults.copy()
+        context.update(zip(self.keys, self.getter(app)))
+        if self.hmanager is not None:
+            context['HMANAGER'] = 'Dear' + app[self.hmanager]
+        return context
+
+    def contexts(self, chunk):
+        '''
+        Turns a whole chunk of rows into contexts in one tight loop
+            @param chunk: List of rows of applications from normalise_chunks
+            @return: List of dictionaries of the contexts
+        '''
+
+        context = self.context
+        return [context(app) for app in chunk]
+
+## Strings read as empty cells, the same as the defaults of pandas.read_csv and pandas.read_excel
+na_values = set(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+
+## Leading bytes of the binary formats of application trackers
+app_magic = {
+    b'PK\x03\x04': 'xlsx', ## Zip archive, as ".xlsx"/".xlsm" files are
+    b'\xd0\xcf\x11\xe0': 'xls', ## OLE2 compound file of legacy Excel
+    b'PAR1': 'parquet',
+}
+
+## Formats of the text based application trackers by file extension, anything else is read as a ".csv"
+app_extensions = {
+    '.tsv': 'tsv',
+    '.tab': 'tsv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+
+def get_app_format(path):
+    '''
+    Detects the format of an application tracker from its leading (magic) bytes, and for text files from its extension (or a leading "{" for JSON Lines)
+        @param path: The path of the application tracker
+        @return: One of "csv", "tsv", "jsonl", "xlsx", "xls" or "parquet"
+    '''
+
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(512)
+    except FileNotFoundError:
+        raise FileNotFoundError(
+            errno.ENOENT, os.strerror(errno.ENOENT), path
+        )
+
+    for magic, app_format in app_magic.items():
+        if head.startswith(magic):
+            return app_format
+
+    suffix = Path(path).suffix.lower()
+    if suffix in app_extensions:
+        return app_extensions[suffix]
+
+    if head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'{'):
+        return 'jsonl'
+
+    return 'csv'
+
+def get_na(value):
+    '''
+    Replaces empty cells of typed formats (".xlsx", ".parquet", JSON Lines) with "", keeping all other values as read
+        @param value: The value of a cell
+        @return: "" for None, NaN and the strings of na_values, else the value itself
+    '''
+
+    if value is None or (isinstance(value, float) and value != value) or (isinstance(value, str) and value in na_values):
+        return ''
+    return value
+
+def read_app_header(path):
+    '''
+    Reads only the header row of an application tracker, without loading any of its rows
+        @param path: The path of the application tracker, in any format of get_app_format
+        @return: List of the column names, as pandas would name them
+    '''
+
+    app_format = get_app_format(path)
+
+    if app_format in ('csv', 'tsv'):
+        import pandas as pd
+        return pd.read_csv(path, sep='\t' if app_format == 'tsv' else ',', nrows=0).columns.tolist()
+
+    if app_format == 'xlsx':
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            header = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+        return [f'Unnamed: {idx}' if col is None else str(col) for idx, col in enumerate(header)]
+
+    if app_format == 'xls':
+        import pandas as pd
+        return pd.read_excel(path, nrows=0).columns.tolist()
+
+    if app_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            if line.strip():
+                return list(json.loads(line).keys())
+    return []
+
+## Columns of the eligibility rules of get_eligible, those the tracker has are read by every run
+eligibility_cols = ['applied', 'company', 'recruitment company', 'role']
+
+def get_eligible(columns):
+    '''
+    Evaluates the eligibility rules of the rows of a tracker as one boolean mask: marked as applied ("yes", if the tracker has an "applied" column), with a role, and with a company unless only a recruitment company is given
+        @param columns: dictionary of the columns of eligibility_cols the tracker has to pandas Series of their values, empty cells as ""
+        @return: pandas boolean Series, True for the rows to generate
+    '''
+
+    mask = columns['role'] != ''
+    if 'applied' in columns:
+        mask &= columns['applied'] == 'yes'
+    if 'recruitment company' in columns: ## Rows of a recruitment company not naming the company it recruits for are skipped
+        mask &= (columns['company'] != '') | (columns['recruitment company'] == '')
+    return mask
+
+class RowFilter:
+    '''
+    Compiled once from the schema of a tracker, selecting the rows to generate with one boolean mask per chunk rather than a test per row: the eligibility rules of get_eligible and any [--where] expression
+        iter_app_chunks evaluates the mask over the columns of each chunk as read, so that only the rows selected are ever turned into rows, normalised and rendered
+    '''
+
+    def __init__(self, schema, where=None):
+        '''
+        Finds the columns the filter reads
+            @param schema: The RowSchema of the tracker
+            @param where: The WhereExpression of [--where], from parse_where, None to select every eligible row
+        '''
+
+        self.where = where
+        self.names = [col for col in eligibility_cols if col in schema]
+        cols = list(self.names)
+
+        ## Columns of the expression are named as in the tracker, whether the template uses them or not
+        for name in where.columns if where is not None else []:
+            col = next((col for col in (name, name.replace('_', ' ')) if col in schema.df_cols), None)
+            if col is None:
+                raise ValueError(f'The [--where] expression compares column "{name}", which the tracker does not have (columns: {", ".join(schema.df_cols)})')
+            if name not in self.names:
+                self.names.append(name)
+                cols.append(col)
+
+        self.positions = [schema.df_cols.index(col) for col in cols] ## Positions in the header of the columns of names
+
+    def mask(self, columns):
+        '''
+        Evaluates the filter over a chunk of rows
+            @param columns: dictionary of each of names to a pandas Series of its values, empty cells as ""
+            @return: numpy boolean array, True for the rows selected
+        '''
+
+        mask = get_eligible(columns)
+        if self.where is not None:
+            mask &= self.where.evaluate(columns)
+        return mask.to_numpy(dtype=bool)
+
+def select_rows(raws, cell, positions, row_filter=None):
+    '''
+    Turns the raw rows of a chunk read cell by cell (tuples of a worksheet, records of JSON Lines, indices of a batch) into rows, only those selected by row_filter
+        @param raws: List of the raw rows
+        @param cell: Function of a raw row and a position in the header returning the value of the cell, empty cells as ""
+        @param positions: List of the positions in the header of the columns of the rows
+        @param row_filter: The RowFilter selecting the rows, None for every row
+        @return: List of the selected rows, each with its values in the order of positions
+    '''
+
+    if row_filter is not None and raws:
+        import pandas as pd
+        mask = row_filter.mask({name: pd.Series([cell(raw, position) for raw in raws], dtype=object) for name, position in zip(row_filter.names, row_filter.positions)})
+        raws = [raw for raw, keep in zip(raws, mask) if keep]
+
+    return [[cell(raw, position) for position in positions] for raw in raws]
+
+def iter_app_chunks(path, positions, chunksize=1000, row_filter=None):
+    '''
+    Streams the rows of an application tracker in chunks with the one parser of its format, so that the whole tracker is never held in memory
+        Only the columns at positions are read, empty cells (and the strings of na_values) are returned as "" and all other cells of a ".csv"/".tsv" as strings
+        @param path: The path of the application tracker, in any format of get_app_format
+        @param positions: List of the positions in the header of the columns to read, in the order of intersection_list
+        @param chunksize: The number of rows read per chunk, before filtering
+        @param row_filter: The RowFilter selecting the rows of each chunk (reading its columns as well), None for every row
+        @return: Generator of lists of rows, each row with its values in the order of positions
+    '''
+
+    app_format = get_app_format(path)
+    usecols = sorted(set(positions) | set(row_filter.positions if row_filter is not None else []))
+    order = [usecols.index(position) for position in positions]
+
+    if app_format in ('csv', 'tsv'):
+        import pandas as pd
+        reader = pd.read_csv(path, sep='\t' if app_format == 'tsv' else ',', dtype=str, usecols=usecols, chunksize=chunksize)
+        for df_chunk in reader:
+            if row_filter is not None:
+                df_chunk = df_chunk[row_filter.mask({name: df_chunk.iloc[:, usecols.index(position)].fillna('') for name, position in zip(row_filter.names, row_filter.positions)})]
+            yield df_chunk.iloc[:, order].fillna('').to_numpy().tolist()
+
+    elif app_format == 'xlsx':
+        import openpyxl
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        cell = lambda row, position: get_na(row[position]) if position < len(row) else ''
+        try:
+            chunk = []
+            for row in workbook.worksheets[0].iter_rows(min_row=2, values_only=True):
+                if all(value is None for value in row): ## Blank rows are skipped, as by pandas
+                    continue
+
+                chunk.append(row)
+                if len(chunk) >= chunksize:
+                    yield select_rows(chunk, cell, positions, row_filter)
+                    chunk = []
+
+            if chunk:
+                yield select_rows(chunk, cell, positions, row_filter)
+        finally:
+            workbook.close()
+
+    elif app_format == 'xls':
+        import pandas as pd
+        df = pd.read_excel(path, usecols=usecols)
+        columns = {position: df.iloc[:, usecols.index(position)].tolist() for position in usecols}
+        cell = lambda idx, position: get_na(columns[position][idx])
+        for start in range(0, len(df), chunksize):
+            yield select_rows(range(start, min(start + chunksize, len(df))), cell, positions, row_filter)
+
+    elif app_format == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        names = {position: parquet_file.schema_arrow.names[position] for position in usecols}
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=sorted(set(names.values()))):
+            columns = {name: batch.column(name).to_pylist() for name in set(names.values())}
+            cell = lambda idx, position: get_na(columns[names[position]][idx])
+            yield select_rows(range(batch.num_rows), cell, positions, row_filter)
+
+    else:
+        header = read_app_header(path)
+        cell = lambda record, position: get_na(record.get(header[position]))
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            chunk = []
+            for line in f:
+                if not line.strip():
+                    continue
+
+                chunk.append(json.loads(line))
+                if len(chunk) >= chunksize:
+                    yield select_rows(chunk, cell, positions, row_filter)
+                    chunk = []
+
+            if chunk:
+                yield select_rows(chunk, cell, positions, row_filter)
+
+def get_shard(company, count):
+    '''
+    Assigns a company to a shard of [--shard] by a stable hash of its name, so that every cover letter of a company (and so its folder) is generated by the same shard on every run and machine
+        @param company: The company of the application
+        @param count: The number of shards
+        @return: The shard of the company, from 1 to count
+    '''
+
+    digest = hashlib.sha1(str(company).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+def filter_shard(chunks, schema, shard):
+    '''
+    Filters the streamed chunks of applications down to the rows of a shard, before they are normalised so that every illegible value is counted by a single shard
+        @param chunks: Generator of lists of rows from iter_app_chunks
+        @param schema: The RowSchema of the tracker
+        @param shard: Tuple of the shard (from 1) and the number of shards, from parse_shard
+        @return: Generator of lists of the rows of the shard
+    '''
+
+    shard, count = shard
+    rm = schema.index
+    shards = {} ## Shard of every company seen, as most companies have several rows
+
+    for chunk in chunks:
+        apps = []
+        for app in chunk:
+            company = app[rm['company']]
+            if company not in shards:
+                shards[company] = get_shard(company, count)
+            if shards[company] == shard:
+                apps.append(app)
+
+        yield apps
+
+def parse_shard(value):
+    '''
+    Parses the shard of [--shard]
+        @param value: "K/N", the K-th of N shards (from 1)
+        @return: Tuple of K and N
+    '''
+
+    shard, _, count = value.partition('/')
+    try:
+        shard, count = int(shard), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'The shard must be "K/N", e.g. "1/4", not "{value}"')
+
+    if not 1 <= shard <= count:
+        raise argparse.ArgumentTypeError(f'The shard K of "{value}" must be between 1 and N')
+
+    return shard, count
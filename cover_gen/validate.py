@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+'''
+Pre-render validation of a template against the application tracker, so that a typo in a placeholder or a missing column fails the run before any cover letter is rendered or converted
+'''
+
+import difflib
+
+from .tracker import RowSchema, allowed_cols, get_intersection_list
+
+## Context keys always filled whatever the columns of the tracker: DATE defaults to today and HMANAGER to a generic greeting
+default_keys = set(['DATE', 'HMANAGER'])
+
+## Every context key a tracker can fill, each from the column of the same (lowercase) name
+column_keys = set(['DATE', 'ADDRESS', 'HMANAGER'] + RowSchema.context_cols)
+
+## Context keys whose column every tracker must have, the others are optional and render empty when their column is missing
+required_keys = set(['COMPANY', 'ROLE'])
+
+class TemplateError(ValueError):
+    '''
+    Raised when a template cannot be rendered from the tracker, reported as an invalid argument of the command line
+    '''
+
+def get_ignored_columns(header):
+    '''
+    Obtains the columns of a tracker that are not used by the script, whatever the template
+        @param header: List of the column names of the tracker, from read_app_header
+        @return: List of the (original) names of the columns not in allowed_cols after normalisation
+    '''
+
+    _, df_cols = get_intersection_list(header)
+    return [str(col) for col, df_col in zip(header, df_cols) if df_col not in allowed_cols]
+
+def check_variables(variables, header=None, name=None, guarded=frozenset()):
+    '''
+    Cross-checks the variables of a template against the context keys the tracker (or command line) fills
+        Variables the template only uses guarded by an {% if %}, and those of the optional columns of the tracker, are only warned about as their text is left out (or empty) when missing
+        @param variables: Set of the variables of the template, from CompiledDocxTemplate.get_variables
+        @param header: List of the column names of the tracker, None when generating from the command line arguments (which can fill every key)
+        @param name: The name of the applicant, filling NAME
+        @param guarded: Set of the variables the template only uses guarded by an {% if %}, from CompiledDocxTemplate.get_guarded_variables
+        @return: Tuple of the lists of messages of every problem found, empty if the template can be rendered from the tracker, and of the warnings
+    '''
+
+    known = column_keys | set(['NAME'])
+    problems = []
+    warnings = []
+
+    for variable in sorted(variables - known):
+        close = difflib.get_close_matches(variable, sorted(known), n=1)
+        message = f'"{variable}" is not a variable cover-gen fills' + (f', did you mean "{close[0]}"?' if close else '')
+        (warnings if variable in guarded else problems).append(message)
+
+    if name is None and 'NAME' in variables:
+        (warnings if 'NAME' in guarded else problems).append('"NAME" is only filled from the [-name] argument')
+
+    if header is not None:
+        intersection_list, _ = get_intersection_list(header)
+        provided = default_keys | set(col.upper() for col in intersection_list)
+        for variable in sorted((variables & column_keys) - provided):
+            message = f'"{variable}" has no "{variable.lower()}" column in the tracker'
+            if variable in required_keys and variable not in guarded:
+                problems.append(message)
+            else:
+                warnings.append(message + ', rendered empty')
+
+    return problems, warnings
+
+def validate_template(template, path, header=None, name=None):
+    '''
+    Validates a template before any cover letter is rendered, failing the run up front rather than after the whole tracker, and prints any warnings
+        @param template: The CompiledDocxTemplate
+        @param path: The path of the template, for the error message
+        @param header: List of the column names of the tracker, None when generating from the command line arguments
+        @param name: The name of the applicant
+        @return: Set of the variables of the template
+    '''
+
+    variables = template.get_variables()
+    problems, warnings = check_variables(variables, header, name, template.get_guarded_variables())
+    if warnings:
+        print(f'Warning, the template {path}: ' + '; '.join(warnings))
+    if problems:
+        raise TemplateError(f'The template {path} cannot be rendered: ' + '; '.join(problems) + ' (use [--no_validate] to render anyway)')
+    return variables
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+'''
+Watch mode of the command line [--watch]: keeps the compiled templates and the rows of the tracker in memory, and on every change of the tracker re-renders only the rows added or changed since, or every row if a template changed
+'''
+
+import os
+import time
+
+from .manifest import get_context_hash
+from .tracker import RowFilter, read_app_header
+from .generator import CoverLetterGenerator, load_template_rules
+from .cli import iter_contexts, print_errors, get_schema
+
+def get_template_paths(args):
+    '''
+    Obtains the files the templates of a run are compiled from, reloading the [--template_rules]
+        @param args: The parsed arguments, from parse_args
+        @return: List of the paths of the [--template], the [--template_rules] file and the template of each of its rules
+    '''
+
+    paths = [args.template]
+    if args.template_rules:
+        paths.append(args.template_rules)
+        paths.extend(rule['template'] for rule in load_template_rules(args.template_rules))
+    return paths
+
+def get_mtimes(paths):
+    '''
+    Obtains the modification time of each watched file
+        @param paths: List of the paths of the files
+        @return: Tuple of the modification time in nanoseconds of each file, None for a missing file
+    '''
+
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+def diff_contexts(generator, contexts, previous):
+    '''
+    Compares the rows of a tracker against those of its previous version by their output file, as only the last row written to a file is kept
+        @param generator: The CoverLetterGenerator naming the output files
+        @param contexts: Iterable of the contexts of the tracker
+        @param previous: dictionary of the ".docx" path of every row of the previous version to the hash of its context
+        @return: Tuple of the list of contexts of the rows added or changed, in order of the tracker, and the dictionary of the ".docx" path of every row to the hash of its context
+    '''
+
+    latest = {}
+    for context in contexts:
+        out_docx, _ = generator.get_out_paths(context)
+        latest.pop(out_docx, None) ## Kept in order of the last row written to the file
+        latest[out_docx] = (get_context_hash(context), context)
+
+    changed = [context for out_docx, (context_hash, context) in latest.items() if previous.get(out_docx) != context_hash]
+    current = {out_docx: context_hash for out_docx, (context_hash, _) in latest.items()}
+
+    return changed, current
+
+def watch(args, sink):
+    '''
+    Generates every cover letter of the [--app_list], then polls the tracker and templates (including the [--template_rules] and the template of each rule) every [--watch_interval] seconds until interrupted
+        A change is handled once the modification times are the same for two polls in a row, so that a file is not read while it is still being saved
+        An error reading the tracker or compiling a template (e.g. saved half way) is printed and the change is retried once the file changes again
+        The variables of the templates are checked against the tracker and only the columns they use are read, as in a run without [--watch]
+        @param args: The parsed arguments, from parse_args
+        @param sink: The OutputSink selected with [--output], a folder
+    '''
+
+    paths = [args.app_list, args.template] + ([args.template_rules] if args.template_rules else []) ## Extended by the templates of the rules once loaded
+
+    generator = None
+    template_mtimes = None
+    header = None
+    schema = None
+    row_filter = None
+    previous = {}
+    handled = None
+    seen = None
+
+    print(f'Watching {args.app_list} and {", ".join(paths[1:])} for changes, press Ctrl+C to stop')
+
+    try:
+        while True:
+            mtimes = get_mtimes(paths)
+            if mtimes == seen and mtimes != handled and None not in mtimes:
+                handled = mtimes
+                start = time.perf_counter()
+                try:
+                    if generator is None or mtimes[1:] != template_mtimes:
+                        ## The rules may route rows to other templates since the last change, which are watched from now on
+                        template_paths = get_template_paths(args)
+                        if template_paths != paths[1:]:
+                            paths = [args.app_list] + template_paths
+                            mtimes = handled = get_mtimes(paths)
+                            if None in mtimes:
+                                raise FileNotFoundError(f'A template of {args.template_rules} does not exist: {", ".join(path for path, mtime in zip(paths, mtimes) if mtime is None)}')
+
+                        generator = CoverLetterGenerator.from_args(args, sink)
+                        template_mtimes = mtimes[1:]
+                        header = None ## The templates are checked against the tracker again
+                        previous = {} ## A changed template changes every cover letter
+
+                    latest_header = read_app_header(args.app_list)
+                    if latest_header != header:
+                        schema = get_schema(args, generator, latest_header)
+                        row_filter = RowFilter(schema, args.where)
+                        header = latest_header
+
+                    generator.errors.clear()
+                    generator.failures.clear()
+
+                    changed, current = diff_contexts(generator, iter_contexts(args.app_list, schema, generator.errors, generator.failures, generator.stats, args.shard, row_filter), previous)
+                    count_gen, _ = generator.generate_many(changed, args.workers)
+                    failed = {out_docx for _, _, out_docx in generator.close()}
+                    current = {out_docx: context_hash for out_docx, context_hash in current.items() if sink.get_local_path(out_docx) not in failed} ## Retried on the next change
+                except Exception as error:
+                    print(f'Could not re-render after the change: {error!r}')
+                else:
+                    removed = len(previous.keys() - current.keys())
+                    previous = current
+
+                    print('='*74)
+                    print(f'{time.strftime("%H:%M:%S")} Re-rendered {count_gen} added or changed cover letters of {len(current)} in {time.perf_counter() - start:.2f}s' + (f', {removed} rows removed' if removed else ''))
+                    print_errors(generator.errors)
+
+            seen = mtimes
+            time.sleep(args.watch_interval)
+
+    except KeyboardInterrupt:
+        print('Stopped watching')
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+'''
+The [--where] selection expressions of [--app_list] runs, parsed once into a WhereExpression evaluated as a boolean mask over the columns of each chunk of rows
+    e.g. company in ["Apple", "Google"] and date >= 2023-05-01 and not role == "Intern"
+    pandas and dateutil are imported on first evaluation, so that parsing the command line stays cheap
+'''
+
+import re
+import ast
+import datetime
+import argparse
+import operator
+
+## Tokens of an expression, tried in order at each position
+token_pattern = re.compile(r'''\s*(?:
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    |(?P<date>\d{4}-\d{2}-\d{2}(?![\w.-]))
+    |(?P<number>-?\d+(?:\.\d+)?(?![\w.-]))
+    |(?P<op>==|!=|<=|>=|<|>|=)
+    |(?P<punct>[()\[\],])
+    |(?P<column>`[^`]+`)
+    |(?P<word>[A-Za-z_]\w*)
+)''', re.VERBOSE)
+
+## Comparison operators, "=" being an alias of "=="
+comparisons = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+keywords = set(['and', 'or', 'not', 'in'])
+
+def get_values(series, kind):
+    '''
+    Converts a column to the type of the value it is compared with
+        @param series: pandas Series of the values of the column, empty cells as ""
+        @param kind: The type of the value, str, float or datetime.date
+        @return: pandas Series of the strings, numbers (NaN if not numeric) or dates at midnight (NaT if empty or illegible, see parse_dates) of the column
+    '''
+
+    import pandas as pd
+    from .normalise import parse_dates
+
+    if kind is str:
+        return series.astype(str)
+    if kind is float:
+        return pd.to_numeric(series, errors='coerce')
+    return parse_dates(series).dt.normalize() ## Compared by day, as the dates of an expression
+
+class WhereExpression:
+    '''
+    A parsed [--where] expression: comparisons of columns with strings ("Apple"), numbers (3) and dates (2023-05-01) by ==, !=, <, <=, >, >=, "in" and "not in" a list, combined with "and", "or", "not" and parentheses
+        Columns are named as in the tracker, case-insensitively, with spaces as underscores (recruitment_company) or within backticks (`recruitment company`)
+        Strings compare exactly, numbers and dates compare with the values of the column parsed as such, and empty or illegible values never compare as "==", "<", ">" or "in"
+    '''
+
+    def __init__(self, text):
+        '''
+        Parses an expression
+            @param text: The expression
+        '''
+
+        self.text = text
+        self.columns = [] ## The columns compared, in order of first use
+        self.tokens = self.tokenize(text)
+        self.pos = 0
+
+        self.evaluate_node = self.parse_or()
+        if self.pos < len(self.tokens):
+            self.fail(f'unexpected "{self.tokens[self.pos][1]}"')
+
+    def __repr__(self):
+        return f'WhereExpression({self.text!r})'
+
+    def fail(self, message):
+        raise ValueError(f'Invalid [--where] expression "{self.text}": {message}')
+
+    def tokenize(self, text):
+        '''
+        Splits an expression into its tokens
+            @param text: The expression
+            @return: List of tuples of the kind and text of each token
+        '''
+
+        tokens = []
+        pos = 0
+        while text[pos:].strip():
+            match = token_pattern.match(text, pos)
+            if match is None:
+                self.fail(f'unexpected "{text[pos:].strip()[:20]}"')
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'word' and value.lower() in keywords:
+                kind, value = 'keyword', value.lower()
+            tokens.append((kind, value))
+            pos = match.end()
+        return tokens
+
+    def peek(self, kind=None, value=None):
+        if self.pos >= len(self.tokens):
+            return False
+        token = self.tokens[self.pos]
+        return (kind is None or token[0] == kind) and (value is None or token[1] == value)
+
+    def take(self, kind=None, value=None, expected=None):
+        if not self.peek(kind, value):
+            found = f'"{self.tokens[self.pos][1]}"' if self.pos < len(self.tokens) else 'the end of the expression'
+            expected = expected or (f'"{value}"' if value else kind)
+            self.fail(f'expected {expected}, found {found}')
+        self.pos += 1
+        return self.tokens[self.pos - 1][1]
+
+    def parse_or(self):
+        nodes = [self.parse_and()]
+        while self.peek('keyword', 'or'):
+            self.pos += 1
+            nodes.append(self.parse_and())
+        if len(nodes) == 1:
+            return nodes[0]
+
+        def evaluate(columns):
+            mask = nodes[0](columns)
+            for node in nodes[1:]:
+                mask = mask | node(columns)
+            return mask
+        return evaluate
+
+    def parse_and(self):
+        nodes = [self.parse_not()]
+        while self.peek('keyword', 'and'):
+            self.pos += 1
+            nodes.append(self.parse_not())
+        if len(nodes) == 1:
+            return nodes[0]
+
+        def evaluate(columns):
+            mask = nodes[0](columns)
+            for node in nodes[1:]:
+                mask = mask & node(columns)
+            return mask
+        return evaluate
+
+    def parse_not(self):
+        if self.peek('keyword', 'not'):
+            self.pos += 1
+            node = self.parse_not()
+            return lambda columns: ~node(columns)
+
+        if self.peek('punct', '('):
+            self.pos += 1
+            node = self.parse_or()
+            self.take('punct', ')')
+            return node
+
+        return self.parse_comparison()
+
+    def parse_column(self):
+        if not (self.peek('word') or self.peek('column')):
+            self.take('word', expected='a column') ## Fails, as no column follows
+        value = self.take()
+
+        name = value.strip('`').lower()
+        if name not in self.columns:
+            self.columns.append(name)
+        return name
+
+    def parse_value(self):
+        if self.peek('string'):
+            return ast.literal_eval(self.take())
+        if self.peek('number'):
+            return float(self.take())
+        if self.peek('date'):
+            value = self.take()
+            try:
+                return datetime.datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                self.fail(f'"{value}" is not a date')
+        if self.peek('word'):
+            self.fail(f'expected a value, found "{self.tokens[self.pos][1]}" (strings must be quoted)')
+        self.take('string', expected='a value') ## Fails, as no value follows
+
+    def parse_comparison(self):
+        name = self.parse_column()
+
+        negate = False
+        if self.peek('keyword', 'not'):
+            self.pos += 1
+            negate = True
+            self.take('keyword', 'in')
+        elif self.peek('keyword', 'in'):
+            self.pos += 1
+        else:
+            compare = comparisons[self.take('op', expected='a comparison')]
+            value = self.parse_value()
+            kind = type(value) if not isinstance(value, datetime.date) else datetime.date
+            return lambda columns: compare(get_values(columns[name], kind), value)
+
+        self.take('punct', '[')
+        values = []
+        while not self.peek('punct', ']'):
+            values.append(self.parse_value())
+            if not self.peek('punct', ']'):
+                self.take('punct', ',', expected='"," or "]"')
+        self.pos += 1
+
+        ## Values of each type are looked up at once, in the column converted to that type
+        groups = {}
+        for value in values:
+            groups.setdefault(datetime.date if isinstance(value, datetime.date) else type(value), []).append(value)
+
+        def evaluate(columns):
+            import pandas as pd
+
+            series = columns[name]
+            mask = pd.Series(False, index=series.index)
+            for kind, group in groups.items():
+                mask = mask | get_values(series, kind).isin(group)
+            return ~mask if negate else mask
+        return evaluate
+
+    def evaluate(self, columns):
+        '''
+        Evaluates the expression over a chunk of rows
+            @param columns: dictionary of each of columns to a pandas Series of its values, empty cells as ""
+            @return: pandas boolean Series, True for the rows selected
+        '''
+
+        return self.evaluate_node(columns)
+
+def parse_where(value):
+    '''
+    Parses the expression of [--where]
+        @param value: The expression, e.g. 'company in ["A", "B"] and date >= 2023-05-01'
+        @return: WhereExpression object
+    '''
+
+    try:
+        return WhereExpression(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+'''
+XML substitution engine for templates using nothing but plain placeholders ("{{COMPANY}}", "{{ROLE}}", ...), selected automatically by CompiledDocxTemplate
+    The templated parts (body, headers, footers, footnotes) are scanned once into literal segments and slots, so each cover letter is a concatenation of the segments and the XML escaped values
+    All other members of the ".docx" are copied into every cover letter as their compressed bytes, without being decompressed or parsed
+    Templates with any control flow, filter or expression are left to docxtpl
+'''
+
+import io
+import re
+import zlib
+import struct
+import zipfile
+
+from jinja2 import Environment, nodes
+
+## Members of the ".docx" rendered by docxtpl, besides the core properties
+templated_members = re.compile(r'^word/(document|header\d*|footer\d*|footnotes)\.xml$')
+
+## Tags of docxtpl needing a RichText object or removing their surrounding paragraph, row, cell or run
+docxtpl_tags = re.compile(r'\{%|\{\{(p|r|tr|tc) ')
+
+## Markers (of private use characters) standing in for each slot while the literal segments are post-processed as docxtpl would
+marker = re.compile(r'\ue000(\d+)\ue001')
+
+## docxtpl's fix_docpr_ids renumbers the drawings of the body from 1001 on every render
+docpr_id = re.compile(r'(<wp:docPr\b[^>]*?\bid=")\d+(")')
+
+def escape(value):
+    '''
+    Escapes a value for the text or an attribute of an XML element
+        @param value: The string to escape
+        @return: The escaped string
+    '''
+
+    if '&' in value:
+        value = value.replace('&', '&amp;')
+    if '<' in value:
+        value = value.replace('<', '&lt;')
+    if '>' in value:
+        value = value.replace('>', '&gt;')
+    if '"' in value:
+        value = value.replace('"', '&quot;')
+    return value
+
+def resolve_listing(value, run_properties, paragraph_properties):
+    '''
+    Turns the tabs, new lines, paragraph (\\a) and page (\\f) breaks of a value within a text element into runs, as DocxTemplate.resolve_listing does to the whole rendered XML
+        @param value: The escaped value
+        @param run_properties: The properties of the run of the text element
+        @param paragraph_properties: The properties of the paragraph of the run
+        @return: The value as XML
+    '''
+
+    value = value.replace('\t', '</w:t></w:r><w:r>%s<w:tab/></w:r><w:r>%s<w:t xml:space="preserve">' % (run_properties, run_properties))
+    value = value.replace('\a', '</w:t></w:r></w:p><w:p>%s<w:r>%s<w:t xml:space="preserve">' % (paragraph_properties, run_properties))
+    value = value.replace('\n', '</w:t><w:br/><w:t xml:space="preserve">')
+    value = value.replace('\f', '</w:t></w:r></w:p><w:p><w:r><w:br w:type="page"/></w:r></w:p><w:p>%s<w:r>%s<w:t xml:space="preserve">' % (paragraph_properties, run_properties))
+    return value
+
+def get_dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+class XMLTemplate:
+    '''
+    A ".docx" template of plain placeholders compiled into literal segments and slots, rendering a cover letter by streaming concatenation instead of Jinja and a round trip through python-docx
+        The document.xml, headers and footers hold the same content as those rendered by docxtpl (with values XML escaped, which docxtpl leaves to the template), and every other member is copied byte for byte
+        Safe to share between threads, as render() keeps no state
+    '''
+
+    listing_chars = ('\t', '\a', '\n', '\f')
+
+    def __init__(self, entries):
+        '''
+            @param entries: List of the members of the ".docx" in order, each a tuple of its name, its ZipInfo and either the bytes of the member (copied) or the tuple of its literal segments and slots (templated)
+        '''
+
+        self.entries = entries
+
+    @classmethod
+    def compile(cls, template):
+        '''
+        Scans the templated parts of a compiled template into literal segments and slots
+            @param template: The CompiledDocxTemplate, whose template_bytes are scanned with its (docxtpl) patch_xml and resolve_listing
+            @return: XMLTemplate object, None if the template uses anything but plain placeholders
+        '''
+
+        archive = zipfile.ZipFile(io.BytesIO(template.template_bytes))
+        raw = template.template_bytes
+
+        ## Core properties are rendered as Jinja templates too
+        if 'docProps/core.xml' in archive.namelist():
+            core = archive.read('docProps/core.xml').decode('utf-8', errors='replace')
+            if '{{' in core or '{%' in core:
+                return None
+
+        entries = []
+        for info in archive.infolist():
+            if templated_members.match(info.filename):
+                src_xml = archive.read(info.filename).decode('utf-8')
+                if '{' in src_xml:
+                    compiled = cls.compile_part(template, src_xml, info.filename == 'word/document.xml')
+                    if compiled is None:
+                        return None
+                    entries.append((info.filename, info, compiled))
+                    continue
+
+            ## The compressed bytes of the member, found after its local header
+            name_length, extra_length = struct.unpack('<2H', raw[info.header_offset + 26:info.header_offset + 30])
+            start = info.header_offset + zipfile.sizeFileHeader + name_length + extra_length
+            entries.append((info.filename, info, raw[start:start + info.compress_size]))
+
+        return cls(entries)
+
+    @classmethod
+    def compile_part(cls, template, src_xml, body):
+        '''
+        Scans a templated part into its literal segments and slots
+            @param template: The CompiledDocxTemplate
+            @param src_xml: The XML of the part
+            @param body: Whether the part is the document.xml, whose drawings are renumbered as by docxtpl
+            @return: Tuple of the list of literal segments and the list of slots (each a tuple of the context key and, for a slot within a text element, the run and paragraph properties), None if the part uses anything but plain placeholders
+        '''
+
+        if docxtpl_tags.search(src_xml) or '\ue000' in src_xml:
+            return None
+
+        ## The same preprocessing as CompiledDocxTemplate.compile_xml, which stitches placeholders that Word split across runs
+        src_xml = template.patch_xml(src_xml)
+        src_xml = re.sub(r'<w:p([ >])', r'\n<w:p\1', src_xml)
+
+        literals = ['']
+        keys = []
+        for node in Environment().parse(src_xml).body:
+            if not isinstance(node, nodes.Output):
+                return None
+            for child in node.nodes:
+                if isinstance(child, nodes.TemplateData):
+                    literals[-1] += child.data
+                elif isinstance(child, nodes.Name) and child.ctx == 'load':
+                    keys.append(child.name)
+                    literals.append('')
+                else:
+                    return None
+
+        ## Post-processing of DocxTemplate.render_xml_part and fix_docpr_ids, on the literal segments with a marker for each slot
+        skeleton = ''.join(literal + (f'\ue000{idx}\ue001' if idx < len(keys) else '') for idx, literal in enumerate(literals))
+        skeleton = re.sub(r'\n<w:p([ >])', r'<w:p\1', skeleton)
+        skeleton = skeleton.replace('{_{', '{{').replace('}_}', '}}').replace('{_%', '{%').replace('%_}', '%}')
+        if body:
+            ids = iter(range(1001, 1 << 31))
+            skeleton = docpr_id.sub(lambda m: f'{m.group(1)}{next(ids)}{m.group(2)}', skeleton)
+
+        ## The run and paragraph properties of every slot within a text element, found as DocxTemplate.resolve_listing finds them
+        properties = {}
+        for paragraph in re.finditer(r'<w:p(?: [^>]*)?>.*?</w:p>', skeleton, flags=re.DOTALL):
+            paragraph_properties = re.search(r'<w:pPr>.*?</w:pPr>', paragraph.group(0))
+            paragraph_properties = paragraph_properties.group(0) if paragraph_properties else ''
+            for run in re.finditer(r'<w:r(?: [^>]*)?>.*?</w:r>', paragraph.group(0), flags=re.DOTALL):
+                run_properties = re.search(r'<w:rPr>.*?</w:rPr>', run.group(0))
+                run_properties = run_properties.group(0) if run_properties else ''
+                for text in re.finditer(r'<w:t(?: [^>]*)?>.*?</w:t>', run.group(0), flags=re.DOTALL):
+                    for slot in marker.finditer(text.group(0)):
+                        properties[int(slot.group(1))] = (run_properties, paragraph_properties)
+
+        segments = marker.split(template.resolve_listing(skeleton))
+        if [int(idx) for idx in segments[1::2]] != list(range(len(keys))):
+            return None
+
+        slots = [(key, properties.get(idx)) for idx, key in enumerate(keys)]
+        return segments[0::2], slots
+
+    def render_part(self, compiled, context):
+        '''
+        Concatenates the literal segments of a part with the escaped values of the context
+            @param compiled: Tuple of the literal segments and slots of the part
+            @param context: dictionary of the context
+            @return: The XML of the part
+        '''
+
+        literals, slots = compiled
+        pieces = [literals[0]]
+        for (key, properties), literal in zip(slots, literals[1:]):
+            value = context.get(key, '')
+            value = escape(value if isinstance(value, str) else str(value)) ## Rendered as Jinja would, e.g. None as "None"
+            if '_' in value:
+                value = value.replace('{_{', '{{').replace('}_}', '}}').replace('{_%', '{%').replace('%_}', '%}')
+            if properties is not None and any(char in value for char in self.listing_chars):
+                value = resolve_listing(value, *properties)
+            pieces.append(value)
+            pieces.append(literal)
+        return ''.join(pieces)
+
+    def render(self, context):
+        '''
+        Renders a cover letter
+            @param context: dictionary of the context passed to the template
+            @return: The bytes of the rendered ".docx"
+        '''
+
+        out = []
+        central = []
+        offset = 0
+
+        for name, info, member in self.entries:
+            if isinstance(member, tuple):
+                data = self.render_part(member, context).encode('utf-8')
+                crc = zlib.crc32(data)
+                size = len(data)
+                compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+                member = compressor.compress(data) + compressor.flush()
+                method = zipfile.ZIP_DEFLATED
+            else:
+                crc = info.CRC
+                size = info.file_size
+                method = info.compress_type
+
+            flags = info.flag_bits & ~0x08 ## Sizes are written in the local header rather than a data descriptor
+            filename = name.encode('utf-8' if info.flag_bits & 0x800 else 'cp437')
+            dos_time, dos_date = get_dos_time(info.date_time)
+
+            header = struct.pack(zipfile.structFileHeader, zipfile.stringFileHeader, 20, 0, flags, method, dos_time, dos_date, crc, len(member), size, len(filename), 0)
+            central.append(struct.pack(zipfile.structCentralDir, zipfile.stringCentralDir, 20, 0, 20, 0, flags, method, dos_time, dos_date, crc, len(member), size, len(filename), 0, 0, 0, 0, info.external_attr, offset) + filename)
+
+            out.append(header)
+            out.append(filename)
+            out.append(member)
+            offset += len(header) + len(filename) + len(member)
+
+        central = b''.join(central)
+        end = struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0, len(self.entries), len(self.entries), len(central), offset, 0)
+
+        return b''.join(out) + central + end
@@ -25,4 +25,11 @@ setuptools.setup(
         "pandas",
         "python-dateutil"
     ],
+    extras_require={
+        "parquet": ["pyarrow"],
+        "merge": ["pypdf"],
+    },
+    entry_points={
+        "console_scripts": ["cover-gen=cover_gen.cli:main"],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+'''
+Fixtures of the test suite: the bundled template, and the synthetic trackers and templates of the benchmark suite (see benchmarks/synthetic.py)
+'''
+
+import os
+import sys
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
+
+from synthetic import write_tracker, write_template
+
+@pytest.fixture
+def bundled_template():
+    return os.path.join(root, 'cover-letter-template.docx')
+
+@pytest.fixture
+def tracker(tmp_path):
+    '''
+    A synthetic tracker of 200 rows, with messy dates and addresses
+    '''
+
+    return write_tracker(str(tmp_path / 'tracker.csv'), 200)
+
+@pytest.fixture
+def make_template(tmp_path):
+    '''
+    Writes a synthetic template of benchmarks/synthetic.py, one of template_names
+    '''
+
+    def make(name):
+        path = str(tmp_path / f'template-{name}.docx')
+        write_template(path, name)
+        return path
+    return make
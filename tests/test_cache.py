@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the RenderCache of [--cache_dir], its least recently used eviction and its reuse across runs
+'''
+
+import os
+import json
+import time
+
+from cover_gen.cli import main
+from cover_gen.cache import RenderCache, parse_size
+
+def run(tracker, template, output, cache_dir, *argv):
+    main(['-name', 'Test Applicant', '--app_list', tracker, '--template', template, '--pdf_backend', 'fake', '--output', output, '--cache_dir', cache_dir, '--report', os.path.join(output, 'report.json')] + list(argv))
+    with open(os.path.join(output, 'report.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def set_used(cache, name, used):
+    os.utime(cache.get_path(name), (used, used))
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    now = time.time()
+    for idx in range(4):
+        cache.put(f'{idx:02d}.docx', bytes(200))
+        set_used(cache, f'{idx:02d}.docx', now - 100 + idx)
+
+    ## A hit refreshes the last used time of the oldest file
+    assert cache.get('00.docx') == bytes(200)
+
+    ## 1200 bytes are over max_bytes, evicting the least recently used down to the low watermark of 900 bytes
+    cache.put('04.docx', bytes(400))
+    assert [cache.get(f'{idx:02d}.docx') is not None for idx in range(5)] == [True, False, False, True, True]
+    assert cache.size == 800
+
+def test_evicts_by_size(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=1000)
+    cache.put('small.docx', bytes(100))
+    cache.put('large.docx', bytes(950)) ## The newest file, but alone larger than the low watermark
+
+    assert cache.get('small.docx') is None
+    assert cache.get('large.docx') is None
+    assert cache.size == 0
+
+def test_stale_temporary_files_are_removed(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    cache.put('kept.docx', b'data')
+
+    stale = cache.get_path('kept.docx') + '.123-456.tmp'
+    with open(stale, 'wb') as f:
+        f.write(b'partial')
+    os.utime(stale, (time.time() - cache.stale_tmp - 1,) * 2)
+
+    assert [path for path, _, _ in cache.scan()] == [cache.get_path('kept.docx')]
+    assert not os.path.exists(stale)
+
+def test_parse_size():
+    assert parse_size('1048576') == 1 << 20
+    assert parse_size('500M') == 500 << 20
+    assert parse_size('1.5kb') == 1536
+
+def test_reused_across_runs(tmp_path, monkeypatch, tracker, bundled_template):
+    monkeypatch.chdir(tmp_path)
+    cache_dir = str(tmp_path / 'cache')
+
+    report = run(tracker, bundled_template, str(tmp_path / 'first'), cache_dir)
+    assert report['counts'].get('cached', 0) == 0
+
+    ## Every cover letter is copied from the cache rather than rendered or converted
+    report = run(tracker, bundled_template, str(tmp_path / 'second'), cache_dir)
+    assert (report['counts']['cached'], report['counts']['cached_pdf']) == (200, 200)
+    assert 'pdf' not in report['stages']
+
+    ## Another rendering engine is another render key
+    report = run(tracker, bundled_template, str(tmp_path / 'third'), cache_dir, '--engine', 'docxtpl')
+    assert report['counts'].get('cached', 0) == 0
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of deduplicated rendering, rows written to the same output file with the same render key are rendered and converted once
+'''
+
+import os
+import json
+import zipfile
+
+from cover_gen.cli import main
+
+def run(tracker, template, output, *argv):
+    main(['-name', 'Test Applicant', '--app_list', tracker, '--template', template, '--pdf_backend', 'fake', '--output', output, '--report', os.path.join(output, 'report.json')] + list(argv))
+    with open(os.path.join(output, 'report.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_tracker(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('Company,Role,Date,Event\n' + ''.join(f'{row}\n' for row in rows))
+    return path
+
+def test_identical_rows_are_rendered_once(tmp_path, monkeypatch, bundled_template):
+    monkeypatch.chdir(tmp_path)
+    tracker = write_tracker(str(tmp_path / 'tracker.csv'), [
+        'Apple,Engineer,2023-05-01,Career Fair',
+        'Apple,Engineer,2023-05-01,Career Fair', ## Same file and context
+        'Apple,Intern,2023-05-01,Career Fair', ## Same context but another file
+        'Meta,Engineer,2023-05-01,Info Session',
+        'Meta,Engineer,2023-05-01,Info Session',
+    ])
+
+    for workers in ('1', '2'):
+        output = str(tmp_path / f'out-{workers}')
+        report = run(tracker, bundled_template, output, '--workers', workers)
+        assert report['count_gen'] == 5
+        assert report['counts']['deduplicated'] == 2
+        assert report['stages']['render']['rows'] == 3
+        assert report['stages']['pdf']['rows'] == 3
+
+def test_same_file_with_another_context_is_rendered_again(tmp_path, monkeypatch, bundled_template):
+    monkeypatch.chdir(tmp_path)
+    tracker = write_tracker(str(tmp_path / 'tracker.csv'), [
+        'Apple,Engineer,2023-05-01,Career Fair',
+        'Apple,Engineer,2023-05-01,Hackathon', ## Same file, the last row written wins
+        'Apple,Engineer,2023-05-01,Career Fair', ## Same context as the first row, but not as the file was last written
+    ])
+    output = str(tmp_path / 'out')
+
+    report = run(tracker, bundled_template, output)
+    assert report['counts'].get('deduplicated', 0) == 0
+    assert report['stages']['render']['rows'] == 3
+
+    docx = next(os.path.join(path, name) for path, _, names in os.walk(output) for name in names if name.endswith('.docx'))
+    with zipfile.ZipFile(docx) as archive:
+        document = archive.read('word/document.xml').decode('utf-8')
+    assert 'Career Fair' in document and 'Hackathon' not in document
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of [--incremental] runs, skipping the rows whose context, template and output files are unchanged since the last run
+'''
+
+import os
+import csv
+import json
+
+from cover_gen.cli import main
+
+def run(tracker, template, output, *argv):
+    main(['-name', 'Test Applicant', '--app_list', tracker, '--template', template, '--pdf_backend', 'fake', '--output', output, '--incremental', '--manifest', os.path.join(output, 'manifest.json'), '--report', os.path.join(output, 'report.json')] + list(argv))
+    with open(os.path.join(output, 'report.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def get_converted(report):
+    return report['stages']['pdf']['rows'] if 'pdf' in report['stages'] else 0
+
+def edit_row(tracker, idx, column, value):
+    with open(tracker, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    rows[idx + 1][rows[0].index(column)] = value
+    with open(tracker, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+
+def test_unchanged_rows_are_skipped(tmp_path, monkeypatch, tracker, bundled_template):
+    monkeypatch.chdir(tmp_path)
+    output = str(tmp_path / 'out')
+
+    report = run(tracker, bundled_template, output)
+    assert (report['count_gen'], report['count_skip'], get_converted(report)) == (200, 0, 200)
+
+    ## Nothing is rendered or converted again
+    report = run(tracker, bundled_template, output)
+    assert (report['count_gen'], report['count_skip'], get_converted(report)) == (0, 200, 0)
+
+    ## Only the row whose context changed, and the row whose ".pdf" was deleted, are generated again
+    edit_row(tracker, 10, 'Other2', 'A changed value')
+    docx = next(os.path.join(path, name) for path, _, names in os.walk(output) for name in names if '-Role 20-' in name and name.endswith('.docx'))
+    os.remove(os.path.splitext(docx)[0] + '.pdf')
+
+    report = run(tracker, bundled_template, output)
+    assert (report['count_gen'], report['count_skip'], get_converted(report)) == (2, 198, 2)
+    assert os.path.exists(os.path.splitext(docx)[0] + '.pdf')
+
+def test_changed_template_regenerates_every_row(tmp_path, monkeypatch, tracker, bundled_template, make_template):
+    monkeypatch.chdir(tmp_path)
+    output = str(tmp_path / 'out')
+
+    run(tracker, bundled_template, output)
+    report = run(tracker, make_template('plain'), output)
+    assert (report['count_gen'], report['count_skip']) == (200, 0)
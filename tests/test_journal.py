@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the progress journal and of resuming an interrupted run with [--resume]
+'''
+
+import os
+import re
+import json
+import argparse
+
+import pytest
+
+from cover_gen.cli import main
+from cover_gen.journal import RunJournal, load_journal, read_journal_run
+
+journal_name = '.cover-gen-journal.jsonl'
+
+def run(tracker, template, output, *argv):
+    main(['-name', 'Test Applicant', '--app_list', tracker, '--template', template, '--pdf_backend', 'fake', '--output', output, '--report', os.path.join(output, 'report.json')] + list(argv))
+    with open(os.path.join(output, 'report.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def list_files(folder):
+    return sorted(os.path.relpath(os.path.join(path, name), folder) for path, _, names in os.walk(folder) for name in names if name.endswith(('.docx', '.pdf')))
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+
+    journal = RunJournal(path, run={'output': 'out'})
+    journal.record(0, 'a')
+    journal.record(1, 'b')
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"row": 2, "ke') ## Killed mid-write
+
+    assert load_journal(path) == ({(0, 'a'), (1, 'b')}, True)
+
+    ## The resumed journal ends the torn line before appending to it
+    journal = RunJournal(path, resume=True, run={'output': 'out'})
+    assert journal.completed == {(0, 'a'), (1, 'b')}
+    journal.record(2, 'c')
+    journal.close()
+
+    assert load_journal(path) == ({(0, 'a'), (1, 'b'), (2, 'c')}, False)
+    assert read_journal_run(path) == {'output': 'out'}
+
+def test_journal_of_another_run_is_refused(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    RunJournal(path, run={'output': 'out'}).close()
+
+    with pytest.raises(ValueError, match='another run'):
+        RunJournal(path, resume=True, run={'output': 'elsewhere'})
+
+def test_resume_after_torn_last_line(tmp_path, monkeypatch, tracker, bundled_template):
+    monkeypatch.chdir(tmp_path)
+    whole = str(tmp_path / 'whole')
+    output = str(tmp_path / 'out')
+
+    run(tracker, bundled_template, whole)
+    report = run(tracker, bundled_template, output)
+    assert report['count_gen'] == 200
+
+    ## Interrupts the run after its first 50 rows, killed while appending the 51st and while writing a ".docx"
+    journal = os.path.join(output, journal_name)
+    with open(journal, 'r', encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    kept = lines[:51] ## The run and the first 50 rows
+    completed = {json.loads(line)['row'] for line in kept[1:]}
+    with open(journal, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(kept) + '\n' + lines[51][:10])
+
+    rows = [json.loads(line)['row'] for line in lines[1:] if line]
+
+    ## Files of the rows the interrupted run did not complete may be missing, every row of the synthetic tracker has a role of its own
+    for path in list_files(output)[::7]:
+        if int(re.search(r'-Role (\d+)-', path).group(1)) not in completed:
+            os.remove(os.path.join(output, path))
+
+    report = run(tracker, bundled_template, output, '--resume')
+    assert report['count_skip'] == len(completed)
+    assert report['count_gen'] == len(rows) - len(completed)
+    assert list_files(output) == list_files(whole)
+    assert load_journal(journal)[0] == load_journal(os.path.join(whole, journal_name))[0]
+
+def test_resume_refuses_the_journal_of_another_tracker(tmp_path, monkeypatch, tracker, bundled_template):
+    monkeypatch.chdir(tmp_path)
+    output = str(tmp_path / 'out')
+
+    run(tracker, bundled_template, output)
+    other = str(tmp_path / 'other.csv')
+    with open(tracker, 'r', encoding='utf-8') as f, open(other, 'w', encoding='utf-8') as out:
+        out.write(f.read())
+
+    with pytest.raises(argparse.ArgumentTypeError, match='another tracker'):
+        run(other, bundled_template, output, '--resume')
+
+def test_resume_removes_only_its_own_temporary_files(tmp_path, monkeypatch, tracker, bundled_template):
+    monkeypatch.chdir(tmp_path)
+    output = str(tmp_path / 'out')
+
+    run(tracker, bundled_template, output)
+    folder = os.path.join(output, 'Company 0')
+    assert os.path.isdir(folder)
+
+    from cover_gen.sinks import get_run_id
+    own = get_run_id(os.path.abspath(os.path.join(output, journal_name))).split('-')[0]
+    stale = os.path.join(folder, f'Letter.{own}-0badc0de.1-2.tmp.docx') ## Left by the interrupted start of the run
+    others = [
+        os.path.join(folder, 'Letter.deadbeef-0badc0de.1-2.tmp.docx'), ## Of another run, e.g. another shard
+        os.path.join(folder, 'Letter.1-2.tmp.docx'), ## Untagged
+        os.path.join(folder, 'notes.tmp.docx'),
+    ]
+    for path in [stale] + others:
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+
+    ## Resumed as if the last rows of the folder were interrupted
+    journal = os.path.join(output, journal_name)
+    with open(journal, 'r', encoding='utf-8') as f:
+        lines = f.read().split('\n')
+    with open(journal, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines[:1]) + '\n')
+
+    run(tracker, bundled_template, output, '--resume')
+    assert not os.path.exists(stale)
+    assert all(os.path.exists(path) for path in others)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the [--merge] mode (see merge.py) with the fake PDF backend, converting the letters of each template in one merged document
+'''
+
+import os
+import json
+import zipfile
+
+from docx import Document
+from docx.shared import Pt
+
+from cover_gen import merge
+from cover_gen.cli import main
+from cover_gen.pdf import FakePDFBackend
+
+def write_template(path, text, size):
+    document = Document()
+    document.styles['Normal'].font.size = Pt(size)
+    document.add_paragraph(text + ' {{COMPANY}} {{ROLE}}')
+    document.save(path)
+    return path
+
+def read_part(path, partname):
+    with zipfile.ZipFile(path) as archive:
+        return archive.read(partname)
+
+def test_templates_are_merged_apart(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_template('default.docx', 'Default letter', 11)
+    write_template('engineering.docx', 'Engineering letter', 14) ## Differs from the default only in its styles
+    with open('rules.json', 'w', encoding='utf-8') as f:
+        json.dump([{'when': {'ROLE': 'Engineer'}, 'template': 'engineering.docx'}], f)
+    with open('tracker.csv', 'w', encoding='utf-8') as f:
+        f.write('Company,Role\n' + ''.join(f'Company {idx},{"Engineer" if idx % 2 else "Designer"}\n' for idx in range(6)))
+
+    ## Records the styles of every merged document and of the letters merged into it
+    merged = []
+    merge_documents = merge.merge_documents
+    def record(paths, out_docx):
+        merge_documents(paths, out_docx)
+        merged.append((read_part(out_docx, 'word/styles.xml'), [read_part(path, 'word/styles.xml') for path in paths]))
+    monkeypatch.setattr(merge, 'merge_documents', record)
+
+    main(['-name', 'Test Applicant', '--app_list', 'tracker.csv', '--template', 'default.docx', '--template_rules', 'rules.json', '--pdf_backend', 'fake', '--merge', '--merge_output', 'All.pdf', '--output', 'out'])
+
+    assert len(merged) == 2
+    assert merged[0][0] != merged[1][0]
+    for styles, letters in merged:
+        assert len(letters) == 3
+        assert all(letter == styles for letter in letters) ## Every letter keeps the styles of its own template
+
+    pdfs = [name for _, _, names in os.walk('out') for name in names if name.endswith('.pdf')]
+    assert len(pdfs) == 7 ## A ".pdf" per letter and the combined All.pdf
+
+def test_backend_without_bookmarks_converts_one_by_one(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    write_template('default.docx', 'Default letter', 11)
+    with open('tracker.csv', 'w', encoding='utf-8') as f:
+        f.write('Company,Role\nApple,Engineer\nMeta,Designer\n')
+
+    monkeypatch.setattr(FakePDFBackend, 'splits_merged', False)
+    monkeypatch.setattr(merge, 'merge_documents', None) ## Never merged
+
+    main(['-name', 'Test Applicant', '--app_list', 'tracker.csv', '--template', 'default.docx', '--pdf_backend', 'fake', '--merge', '--output', 'out'])
+
+    assert 'converting the files one by one instead of merging them' in capsys.readouterr().out
+    assert len([name for _, _, names in os.walk('out') for name in names if name.endswith('.pdf')]) == 2
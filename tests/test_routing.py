@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of routing rows to templates, by the [--template_rules] and the "template" column of the tracker, and of the templates a [--serve] request can choose
+'''
+
+import io
+import os
+import json
+import zipfile
+import threading
+import http.client
+from http.server import ThreadingHTTPServer
+
+import pytest
+from docx import Document
+
+from cover_gen.cli import main
+from cover_gen.sinks import BytesSink
+from cover_gen.server import RenderService, RenderHandler
+from cover_gen.generator import CoverLetterGenerator
+
+def write_template(path, text):
+    document = Document()
+    document.add_paragraph(text + ' {{COMPANY}} {{ROLE}}')
+    document.save(path)
+    return path
+
+def get_text(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return archive.read('word/document.xml').decode('utf-8')
+
+def read_outputs(folder):
+    outputs = {}
+    for path, _, names in os.walk(folder):
+        for name in names:
+            if name.endswith('.docx'):
+                with open(os.path.join(path, name), 'rb') as f:
+                    outputs[name.split('-')[2]] = get_text(f.read()) ## Keyed by role
+    return outputs
+
+def test_rules_route_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_template('default.docx', 'Default letter')
+    write_template('engineering.docx', 'Engineering letter')
+    write_template('sales.docx', 'Sales letter')
+    with open('rules.json', 'w', encoding='utf-8') as f:
+        json.dump([{'when': {'ROLE': '(?i)engineer'}, 'template': 'engineering.docx'}, {'when': {'ROLE': '(?i)sales', 'COMPANY': '^Meta$'}, 'template': 'sales.docx'}], f)
+    with open('tracker.csv', 'w', encoding='utf-8') as f:
+        f.write('Company,Role\nApple,Software Engineer\nMeta,Sales Lead\nApple,Sales Rep\nMeta,Designer\n')
+
+    main(['-name', 'Test Applicant', '--app_list', 'tracker.csv', '--template', 'default.docx', '--template_rules', 'rules.json', '--no_pdf', '--output', 'out'])
+
+    outputs = read_outputs('out')
+    assert 'Engineering letter' in outputs['Software Engineer']
+    assert 'Sales letter' in outputs['Sales Lead']
+    assert 'Default letter' in outputs['Sales Rep'] ## Every expression of a rule must match
+    assert 'Default letter' in outputs['Designer']
+
+def test_template_column_routes_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_template('default.docx', 'Default letter')
+    write_template('other.docx', 'Other letter')
+    with open('tracker.csv', 'w', encoding='utf-8') as f:
+        f.write('Company,Role,Template\nApple,Engineer,other.docx\nApple,Designer,\n')
+
+    main(['-name', 'Test Applicant', '--app_list', 'tracker.csv', '--template', 'default.docx', '--no_pdf', '--output', 'out'])
+
+    outputs = read_outputs('out')
+    assert 'Other letter' in outputs['Engineer']
+    assert 'Default letter' in outputs['Designer']
+
+def test_context_template_is_ignored_without_tracker(tmp_path):
+    default = write_template(str(tmp_path / 'default.docx'), 'Default letter')
+    other = write_template(str(tmp_path / 'other.docx'), 'Other letter')
+
+    sink = BytesSink()
+    generator = CoverLetterGenerator(default, name='Test Applicant', folder=False, sink=sink)
+    generator.generate({'COMPANY': 'Apple', 'ROLE': 'Engineer', 'TEMPLATE': other})
+    generator.close()
+
+    assert [('Default letter' in get_text(data)) for data in sink.files.values()] == [True]
+
+@pytest.fixture
+def server(tmp_path):
+    service = RenderService({'default': write_template(str(tmp_path / 'default.docx'), 'Default letter'), 'other': write_template(str(tmp_path / 'other.docx'), 'Other letter')}, name='Test Applicant', pdf_backend='fake')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RenderHandler)
+    server.daemon_threads = True
+    server.service = service
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+def post(server, path, context):
+    connection = http.client.HTTPConnection(*server.server_address[:2])
+    connection.request('POST', path, json.dumps(context).encode('utf-8'), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, response.read()
+
+def test_serve_context_cannot_choose_template(server, tmp_path):
+    secret = write_template(str(tmp_path / 'secret.docx'), 'Secret letter')
+
+    status, body = post(server, '/render?template=other', {'COMPANY': 'Apple', 'ROLE': 'Engineer', 'TEMPLATE': secret})
+    assert status == 400
+    assert b'TEMPLATE' in body
+
+    status, body = post(server, '/render', {'COMPANY': 'Apple', 'ROLE': 'Engineer', 'TEMPLATE': 'other'})
+    assert status == 400
+
+    status, body = post(server, f'/render?template={secret}', {'COMPANY': 'Apple', 'ROLE': 'Engineer'})
+    assert status == 404
+
+    status, body = post(server, '/render?template=other', {'COMPANY': 'Apple', 'ROLE': 'Engineer'})
+    assert status == 200
+    assert 'Other letter' in get_text(body)
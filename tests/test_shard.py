@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of [--shard] runs and of aggregating their reports with "cover-gen merge-reports"
+'''
+
+import os
+import json
+import argparse
+
+import pytest
+
+from cover_gen.cli import main
+from cover_gen.tracker import get_shard, parse_shard
+
+def run(tracker, template, output, *argv):
+    main(['-name', 'Test Applicant', '--app_list', tracker, '--template', template, '--pdf_backend', 'fake', '--output', output] + list(argv))
+
+def list_files(folder):
+    return sorted(os.path.relpath(os.path.join(path, name), folder) for path, _, names in os.walk(folder) for name in names if not name.startswith('.'))
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def test_parse_shard():
+    assert parse_shard('2/4') == (2, 4)
+    for value in ('0/4', '5/4', '2', 'a/b'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(value)
+
+def test_get_shard_is_stable():
+    shards = [get_shard(f'Company {idx}', 4) for idx in range(100)]
+    assert shards == [get_shard(f'Company {idx}', 4) for idx in range(100)]
+    assert set(shards) == {1, 2, 3, 4}
+
+def test_shards_partition_the_run(tmp_path, monkeypatch, tracker, bundled_template):
+    monkeypatch.chdir(tmp_path)
+
+    run(tracker, bundled_template, str(tmp_path / 'whole'), '--report', 'whole.json')
+    for shard in range(1, 4):
+        run(tracker, bundled_template, str(tmp_path / f'shard-{shard}'), '--shard', f'{shard}/3', '--report', 'report.json')
+
+    shard_files = [list_files(tmp_path / f'shard-{shard}') for shard in range(1, 4)]
+    assert all(shard_files)
+    assert sorted(sum(shard_files, [])) == list_files(tmp_path / 'whole') ## Every cover letter is generated by exactly one shard
+
+    ## Every company is generated by a single shard
+    companies = [set(os.path.dirname(path) for path in files) for files in shard_files]
+    assert not (companies[0] & companies[1] or companies[0] & companies[2] or companies[1] & companies[2])
+
+def test_merge_reports_round_trip(tmp_path, monkeypatch, capsys, tracker, bundled_template):
+    monkeypatch.chdir(tmp_path)
+
+    run(tracker, bundled_template, str(tmp_path / 'whole'), '--report', 'whole.json')
+    for shard in range(1, 4):
+        run(tracker, bundled_template, str(tmp_path / 'sharded'), '--shard', f'{shard}/3', '--report', 'report.json')
+
+    reports = [f'report.shard-{shard}-of-3.json' for shard in range(1, 4)]
+    assert all(os.path.exists(report) for report in reports)
+
+    capsys.readouterr()
+    main(['merge-reports'] + reports + ['--report', 'merged.json'])
+    assert 'Merged the reports of shards 1, 2, 3 of 3' in capsys.readouterr().out
+
+    whole = load_report('whole.json')
+    merged = load_report('merged.json')
+    assert merged['shards'] == [1, 2, 3]
+    assert merged['missing_shards'] == []
+    assert merged['count_gen'] == whole['count_gen'] == 200
+    assert merged['count_pdf'] == whole['count_pdf']
+    assert {key: count for key, count in merged['errors'].items() if count} == {key: count for key, count in whole['errors'].items() if count}
+    assert len(merged['failures']) == len(whole['failures'])
+
+    main(['merge-reports'] + reports[:2])
+    assert 'Missing the reports of shards 3' in capsys.readouterr().out
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the CompiledDocxTemplate (see template.py) against a fresh docxtpl DocxTemplate per cover letter
+'''
+
+import io
+import zipfile
+
+from lxml import etree
+from docxtpl import DocxTemplate
+
+from cover_gen.template import CompiledDocxTemplate
+
+def get_document(data):
+    '''
+    Reads the body of a rendered ".docx" as canonical XML
+    '''
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return etree.tostring(etree.fromstring(archive.read('word/document.xml')), method='c14n')
+
+def render_docxtpl(path, context):
+    template = DocxTemplate(path)
+    template.render(context)
+    out = io.BytesIO()
+    template.save(out)
+    return out.getvalue()
+
+def get_contexts(template):
+    variables = template.get_variables()
+    yield {variable: f'{variable.title()} value' for variable in variables}
+    yield {variable: f'{variable.title()} “Café” value' for variable in variables} ## Without markup characters, which docxtpl does not escape unless asked to
+    yield {variable: '' for variable in variables}
+
+def test_bundled_template_renders_as_docxtpl(bundled_template):
+    for engine in ('auto', 'docxtpl'):
+        template = CompiledDocxTemplate(bundled_template, engine)
+        ## Rendered repeatedly from the one compiled template, each cover letter as from a fresh DocxTemplate
+        for context in get_contexts(template):
+            assert get_document(template.render_bytes(context)) == get_document(render_docxtpl(bundled_template, context))
+
+def test_control_flow_renders_as_docxtpl(make_template):
+    for name in ('loops', 'tables'):
+        path = make_template(name)
+        template = CompiledDocxTemplate(path)
+        for context in get_contexts(template):
+            assert get_document(template.render_bytes(context)) == get_document(render_docxtpl(path, context))
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the check of the variables of a template against the columns of the tracker run before any cover letter is rendered
+'''
+
+import os
+
+import pytest
+from docx import Document
+
+from cover_gen import cli
+from cover_gen.template import CompiledDocxTemplate
+from cover_gen.validate import check_variables
+
+def write_template(path, text):
+    document = Document()
+    document.add_paragraph(text)
+    document.save(path)
+    return path
+
+def test_optional_columns_are_warnings(tmp_path, bundled_template, monkeypatch, capsys):
+    ## A tracker of only the company, role and date is valid for the bundled template, whose other placeholders render empty
+    tracker = tmp_path / 'tracker.csv'
+    tracker.write_text('Company,Role,Date\nApple,Engineer,2023-05-01\n')
+    monkeypatch.chdir(tmp_path)
+
+    cli.main(['-name', 'Test Applicant', '--template', bundled_template, '--app_list', str(tracker), '--no_pdf', '--output', str(tmp_path / 'out')])
+
+    out = capsys.readouterr().out
+    assert '"REFERRAL" has no "referral" column in the tracker, rendered empty' in out
+    assert os.path.exists(tmp_path / 'out' / 'Apple' / 'Test Applicant-Apple-Engineer-Cover-Letter.docx')
+
+def test_guarded_variables(tmp_path):
+    template = CompiledDocxTemplate(write_template(str(tmp_path / 'guarded.docx'), '{{COMPANY}} {% if FOO %}{{FOO}}{% endif %} {% if REFERRAL %}{{REFERRAL}}{% elif NAME %}{{NAME}}{% else %}{{BAR}}{% endif %}'))
+    assert template.get_guarded_variables() == {'FOO', 'REFERRAL', 'NAME'}
+
+    problems, warnings = check_variables(template.get_variables(), ['Company', 'Role'], None, template.get_guarded_variables())
+    assert problems == ['"BAR" is not a variable cover-gen fills']
+    assert len(warnings) == 3
+
+def test_errors_exit_as_invalid_arguments(tmp_path, monkeypatch, capsys):
+    template = write_template(str(tmp_path / 'typo.docx'), '{{COMPNY}} {{ROLE}}')
+    tracker = tmp_path / 'tracker.csv'
+    tracker.write_text('Company,Role\nApple,Engineer\n')
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(SystemExit) as info:
+        cli.main(['-name', 'Test Applicant', '--template', template, '--app_list', str(tracker), '--no_pdf', '--output', str(tmp_path / 'out')])
+
+    assert info.value.code == 2
+    assert '"COMPNY" is not a variable cover-gen fills, did you mean "COMPANY"?' in capsys.readouterr().err
+    assert not list((tmp_path / 'out').rglob('*.docx'))
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the [--where] expressions of where.py and of the RowFilter evaluating them over the chunks of a tracker
+'''
+
+import datetime
+import argparse
+
+import pytest
+import pandas as pd
+
+from cover_gen.cli import parse_args
+from cover_gen.where import WhereExpression, parse_where
+from cover_gen.tracker import RowSchema, RowFilter
+
+columns = {
+    'company': pd.Series(['Apple', 'Google', 'Apple', 'Meta', '', 'Netflix']),
+    'role': pd.Series(['Intern', 'Engineer', 'Engineer', 'Intern', 'Engineer', 'Manager']),
+    'date': pd.Series(['May 1, 2023', '2023-04-30', datetime.date(2023, 5, 2), 'not a date', '', '2023-05-01 18:30:00']),
+    'level': pd.Series(['3', '4', '', 'five', '2.5', '10']),
+}
+
+def select(text):
+    return WhereExpression(text).evaluate(columns).tolist()
+
+def get_error(text):
+    with pytest.raises(ValueError) as info:
+        WhereExpression(text)
+    return str(info.value)
+
+def test_comparisons():
+    assert select('company == "Apple"') == [True, False, True, False, False, False]
+    assert select('company = "Apple"') == select('company == "Apple"')
+    assert select('company != "Apple"') == [False, True, False, True, True, True]
+    assert select("role == 'Intern'") == [True, False, False, True, False, False]
+
+def test_precedence():
+    ## "and" binds tighter than "or", and "not" tighter than both
+    assert select('company == "Apple" or company == "Meta" and role == "Engineer"') == [True, False, True, False, False, False]
+    assert select('(company == "Apple" or company == "Meta") and role == "Engineer"') == [False, False, True, False, False, False]
+    assert select('not company == "Apple" and role == "Intern"') == [False, False, False, True, False, False]
+    assert select('not (company == "Apple" and role == "Intern")') == [False, True, True, True, True, True]
+    assert select('not not company == "Meta"') == [False, False, False, True, False, False]
+
+def test_in_and_not_in():
+    assert select('company in ["Apple", "Meta"]') == [True, False, True, True, False, False]
+    assert select('company not in ["Apple", "Meta"]') == [False, True, False, False, True, True]
+    assert select('company in []') == [False] * 6
+
+def test_mixed_type_lists():
+    ## Each value is compared with the column converted to its type
+    assert select('level in [3, "five", 2023-05-01]') == [True, False, False, True, False, False]
+    assert select('date in [2023-05-01, "not a date"]') == [True, False, False, True, False, True]
+    assert select('level not in [3, 10]') == [False, True, True, True, True, False]
+
+def test_number_coercion():
+    assert select('level > 3') == [False, True, False, False, False, True] ## Compared as numbers, not strings
+    assert select('level <= 3') == [True, False, False, False, True, False]
+    assert select('level == 2.5') == [False, False, False, False, True, False]
+    assert select('level != 3') == [False, True, True, True, True, True] ## Empty and non numeric values are never equal
+
+def test_date_coercion():
+    ## Dates of any format are compared by day, empty and illegible ones never compare but as "!="
+    assert select('date == 2023-05-01') == [True, False, False, False, False, True]
+    assert select('date >= 2023-05-01') == [True, False, True, False, False, True]
+    assert select('date < 2023-05-01') == [False, True, False, False, False, False]
+    assert select('date != 2023-05-01') == [False, True, True, True, True, False]
+
+def test_columns():
+    expression = WhereExpression('Company == "A" and `Recruitment Company` == "B" or company == "C"')
+    assert expression.columns == ['company', 'recruitment company']
+
+@pytest.mark.parametrize('text, message', [
+    ('company ==', 'expected a value, found the end of the expression'),
+    ('company == Apple', 'expected a value, found "Apple" (strings must be quoted)'),
+    ('(company == "A"', 'expected ")", found the end of the expression'),
+    ('company ~ "A"', 'unexpected "~ "A""'),
+    ('company == "A" and', 'expected a column, found the end of the expression'),
+    ('company in ["A" "B"]', 'expected "," or "]", found ""B""'),
+    ('date >= 2023-02-30', '"2023-02-30" is not a date'),
+    ('company == "A" )', 'unexpected ")"'),
+    ('== "A"', 'expected a column, found "=="'),
+    ('company not "A"', 'expected "in", found ""A""'),
+])
+def test_errors(text, message):
+    assert get_error(text) == f'Invalid [--where] expression "{text}": {message}'
+
+def test_parse_where():
+    assert parse_where('company == "A"').columns == ['company']
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_where('company ==')
+
+def test_row_filter():
+    schema = RowSchema(['Company', 'Role', 'Recruitment Company', 'Applied'])
+    row_filter = RowFilter(schema, WhereExpression('recruitment_company == "" and role == "Intern"'))
+
+    chunk = {
+        'company': pd.Series(['A', 'B', 'C', 'D']),
+        'role': pd.Series(['Intern', 'Intern', 'Engineer', 'Intern']),
+        'recruitment company': pd.Series(['', 'Agency', '', '']),
+        'applied': pd.Series(['yes', 'yes', 'yes', '']),
+    }
+    chunk['recruitment_company'] = chunk['recruitment company'] ## Read once more under the name of the expression
+    assert set(row_filter.names) == set(chunk)
+    assert [schema.df_cols[position] for position in row_filter.positions] == [name.replace('_', ' ') for name in row_filter.names]
+    assert row_filter.mask(chunk).tolist() == [True, False, False, False]
+
+    with pytest.raises(ValueError, match='does not have'):
+        RowFilter(schema, WhereExpression('salary > 3'))
+
+def test_unknown_column_is_an_argument_error(tmp_path, capsys):
+    tracker = tmp_path / 'tracker.csv'
+    tracker.write_text('Company,Role\nA,Intern\n', encoding='utf-8')
+
+    with pytest.raises(SystemExit) as info:
+        parse_args(['-name', 'Test Applicant', '--app_list', str(tracker), '--where', 'salary > 3'])
+    assert info.value.code == 2
+    assert 'compares column "salary", which the tracker does not have' in capsys.readouterr().err
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+'''
+Tests of the XML substitution engine (see xmltemplate.py) against docxtpl
+'''
+
+import io
+import zipfile
+
+from lxml import etree
+
+from cover_gen.template import CompiledDocxTemplate
+
+def get_parts(data):
+    '''
+    Reads the parts of the document of a rendered ".docx" as canonical XML, as docxtpl re-serializes the parts it saves
+    '''
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: etree.tostring(etree.fromstring(archive.read(name)), method='c14n') for name in archive.namelist() if name.startswith('word/') and name.endswith(('.xml', '.rels'))}
+
+def get_context(template, **values):
+    context = {variable: f'{variable.title()} value' for variable in template.get_variables()}
+    context.update(values)
+    return context
+
+def test_bundled_template_uses_xml_engine(bundled_template):
+    assert CompiledDocxTemplate(bundled_template).engine == 'xml'
+    assert CompiledDocxTemplate(bundled_template, 'docxtpl').engine == 'docxtpl'
+
+def test_bundled_template_renders_as_docxtpl(bundled_template):
+    xml = CompiledDocxTemplate(bundled_template)
+    docxtpl = CompiledDocxTemplate(bundled_template, 'docxtpl')
+
+    for context in (
+        get_context(xml),
+        get_context(xml, COMPANY='Café Ünïcode', ROLE='Engineer “II”'),
+        get_context(xml, CONVO1='First line\nSecond line\tafter a tab', CONVO2='', EVENT=None),
+    ):
+        assert get_parts(xml.render_bytes(context)) == get_parts(docxtpl.render_bytes(context))
+
+def test_renders_repeatedly_as_docxtpl(bundled_template):
+    xml = CompiledDocxTemplate(bundled_template)
+    docxtpl = CompiledDocxTemplate(bundled_template, 'docxtpl')
+
+    for idx in range(3):
+        context = get_context(xml, COMPANY=f'Company {idx}')
+        assert get_parts(xml.render_bytes(context)) == get_parts(docxtpl.render_bytes(context))
+
+def test_values_are_escaped(bundled_template):
+    template = CompiledDocxTemplate(bundled_template)
+
+    document = get_parts(template.render_bytes(get_context(template, COMPANY='AT&T <Labs>')))['word/document.xml']
+    assert b'AT&amp;T &lt;Labs&gt;' in document
+
+def test_control_flow_falls_back_to_docxtpl(make_template):
+    assert CompiledDocxTemplate(make_template('plain')).engine == 'xml'
+    assert CompiledDocxTemplate(make_template('loops')).engine == 'docxtpl'